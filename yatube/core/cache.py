@@ -0,0 +1,282 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from uuid import uuid4
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+
+CULL_EVERY = 100
+
+
+class SQLiteCache(BaseCache):
+    """
+    Кэш в файле SQLite, общий для всех процессов на одном хосте.
+    LOCATION — путь к файлу. Каждый поток и каждый процесс после fork
+    открывают своё соединение; журнал WAL позволяет читать во время записи.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    @staticmethod
+    def _alive(expires):
+        return expires is None or expires > time.time()
+
+    def _write(self, sql, rows):
+        self._db.executemany(sql, rows)
+        self._writes += 1
+        if self._writes % CULL_EVERY == 0:
+            self._cull()
+
+    def _cull(self):
+        """Удаляет истёкшие и самые старые записи сверх MAX_ENTRIES."""
+        db = self._db
+        db.execute('DELETE FROM cache WHERE expires <= ?', [time.time()])
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            db.execute(
+                'DELETE FROM cache WHERE rowid IN ('
+                'SELECT rowid FROM cache ORDER BY rowid LIMIT ?)',
+                [
+                    count - self._max_entries
+                    + self._max_entries // self._cull_frequency
+                ]
+            )
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        rows = self._db.execute(
+            'SELECT key, value, expires FROM cache WHERE key IN ({})'.format(
+                ', '.join('?' * len(keys))
+            ),
+            list(keys)
+        )
+        found = {
+            keys[key]: pickle.loads(value)
+            for key, value, expires in rows if self._alive(expires)
+        }
+        metrics.track_cache(len(found), len(keys) - len(found))
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expires(timeout)
+        self._write(
+            'REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+            [
+                (
+                    self._key(key, version),
+                    pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                    expires
+                ) for key, value in data.items()
+            ]
+        )
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                [key, time.time()]
+            )
+            added = db.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                [
+                    key,
+                    pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                    self._expires(timeout)
+                ]
+            ).rowcount
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return bool(added)
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно для всех процессов: запись блокируется на время чтения."""
+        key = self._key(key, version)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute(
+                'SELECT value, expires FROM cache WHERE key = ?', [key]
+            ).fetchone()
+            if row is None or not self._alive(row[1]):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            db.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                [pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key]
+            )
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return bool(self._db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            [self._expires(timeout), self._key(key, version), time.time()]
+        ).rowcount)
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        self._db.executemany(
+            'DELETE FROM cache WHERE key = ?',
+            [(self._key(key, version),) for key in keys]
+        )
+
+    def has_key(self, key, version=None):
+        return key in self.get_many([key], version=version)
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        """Соединения живут всё время работы потока."""
+
+
+def versions(namespaces):
+    """Версии нескольких пространств имён одним обращением к кэшу."""
+    by_key = {namespace.version_key: namespace for namespace in namespaces}
+    if not by_key:
+        return {}
+    cache = caches[namespaces[0].alias]
+    found = cache.get_many(by_key)
+    for key, namespace in by_key.items():
+        if key not in found:
+            found[key] = namespace.create_version()
+    return {
+        namespace.name: found[key] for key, namespace in by_key.items()
+    }
+
+
+class Namespace:
+    """
+    Группа ключей кэша с общей версией. Версия входит в каждый ключ,
+    поэтому bump() разом делает недействительными все ключи группы
+    во всех процессах, ничего не удаляя. version_timeout ограничивает
+    жизнь самой версии: после него ключи группы тоже устаревают.
+    """
+
+    def __init__(self, name, version_timeout=None,
+                 alias=DEFAULT_CACHE_ALIAS):
+        self.name = name
+        self.version_timeout = version_timeout
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def version_key(self):
+        return f'{self.name}:version'
+
+    def create_version(self):
+        version = uuid4().hex
+        if not self.cache.add(
+            self.version_key, version, self.version_timeout
+        ):
+            version = self.cache.get(self.version_key, version)
+        return version
+
+    def version(self):
+        version = self.cache.get(self.version_key)
+        if version is None:
+            version = self.create_version()
+        return version
+
+    def bump(self):
+        self.cache.delete(self.version_key)
+
+    def make_key(self, key, version=None):
+        if version is None:
+            version = self.version()
+        return f'{self.name}:{version}:{key}'
+
+    def get(self, key, default=None):
+        return self.cache.get(self.make_key(key), default)
+
+    def get_many(self, keys):
+        version = self.version()
+        keys = {self.make_key(key, version): key for key in keys}
+        return {
+            keys[key]: value
+            for key, value in self.cache.get_many(keys).items()
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        self.cache.set(self.make_key(key), value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT):
+        version = self.version()
+        self.cache.set_many(
+            {
+                self.make_key(key, version): value
+                for key, value in data.items()
+            },
+            timeout
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT):
+        return self.cache.add(self.make_key(key), value, timeout)
+
+    def incr(self, key, delta=1):
+        return self.cache.incr(self.make_key(key), delta)
+
+    def delete(self, key):
+        self.cache.delete(self.make_key(key))
+
+    def delete_many(self, keys):
+        version = self.version()
+        self.cache.delete_many([self.make_key(key, version) for key in keys])
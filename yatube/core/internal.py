@@ -0,0 +1,18 @@
+"""
+Доступ к служебным адресам (/metrics/, профиль шаблонов). Адрес клиента
+для этого не годится: за nginx на той же машине все запросы приходят с
+127.0.0.1. Поэтому запрос должен нести заголовок
+Authorization: Bearer <INTERNAL_TOKEN>; без INTERNAL_TOKEN доступа нет.
+"""
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+
+PREFIX = 'Bearer '
+
+
+def allowed(request):
+    token = settings.INTERNAL_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and header.startswith(PREFIX) and (
+        constant_time_compare(header[len(PREFIX):], token)
+    )
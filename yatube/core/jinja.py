@@ -0,0 +1,78 @@
+"""
+Движок Jinja2 с выводом как у шаблонов Django: те же экранирование и
+локализация значений {{ }}, фильтры date и linebreaksbr из Django,
+addclass из core, функции url и static и вызов {% call cache(...) %}
+вместо тега {% cache %}.
+"""
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.template import defaultfilters
+from django.template.backends.jinja2 import (
+    Jinja2 as BaseJinja2, Template as BaseTemplate
+)
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.formats import localize
+from django.utils.html import conditional_escape
+from django.utils.timezone import template_localtime
+from jinja2 import Environment
+from markupsafe import Markup
+
+from . import metrics
+from .templatetags.user_filters import addclass
+
+
+class Template(BaseTemplate):
+    def render(self, context=None, request=None):
+        with metrics.template_timer():
+            return super().render(context, request)
+
+
+class Jinja2(BaseJinja2):
+    """Jinja2, время вывода которой учитывает core.metrics."""
+
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
+
+
+def finalize(value):
+    """Значение {{ }} как в шаблонах Django."""
+    return conditional_escape(localize(template_localtime(value)))
+
+
+def url(viewname, *args, **kwargs):
+    return reverse(viewname, args=args, kwargs=kwargs)
+
+
+def date(value, arg=None):
+    return defaultfilters.date(template_localtime(value), arg)
+
+
+def cache(timeout, fragment_name, *vary_on, caller):
+    """Фрагмент из кэша под тем же ключом, что у тега {% cache %}."""
+    try:
+        fragment_cache = caches['template_fragments']
+    except InvalidCacheBackendError:
+        fragment_cache = caches['default']
+    key = make_template_fragment_key(fragment_name, vary_on)
+    value = fragment_cache.get(key)
+    if value is None:
+        value = str(caller())
+        fragment_cache.set(key, value, timeout)
+    return Markup(value)
+
+
+def environment(**options):
+    env = Environment(
+        finalize=finalize, keep_trailing_newline=True, **options
+    )
+    env.globals.update(url=url, static=static, cache=cache)
+    env.filters.update(
+        date=date,
+        linebreaksbr=defaultfilters.linebreaksbr,
+        addclass=addclass,
+    )
+    return env
@@ -0,0 +1,92 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Процесс-воркер: загружает yatube.wsgi и дважды запрашивает адрес.
+WORKER = '''
+import json, sys, time
+from wsgiref.util import setup_testing_defaults
+
+start = time.perf_counter()
+from yatube.wsgi import application
+boot = time.perf_counter() - start
+
+
+def request(path):
+    environ = {'PATH_INFO': path}
+    setup_testing_defaults(environ)
+    statuses = []
+    begin = time.perf_counter()
+    response = application(
+        environ, lambda status, headers, exc_info=None: statuses.append(status)
+    )
+    b''.join(response)
+    response.close()
+    return int(statuses[0].split()[0]), time.perf_counter() - begin
+
+
+status, first = request(sys.argv[1])
+done = time.time()
+_, second = request(sys.argv[1])
+print(json.dumps({
+    'status': status, 'done': done,
+    'boot': boot, 'first': first, 'second': second,
+}))
+'''
+
+MODES = {'lazy': '0', 'precompiled': '1'}
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время до первого ответа нового процесса без '
+        'TEMPLATES_PRECOMPILE и с ним и выводит отчёт в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', default='/', help='Какой адрес запрашивать.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Сколько процессов запускать на каждый режим.'
+        )
+
+    def spawn(self, url, precompile):
+        env = dict(os.environ, TEMPLATES_PRECOMPILE=precompile)
+        started = time.time()
+        result = subprocess.run(
+            [sys.executable, '-c', WORKER, url], cwd=settings.BASE_DIR,
+            env=env, capture_output=True, text=True
+        )
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+        data = json.loads(result.stdout.strip().splitlines()[-1])
+        data['ttfr'] = data.pop('done') - started
+        return data
+
+    def handle(self, *args, url, repeat, **options):
+        report = {mode: [] for mode in MODES}
+        # Режимы чередуются, чтобы кэш диска не достался одному из них.
+        for _ in range(repeat):
+            for mode, precompile in MODES.items():
+                report[mode].append(self.spawn(url, precompile))
+        for mode, runs in report.items():
+            report[mode] = {
+                'status': runs[-1]['status'],
+                'ttfr_ms': self.median(runs, 'ttfr'),
+                'boot_ms': self.median(runs, 'boot'),
+                'first_ms': self.median(runs, 'first'),
+                'second_ms': self.median(runs, 'second'),
+            }
+        self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+
+    @staticmethod
+    def median(runs, field):
+        return round(statistics.median(run[field] for run in runs) * 1000, 2)
@@ -0,0 +1,68 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import querystats
+
+
+class Command(BaseCommand):
+    help = (
+        'Отчёт по выборкам SQL из QueryProfileMiddleware: запросы, время '
+        'и повторы по представлениям и самые медленные запросы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--view', help='Только это представление (posts:index).'
+        )
+        parser.add_argument(
+            '--slowest', type=int, default=10,
+            help='Сколько самых медленных запросов вывести.'
+        )
+        parser.add_argument(
+            '--json', action='store_true', dest='as_json',
+            help='Вывести отчёт в JSON.'
+        )
+        parser.add_argument(
+            '--clear', action='store_true', help='Удалить все выборки.'
+        )
+
+    def handle(self, *args, view, slowest, as_json, clear, **options):
+        if not settings.QUERY_PROFILE_PATH:
+            raise CommandError('QUERY_PROFILE_PATH не задан.')
+        store = querystats.store()
+        if clear:
+            store.clear()
+            self.stdout.write('Выборки удалены.')
+            return
+        report = {
+            'views': store.summary(view),
+            'slowest': store.slowest(view, slowest),
+        }
+        if as_json:
+            self.write_json(report)
+        else:
+            self.write_table(report)
+
+    def write_json(self, report):
+        self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+
+    def write_table(self, report):
+        self.stdout.write(
+            f'{"Представление":<32} {"выборок":>8} {"запросов":>9} '
+            f'{"макс.":>6} {"повторов":>9} {"SQL, мс":>9} {"всего, мс":>10}'
+        )
+        for row in report['views']:
+            self.stdout.write(
+                f'{row["view"]:<32} {row["samples"]:>8} '
+                f'{row["avg_queries"]:>9.1f} {row["max_queries"]:>6} '
+                f'{row["avg_duplicates"]:>9.1f} {row["avg_sql_ms"]:>9.2f} '
+                f'{row["avg_total_ms"]:>10.2f}'
+            )
+        if report['slowest']:
+            self.stdout.write('\nСамые медленные запросы:')
+        for query in report['slowest']:
+            self.stdout.write(
+                f'{query["ms"]:>9.2f} мс  {query["view"]}  {query["sql"]}'
+            )
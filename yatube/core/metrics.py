@@ -0,0 +1,305 @@
+"""
+Метрики запросов в текстовом формате Prometheus: число запросов,
+гистограммы времени ответа, SQL и вывода шаблонов, размер ответа и
+попадания в кэш — по имени маршрута. Каждый процесс копит значения в
+памяти; если задан METRICS_DIR, процесс раз в METRICS_FLUSH_INTERVAL
+секунд и при выходе пишет их в свой файл в этом каталоге, а выгрузка
+складывает файлы всех процессов. Каталог стоит очищать при запуске
+сервиса: файлы завершённых процессов тоже входят в сумму.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+REQUESTS = 'yatube_requests_total'
+QUERIES = 'yatube_db_queries_total'
+CACHE = 'yatube_cache_requests_total'
+DURATION = 'yatube_request_duration_seconds'
+DB_DURATION = 'yatube_db_duration_seconds'
+TEMPLATE_DURATION = 'yatube_template_duration_seconds'
+SIZE = 'yatube_response_size_bytes'
+
+COUNTERS = {
+    REQUESTS: 'Запросы по маршруту, методу и статусу ответа.',
+    QUERIES: 'Запросы к базе данных по маршруту.',
+    CACHE: 'Чтения ключей кэша по маршруту: result="hit" или "miss".',
+}
+HISTOGRAMS = {
+    DURATION: (DURATION_BUCKETS, 'Полное время ответа, с.'),
+    DB_DURATION: (DURATION_BUCKETS, 'Время SQL-запросов ответа, с.'),
+    TEMPLATE_DURATION: (DURATION_BUCKETS, 'Время вывода шаблонов, с.'),
+    SIZE: (SIZE_BUCKETS, 'Размер тела ответа, байт.'),
+}
+
+
+def counter(name, help_text):
+    """Добавляет в выгрузку счётчик приложения."""
+    COUNTERS[name] = help_text
+    return name
+
+
+class Registry:
+    """
+    Значения метрик процесса. Ключ — имя метрики и метки; у гистограммы
+    значение — счётчики корзин, сумма и число наблюдений.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.flushed = time.monotonic()
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][0]
+        key = (name, labels)
+        with self.lock:
+            data = self.histograms.get(key)
+            if data is None:
+                data = self.histograms[key] = [0] * (len(buckets) + 2)
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    data[index] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def snapshot(self):
+        """Значения в виде, пригодном для JSON."""
+        with self.lock:
+            return {
+                'counters': [
+                    [name, list(labels), value]
+                    for (name, labels), value in self.counters.items()
+                ],
+                'histograms': [
+                    [name, list(labels), list(data)]
+                    for (name, labels), data in self.histograms.items()
+                ],
+            }
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+_lock = threading.Lock()
+_registries = {}
+_local = threading.local()
+
+
+def registry():
+    """Значения текущего процесса: после fork они начинаются заново."""
+    pid = os.getpid()
+    with _lock:
+        if pid not in _registries:
+            _registries.clear()
+            _registries[pid] = Registry()
+            atexit.register(flush_at_exit)
+        return _registries[pid]
+
+
+def labels(**values):
+    return tuple(sorted(values.items()))
+
+
+class RequestStats:
+    """Время SQL и шаблонов и обращения к кэшу одного запроса."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def execute(self, execute, sql, params, many, context):
+        """Обёртка connection.execute_wrapper."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - start
+
+
+@contextmanager
+def tracking(stats):
+    """Пока блок выполняется, поток записывает обращения в stats."""
+    _local.stats = stats
+    try:
+        yield stats
+    finally:
+        _local.stats = None
+
+
+@contextmanager
+def template_timer():
+    """Время вывода шаблона; вложенные выводы не считаются повторно."""
+    stats = getattr(_local, 'stats', None)
+    if stats is None:
+        yield
+        return
+    stats.template_depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.template_depth -= 1
+        if not stats.template_depth:
+            stats.template_time += time.perf_counter() - start
+
+
+def track_cache(hits, misses):
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+def record(view, method, status, size, duration, stats):
+    """Записывает итог запроса и при необходимости сбрасывает их в файл."""
+    values = registry()
+    route = labels(view=view)
+    values.inc(REQUESTS, labels(view=view, method=method, status=status))
+    values.inc(QUERIES, route, stats.queries)
+    for result, count in (('hit', stats.cache_hits),
+                          ('miss', stats.cache_misses)):
+        if count:
+            values.inc(CACHE, labels(view=view, result=result), count)
+    values.observe(DURATION, route, duration)
+    values.observe(DB_DURATION, route, stats.db_time)
+    values.observe(TEMPLATE_DURATION, route, stats.template_time)
+    if size is not None:
+        values.observe(SIZE, route, size)
+    if (
+        settings.METRICS_DIR
+        and time.monotonic() - values.flushed
+        >= settings.METRICS_FLUSH_INTERVAL
+    ):
+        flush()
+
+
+def flush():
+    """Пишет значения процесса в его файл в METRICS_DIR."""
+    values = registry()
+    values.flushed = time.monotonic()
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    path = os.path.join(settings.METRICS_DIR, f'{os.getpid()}.json')
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as file:
+        json.dump(values.snapshot(), file)
+    os.replace(temporary, path)
+
+
+def flush_at_exit():
+    if settings.METRICS_DIR and os.getpid() in _registries:
+        flush()
+
+
+def snapshots():
+    """Значения всех процессов из METRICS_DIR или только текущего."""
+    if not settings.METRICS_DIR:
+        return [registry().snapshot()]
+    flush()
+    found = []
+    for name in os.listdir(settings.METRICS_DIR):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(
+                os.path.join(settings.METRICS_DIR, name), encoding='utf-8'
+            ) as file:
+                found.append(json.load(file))
+        except (OSError, ValueError):
+            # Файл процесса, который как раз удалили или переписывают.
+            continue
+    return found
+
+
+def merge(found):
+    """Складывает значения процессов."""
+    total = Registry()
+    for snapshot in found:
+        for name, values, value in snapshot['counters']:
+            total.inc(name, tuple(map(tuple, values)), value)
+        for name, values, data in snapshot['histograms']:
+            key = (name, tuple(map(tuple, values)))
+            current = total.histograms.setdefault(key, [0] * len(data))
+            total.histograms[key] = [a + b for a, b in zip(current, data)]
+    return total
+
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace(
+        '\n', r'\n'
+    )
+
+
+def format_labels(values):
+    if not values:
+        return ''
+    return '{' + ','.join(
+        f'{name}="{escape(value)}"' for name, value in values
+    ) + '}'
+
+
+def number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(total):
+    """Текстовый формат Prometheus 0.0.4."""
+    lines = []
+    for name, help_text in COUNTERS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for (metric, values), value in sorted(total.counters.items()):
+            if metric == name:
+                lines.append(
+                    f'{name}{format_labels(values)} {number(value)}'
+                )
+    for name, (buckets, help_text) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for (metric, values), data in sorted(total.histograms.items()):
+            if metric != name:
+                continue
+            counts = data[:-2] + [data[-1]]
+            for bound, count in zip(buckets + ('+Inf',), counts):
+                lines.append(
+                    f'{name}_bucket'
+                    f'{format_labels(values + (("le", bound),))} {count}'
+                )
+            lines.append(
+                f'{name}_sum{format_labels(values)} {number(data[-2])}'
+            )
+            lines.append(f'{name}_count{format_labels(values)} {data[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def totals(name):
+    """Значения счётчика name всех процессов по наборам меток."""
+    return {
+        values: value
+        for (metric, values), value in merge(snapshots()).counters.items()
+        if metric == name
+    }
+
+
+def export():
+    return render(merge(snapshots()))
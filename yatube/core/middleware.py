@@ -0,0 +1,100 @@
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+
+from . import internal, metrics, querystats, template_profiler
+
+logger = logging.getLogger(__name__)
+
+
+class QueryProfileMiddleware:
+    """
+    Профилирует SQL у доли запросов QUERY_PROFILE_SAMPLE_RATE: 0 —
+    выключено, 1 — каждый запрос. Остальные запросы проходят без обёрток.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.QUERY_PROFILE_SAMPLE_RATE
+        if not rate or random.random() >= rate:
+            return self.get_response(request)
+        recorder = querystats.QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+        match = request.resolver_match
+        try:
+            querystats.save(
+                recorder.sample(match.view_name if match else '', total)
+            )
+        except Exception:
+            # Статистика не должна ломать ответ.
+            logger.exception('Выборка запросов не сохранена')
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Время, SQL, шаблоны, кэш и размер каждого ответа для core.metrics.
+    При выключенном METRICS_ENABLED Django не включает middleware в цепочку.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = metrics.RequestStats()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            stack.enter_context(metrics.tracking(stats))
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats.execute))
+            response = self.get_response(request)
+        match = request.resolver_match
+        metrics.record(
+            view=match.view_name if match else '',
+            method=request.method,
+            status=response.status_code,
+            size=None if response.streaming else len(response.content),
+            duration=time.perf_counter() - start,
+            stats=stats
+        )
+        return response
+
+
+class TemplateProfileMiddleware:
+    """
+    Профиль вывода шаблонов одного запроса вместо ответа: при
+    TEMPLATE_PROFILE для запросов с токеном INTERNAL_TOKEN по параметру
+    ?profile_templates — свёрнутые стеки для flamegraph.pl,
+    ?profile_templates=table — таблица кадров.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if (
+            not settings.TEMPLATE_PROFILE
+            or 'profile_templates' not in request.GET
+            or not internal.allowed(request)
+        ):
+            return self.get_response(request)
+        with template_profiler.profile() as profile:
+            self.get_response(request)
+        if request.GET['profile_templates'] == 'table':
+            return HttpResponse(profile.table(), content_type='text/plain')
+        return HttpResponse(profile.folded(), content_type='text/plain')
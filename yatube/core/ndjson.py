@@ -0,0 +1,75 @@
+"""
+Сериализатор dumpdata/loaddata в NDJSON: по объекту на строку. В отличие
+от json, ни выгрузка, ни загрузка не держат все объекты в памяти.
+"""
+import json
+
+from django.core.serializers.base import DeserializationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.serializers.python import (
+    Deserializer as PythonDeserializer, Serializer as PythonSerializer
+)
+
+# Сколько естественных ключей связанных объектов помнит сериализатор.
+NATURAL_KEYS_LIMIT = 100000
+
+
+class Serializer(PythonSerializer):
+    internal_use_only = False
+
+    def start_serialization(self):
+        self._current = None
+        self.natural_keys = {}
+        self.json_kwargs = self.options.copy()
+        for option in ('stream', 'fields', 'indent'):
+            self.json_kwargs.pop(option, None)
+        self.json_kwargs.setdefault('cls', DjangoJSONEncoder)
+        self.json_kwargs.setdefault('ensure_ascii', False)
+
+    def end_serialization(self):
+        pass
+
+    def end_object(self, obj):
+        json.dump(self.get_dump_object(obj), self.stream, **self.json_kwargs)
+        self.stream.write('\n')
+        self._current = None
+
+    def handle_fk_field(self, obj, field):
+        """
+        Естественный ключ связанного объекта берётся из кэша: иначе
+        на каждый объект уходило бы по запросу за каждым внешним ключом.
+        """
+        model = field.remote_field.model
+        value = getattr(obj, field.get_attname())
+        if (
+            not self.use_natural_foreign_keys
+            or not hasattr(model, 'natural_key')
+            or value is None
+        ):
+            super().handle_fk_field(obj, field)
+            return
+        key = (model, value)
+        if key not in self.natural_keys:
+            if len(self.natural_keys) >= NATURAL_KEYS_LIMIT:
+                self.natural_keys.clear()
+            self.natural_keys[key] = getattr(obj, field.name).natural_key()
+        self._current[field.name] = self.natural_keys[key]
+
+    def getvalue(self):
+        return super(PythonSerializer, self).getvalue()
+
+
+def Deserializer(stream_or_string, **options):
+    """Читает объекты по строке, не загружая файл целиком."""
+    if isinstance(stream_or_string, (bytes, str)):
+        stream_or_string = stream_or_string.splitlines()
+    try:
+        for line in stream_or_string:
+            if isinstance(line, bytes):
+                line = line.decode()
+            if line.strip():
+                yield from PythonDeserializer([json.loads(line)], **options)
+    except (GeneratorExit, DeserializationError):
+        raise
+    except Exception as exc:
+        raise DeserializationError() from exc
@@ -0,0 +1,154 @@
+"""
+Выборочное профилирование SQL-запросов. Для доли запросов
+QUERY_PROFILE_SAMPLE_RATE middleware считает запросы к базе, их общее
+время, повторы и самые медленные из них и пишет итог по имени
+представления в лог core.querystats и в таблицу SQLite
+QUERY_PROFILE_PATH. Отчёт — manage.py querystats.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+# Сколько самых медленных запросов запоминается на одну выборку.
+SLOWEST_COUNT = 5
+SQL_MAX_LENGTH = 500
+
+logger = logging.getLogger(__name__)
+
+
+class QueryRecorder:
+    """Обёртка connection.execute_wrapper: время и текст каждого запроса."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(
+                (sql, repr(params), time.perf_counter() - start)
+            )
+
+    @property
+    def sql_time(self):
+        return sum(duration for _, _, duration in self.queries)
+
+    @property
+    def duplicates(self):
+        """Сколько запросов повторили уже выполненный с теми же параметрами."""
+        counts = Counter((sql, params) for sql, params, _ in self.queries)
+        return sum(count - 1 for count in counts.values())
+
+    def slowest(self, count=SLOWEST_COUNT):
+        return [
+            {'sql': sql[:SQL_MAX_LENGTH], 'ms': round(duration * 1000, 3)}
+            for sql, _, duration in sorted(
+                self.queries, key=lambda query: query[2], reverse=True
+            )[:count]
+        ]
+
+    def sample(self, view, total_time):
+        return {
+            'view': view,
+            'queries': len(self.queries),
+            'duplicates': self.duplicates,
+            'sql_ms': round(self.sql_time * 1000, 3),
+            'total_ms': round(total_time * 1000, 3),
+            'slowest': self.slowest(),
+        }
+
+
+class QueryStatsStore:
+    """
+    Выборки в файле SQLite, общем для всех процессов хоста. Как и
+    core.cache.SQLiteCache, каждый поток и процесс открывает своё
+    соединение.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS samples ('
+                'id INTEGER PRIMARY KEY, view TEXT NOT NULL, '
+                'created REAL NOT NULL, queries INTEGER NOT NULL, '
+                'duplicates INTEGER NOT NULL, sql_ms REAL NOT NULL, '
+                'total_ms REAL NOT NULL, slowest TEXT NOT NULL)'
+            )
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def add(self, sample):
+        self.db.execute(
+            'INSERT INTO samples (view, created, queries, duplicates, '
+            'sql_ms, total_ms, slowest) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [
+                sample['view'], time.time(), sample['queries'],
+                sample['duplicates'], sample['sql_ms'], sample['total_ms'],
+                json.dumps(sample['slowest'], ensure_ascii=False),
+            ]
+        )
+
+    def summary(self, view=None):
+        """Сводка по представлениям: самые дорогие по SQL — первыми."""
+        rows = self.db.execute(
+            'SELECT view, count(*), avg(queries), max(queries), '
+            'avg(duplicates), avg(sql_ms), avg(total_ms) FROM samples '
+            'WHERE ? IS NULL OR view = ? GROUP BY view '
+            'ORDER BY avg(sql_ms) DESC', [view, view]
+        )
+        names = (
+            'view', 'samples', 'avg_queries', 'max_queries',
+            'avg_duplicates', 'avg_sql_ms', 'avg_total_ms'
+        )
+        return [dict(zip(names, row)) for row in rows]
+
+    def slowest(self, view=None, count=10):
+        """Самые медленные запросы из всех выборок."""
+        queries = []
+        for name, slowest in self.db.execute(
+            'SELECT view, slowest FROM samples '
+            'WHERE ? IS NULL OR view = ?', [view, view]
+        ):
+            queries.extend(
+                dict(query, view=name) for query in json.loads(slowest)
+            )
+        return sorted(
+            queries, key=lambda query: query['ms'], reverse=True
+        )[:count]
+
+    def clear(self):
+        self.db.execute('DELETE FROM samples')
+
+
+_stores = {}
+
+
+def store():
+    """Хранилище выборок по пути из QUERY_PROFILE_PATH."""
+    path = settings.QUERY_PROFILE_PATH
+    if path not in _stores:
+        _stores[path] = QueryStatsStore(path)
+    return _stores[path]
+
+
+def save(sample):
+    logger.info(json.dumps(sample, ensure_ascii=False))
+    if settings.QUERY_PROFILE_PATH:
+        store().add(sample)
@@ -0,0 +1,37 @@
+import os
+import shutil
+import tempfile
+
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+def temporary_caches(directory):
+    """Кэш тестов: файл SQLite в каталоге directory."""
+    return {
+        'default': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': os.path.join(directory, 'cache.sqlite3'),
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Запускает тесты с кэшем во временном каталоге, чтобы cache.clear()
+    в тестах не очищал кэш запущенного сайта.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        self.cache_dir = tempfile.mkdtemp(prefix='yatube-cache-')
+        self.cache_settings = override_settings(
+            CACHES=temporary_caches(self.cache_dir)
+        )
+        self.cache_settings.enable()
+        super().setup_test_environment(**kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        super().teardown_test_environment(**kwargs)
+        self.cache_settings.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
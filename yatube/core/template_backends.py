@@ -0,0 +1,52 @@
+import os
+
+from django.template import TemplateDoesNotExist, engines
+from django.template.backends.django import (
+    DjangoTemplates as BaseDjangoTemplates, Template as BaseTemplate, reraise
+)
+
+from . import metrics
+
+
+class Template(BaseTemplate):
+    def render(self, context=None, request=None):
+        with metrics.template_timer():
+            return super().render(context, request)
+
+
+class DjangoTemplates(BaseDjangoTemplates):
+    """Шаблоны Django, время вывода которых учитывает core.metrics."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+    def precompile(self):
+        """
+        Компилирует все шаблоны каталогов DIRS; с cached.Loader они
+        остаются в памяти. Ошибка в шаблоне не даёт процессу запуститься.
+        """
+        names = []
+        for directory in self.engine.dirs:
+            for root, _, files in os.walk(directory):
+                for file in sorted(files):
+                    name = os.path.relpath(
+                        os.path.join(root, file), directory
+                    ).replace(os.sep, '/')
+                    self.engine.get_template(name)
+                    names.append(name)
+        return names
+
+
+def precompile():
+    """Имена шаблонов, скомпилированных всеми движками DjangoTemplates."""
+    return [
+        name
+        for backend in engines.all() if isinstance(backend, DjangoTemplates)
+        for name in backend.precompile()
+    ]
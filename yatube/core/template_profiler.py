@@ -0,0 +1,138 @@
+"""
+Профилировщик вывода шаблонов Django. Внутри profile() каждый шаблон
+и каждый тег (include, for, thumbnail, {{ }} с фильтрами вроде
+addclass) — кадр стека. Для кадров считаются вызовы, полное и
+собственное время, а стеки выгружаются в свёрнутом формате
+flamegraph.pl и speedscope: «кадр;кадр;кадр микросекунды».
+Обёртки ставятся при первом профилировании; пока профиль не включён
+в потоке, они только проверяют это.
+"""
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.template.base import Node, Template, TextNode, TokenType
+
+_lock = threading.Lock()
+_local = threading.local()
+_installed = []
+QUOTES = '"\''
+
+
+class Profile:
+    def __init__(self):
+        self.stack = []
+        self.active = Counter()
+        # Имя кадра -> [вызовы, полное время, собственное время].
+        self.stats = {}
+        self.stacks = Counter()
+
+    def enter(self, name):
+        self.stack.append([name, time.perf_counter(), 0.0])
+        self.active[name] += 1
+
+    def exit(self):
+        name, start, children = self.stack[-1]
+        elapsed = time.perf_counter() - start
+        path = ';'.join(frame[0] for frame in self.stack)
+        self.stack.pop()
+        self.active[name] -= 1
+        stats = self.stats.setdefault(name, [0, 0.0, 0.0])
+        stats[0] += 1
+        if not self.active[name]:
+            # Рекурсивный кадр учитывается в полном времени один раз.
+            stats[1] += elapsed
+        stats[2] += elapsed - children
+        self.stacks[path] += elapsed - children
+        if self.stack:
+            self.stack[-1][2] += elapsed
+
+    def folded(self):
+        """Стеки с собственным временем в микросекундах."""
+        return ''.join(
+            f'{path} {round(seconds * 1e6)}\n'
+            for path, seconds in sorted(self.stacks.items())
+            if round(seconds * 1e6)
+        )
+
+    def table(self, limit=None):
+        """Кадры по убыванию собственного времени."""
+        rows = sorted(
+            self.stats.items(), key=lambda item: item[1][2], reverse=True
+        )[:limit]
+        lines = [
+            f'{"собств., мс":>12} {"полное, мс":>11} {"вызовов":>8}  кадр'
+        ]
+        for name, (calls, cumulative, own) in rows:
+            lines.append(
+                f'{own * 1000:>12.2f} {cumulative * 1000:>11.2f} '
+                f'{calls:>8}  {name}'
+            )
+        return '\n'.join(lines) + '\n'
+
+
+def node_name(node):
+    """Имя тега; у extends и block — вместе с аргументом."""
+    token = getattr(node, 'token', None)
+    if token is None:
+        return type(node).__name__
+    if token.token_type == TokenType.VAR:
+        # Переменная — по цепочке фильтров: {{ |addclass }}.
+        filters = ''.join(
+            f'|{func.__name__} ' for func, _ in node.filter_expression.filters
+        )
+        return '{{ %s}}' % filters
+    bits = token.split_contents()
+    if bits[0] in ('extends', 'block') and len(bits) > 1:
+        return f'{bits[0]} {bits[1].strip(QUOTES)}'
+    return bits[0]
+
+
+def current():
+    return getattr(_local, 'profile', None)
+
+
+def install():
+    """Обёртки Template.render и Node.render_annotated, один раз."""
+    with _lock:
+        if _installed:
+            return
+        render_template = Template.render
+        render_node = Node.render_annotated
+
+        def template_render(template, context):
+            profile = current()
+            if profile is None:
+                return render_template(template, context)
+            profile.enter(template.name or '<string>')
+            try:
+                return render_template(template, context)
+            finally:
+                profile.exit()
+
+        def render_annotated(node, context):
+            profile = current()
+            if profile is None or isinstance(node, TextNode):
+                return render_node(node, context)
+            profile.enter(node_name(node))
+            try:
+                return render_node(node, context)
+            finally:
+                profile.exit()
+
+        Template.render = template_render
+        Node.render_annotated = render_annotated
+        _installed.append(True)
+
+
+@contextmanager
+def profile():
+    """Профилирует вывод шаблонов в текущем потоке."""
+    install()
+    previous = current()
+    _local.profile = Profile()
+    try:
+        yield _local.profile
+    finally:
+        _local.profile = previous
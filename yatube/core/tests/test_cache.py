@@ -0,0 +1,148 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from ..cache import CULL_EVERY, Namespace, SQLiteCache, versions
+
+PROCESSES = 4
+INCREMENTS = 50
+
+
+def make_cache(path, **options):
+    return SQLiteCache(path, {'OPTIONS': options})
+
+
+def increment(path, key):
+    shared = make_cache(path)
+    for _ in range(INCREMENTS):
+        shared.incr(key)
+
+
+def bump(name):
+    Namespace(name).bump()
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'cache.sqlite3')
+        self.cache = make_cache(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_tests_use_temporary_cache(self):
+        """Тесты не пишут в кэш сайта."""
+        location = settings.CACHES['default']['LOCATION']
+        self.assertFalse(location.startswith(settings.BASE_DIR))
+        self.assertTrue(os.path.basename(
+            os.path.dirname(location)
+        ).startswith('yatube-cache-'))
+
+    def test_basic_operations(self):
+        """Чтение, запись, добавление и удаление ключей."""
+        self.cache.set('a', {'value': 1})
+        self.cache.set_many({'b': 2, 'c': 3})
+        self.assertEqual(self.cache.get('a'), {'value': 1})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'missing']),
+            {'a': {'value': 1}, 'b': 2}
+        )
+        self.assertFalse(self.cache.add('b', 20))
+        self.assertTrue(self.cache.add('d', 4))
+        self.assertEqual(self.cache.incr('d', 2), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.delete_many(['a', 'b'])
+        self.assertIsNone(self.cache.get('a'))
+        self.assertTrue(self.cache.has_key('c'))
+        self.cache.clear()
+        self.assertFalse(self.cache.has_key('c'))
+
+    def test_failed_add_rolled_back(self):
+        """Ошибка внутри add и incr откатывает их транзакцию."""
+        self.cache.set('a', 1, timeout=-1)
+        self.cache.set('b', 'текст')
+        with self.assertRaises(Exception):
+            self.cache.add('a', lambda: None)
+        with self.assertRaises(TypeError):
+            self.cache.incr('b')
+        self.assertFalse(self.cache._db.in_transaction)
+        self.assertEqual(
+            self.cache._db.execute('SELECT COUNT(*) FROM cache').fetchone(),
+            (2,)
+        )
+
+    def test_expired_keys(self):
+        """Истёкшие ключи не читаются и могут быть добавлены заново."""
+        self.cache.set('a', 1, timeout=-1)
+        self.assertIsNone(self.cache.get('a'))
+        self.assertFalse(self.cache.touch('a'))
+        self.assertTrue(self.cache.add('a', 2))
+        self.assertEqual(self.cache.get('a'), 2)
+
+    def test_cull(self):
+        """Число записей ограничено MAX_ENTRIES."""
+        small = make_cache(self.path, MAX_ENTRIES=10)
+        for number in range(300):
+            small.set(str(number), number)
+        count = small._db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        self.assertLessEqual(count, 10 + CULL_EVERY)
+        self.assertEqual(small.get('299'), 299)
+
+    def test_incr_across_processes(self):
+        """Увеличение счётчика из нескольких процессов не теряет шагов."""
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=increment, args=(self.path, 'counter'))
+            for _ in range(PROCESSES)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+        self.assertEqual(
+            self.cache.get('counter'), PROCESSES * INCREMENTS
+        )
+
+
+class NamespaceTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bump_invalidates_keys(self):
+        """bump() делает недействительными все ключи пространства."""
+        posts = Namespace('test:posts')
+        other = Namespace('test:other')
+        posts.set_many({'a': 1, 'b': 2})
+        other.set('a', 3)
+        self.assertEqual(posts.get_many(['a', 'b']), {'a': 1, 'b': 2})
+        posts.bump()
+        self.assertEqual(posts.get_many(['a', 'b']), {})
+        self.assertEqual(other.get('a'), 3)
+
+    def test_bump_from_another_process(self):
+        """Версия, сброшенная в другом процессе, видна в этом."""
+        posts = Namespace('test:posts')
+        posts.set('a', 1)
+        worker = multiprocessing.get_context('fork').Process(
+            target=bump, args=('test:posts',)
+        )
+        worker.start()
+        worker.join()
+        self.assertEqual(worker.exitcode, 0)
+        self.assertIsNone(posts.get('a'))
+
+    def test_versions(self):
+        """Версии нескольких пространств совпадают с их version()."""
+        spaces = [Namespace(f'test:{number}') for number in range(3)]
+        found = versions(spaces)
+        for space in spaces:
+            self.assertEqual(found[space.name], space.version())
@@ -0,0 +1,149 @@
+import multiprocessing
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+from .. import metrics
+
+INDEX_URL = reverse('posts:index')
+METRICS_URL = reverse('core:metrics')
+PROCESSES = 3
+REQUESTS = 5
+TOKEN = 'secret'
+AUTHORIZATION = f'Bearer {TOKEN}'
+
+
+def record_requests(directory):
+    """Запросы другого процесса с общим каталогом метрик."""
+    with override_settings(METRICS_DIR=directory):
+        for _ in range(REQUESTS):
+            metrics.record(
+                'posts:index', 'GET', 200, 100, 0.01, metrics.RequestStats()
+            )
+        metrics.flush()
+
+
+@override_settings(INTERNAL_TOKEN=TOKEN)
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.create(author=cls.user, text='Тест')
+        cls.guest = Client()
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry().clear()
+
+    def test_request_metrics(self):
+        """Запрос попадает в счётчики и гистограммы своего маршрута."""
+        size = len(self.guest.get(INDEX_URL).content)
+        text = self.guest.get(
+            METRICS_URL, HTTP_AUTHORIZATION=AUTHORIZATION
+        ).content.decode()
+        route = '{view="posts:index"}'
+        self.assertIn(
+            'yatube_requests_total'
+            '{method="GET",status="200",view="posts:index"} 1', text
+        )
+        self.assertIn(f'yatube_request_duration_seconds_count{route} 1', text)
+        self.assertIn(f'yatube_template_duration_seconds_count{route} 1', text)
+        self.assertIn(
+            'yatube_response_size_bytes_bucket'
+            '{view="posts:index",le="+Inf"} 1', text
+        )
+        self.assertIn(f'yatube_response_size_bytes_sum{route} {size}', text)
+        self.assertIn('yatube_cache_requests_total{result="miss"', text)
+        self.assertIn('# TYPE yatube_db_duration_seconds histogram', text)
+
+    def test_histogram_buckets(self):
+        """Корзины гистограммы накопительные."""
+        for seconds in (0.003, 0.02, 20):
+            metrics.registry().observe(
+                metrics.DURATION, metrics.labels(view='x'), seconds
+            )
+        text = metrics.render(metrics.merge([metrics.registry().snapshot()]))
+        for bound, count in (('0.005', 1), ('0.025', 2), ('10', 2),
+                             ('+Inf', 3)):
+            with self.subTest(bound=bound):
+                self.assertIn(
+                    'yatube_request_duration_seconds_bucket'
+                    f'{{view="x",le="{bound}"}} {count}', text
+                )
+
+    def test_label_escaping(self):
+        """Кавычки и переводы строк в метках экранируются."""
+        self.assertEqual(
+            metrics.format_labels((('view', 'a"b\nc\\'),)),
+            r'{view="a\"b\nc\\"}'
+        )
+
+    def test_processes_aggregated(self):
+        """Выгрузка складывает значения всех процессов из METRICS_DIR."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=record_requests, args=[directory])
+            for _ in range(PROCESSES)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        with override_settings(METRICS_DIR=directory):
+            text = metrics.export()
+        self.assertIn(
+            'yatube_requests_total'
+            '{method="GET",status="200",view="posts:index"} '
+            f'{PROCESSES * REQUESTS}', text
+        )
+
+    def test_token_required(self):
+        """
+        Без токена метрик не видно, в том числе запросу, который прокси
+        на той же машине передаёт с адреса 127.0.0.1.
+        """
+        for headers in [
+            {'REMOTE_ADDR': '203.0.113.1'},
+            {
+                'REMOTE_ADDR': '127.0.0.1',
+                'HTTP_X_FORWARDED_FOR': '203.0.113.1',
+            },
+            {'HTTP_AUTHORIZATION': 'Bearer wrong'},
+        ]:
+            with self.subTest(headers=headers):
+                response = self.guest.get(METRICS_URL, **headers)
+                self.assertEqual(response.status_code, 404)
+        response = self.guest.get(
+            METRICS_URL,
+            REMOTE_ADDR='127.0.0.1',
+            HTTP_X_FORWARDED_FOR='203.0.113.1',
+            HTTP_AUTHORIZATION=AUTHORIZATION,
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_no_token_configured(self):
+        """Без INTERNAL_TOKEN метрики закрыты для всех."""
+        with override_settings(INTERNAL_TOKEN=''):
+            response = self.guest.get(
+                METRICS_URL, HTTP_AUTHORIZATION='Bearer '
+            )
+        self.assertEqual(response.status_code, 404)
+
+    def test_disabled(self):
+        """METRICS_ENABLED=False: запросы не считаются, выгрузки нет."""
+        with override_settings(METRICS_ENABLED=False):
+            client = Client()
+            client.get(INDEX_URL)
+            response = client.get(
+                METRICS_URL, HTTP_AUTHORIZATION=AUTHORIZATION
+            )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(metrics.registry().snapshot()['counters'], [])
@@ -0,0 +1,82 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+from .. import querystats
+
+INDEX_URL = reverse('posts:index')
+INDEX_VIEW = 'posts:index'
+
+
+class QueryProfileTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.create(author=cls.user, text='Тест')
+        cls.guest = Client()
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings = override_settings(
+            QUERY_PROFILE_PATH=os.path.join(directory, 'stats.sqlite3'),
+            QUERY_PROFILE_SAMPLE_RATE=1
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_sample_recorded(self):
+        """Выборка попадает в лог и в таблицу под именем представления."""
+        with self.assertLogs('core.querystats', 'INFO') as logs:
+            self.guest.get(INDEX_URL)
+        sample = json.loads(logs.records[0].getMessage())
+        self.assertEqual(sample['view'], INDEX_VIEW)
+        self.assertGreater(sample['queries'], 0)
+        self.assertTrue(sample['slowest'])
+        [row] = querystats.store().summary()
+        self.assertEqual(row['view'], INDEX_VIEW)
+        self.assertEqual(row['samples'], 1)
+        self.assertEqual(row['max_queries'], sample['queries'])
+
+    def test_not_sampled(self):
+        """При нулевой доле запросы не профилируются."""
+        with override_settings(QUERY_PROFILE_SAMPLE_RATE=0):
+            self.guest.get(INDEX_URL)
+        self.assertEqual(querystats.store().summary(), [])
+
+    def test_duplicates(self):
+        """Повтор запроса с теми же параметрами считается дубликатом."""
+        recorder = querystats.QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for pk in (1, 1, 2):
+                list(Post.objects.filter(pk=pk))
+        self.assertEqual(len(recorder.queries), 3)
+        self.assertEqual(recorder.duplicates, 1)
+
+    def test_report_command(self):
+        """manage.py querystats выводит сводку и очищает выборки."""
+        with self.assertLogs('core.querystats', 'INFO'):
+            self.guest.get(INDEX_URL)
+            self.guest.get(INDEX_URL)
+        out = StringIO()
+        call_command('querystats', stdout=out)
+        self.assertIn(INDEX_VIEW, out.getvalue())
+        out = StringIO()
+        call_command('querystats', as_json=True, slowest=3, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['views'][0]['samples'], 2)
+        self.assertLessEqual(len(report['slowest']), 3)
+        call_command('querystats', clear=True, stdout=StringIO())
+        self.assertEqual(querystats.store().summary(), [])
@@ -0,0 +1,34 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.template import engines
+from django.template.loaders.cached import Loader
+from django.test import SimpleTestCase
+from django.urls import reverse
+
+from ..template_backends import precompile
+
+ABOUT_URL = reverse('about:author')
+
+
+class PrecompileTests(SimpleTestCase):
+    def test_templates_cached(self):
+        """Все шаблоны каталога templates/ компилируются в кэш загрузчика."""
+        names = precompile()
+        self.assertIn('posts/index.html', names)
+        self.assertIn('posts/includes/post_context.html', names)
+        [loader] = engines['django'].engine.template_loaders
+        self.assertIsInstance(loader, Loader)
+        self.assertTrue(set(names) <= set(loader.get_template_cache))
+
+    def test_bench_startup(self):
+        """Замер запуска сравнивает процессы без прогрева и с ним."""
+        out = StringIO()
+        call_command('bench_startup', url=ABOUT_URL, repeat=1, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report), {'lazy', 'precompiled'})
+        for mode, result in report.items():
+            with self.subTest(mode=mode):
+                self.assertEqual(result['status'], 200)
+                self.assertLessEqual(result['boot_ms'], result['ttfr_ms'])
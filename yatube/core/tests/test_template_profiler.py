@@ -0,0 +1,114 @@
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.template import Context, engines
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import template_profiler
+
+LOGIN_URL = reverse('users:login')
+PROFILE_URL = f'{LOGIN_URL}?profile_templates'
+TABLE_URL = f'{LOGIN_URL}?profile_templates=table'
+TOKEN = 'secret'
+AUTHORIZATION = f'Bearer {TOKEN}'
+
+
+class TemplateProfileTests(TestCase):
+    def test_frames(self):
+        """
+        Шаблоны, теги и фильтры — кадры; текст между тегами — нет,
+        собственное время вложенных кадров не входит в родителя.
+        """
+        template = engines['django'].from_string(
+            '{% for item in items %}{{ item|upper }}{% endfor %}'
+            '{% if items %}конец{% endif %}'
+        ).template
+        with template_profiler.profile() as profile:
+            template.render(Context({'items': ['а', 'б']}))
+        self.assertEqual(profile.stats['<string>'][0], 1)
+        self.assertEqual(profile.stats['for'][0], 1)
+        self.assertEqual(profile.stats['{{ |upper }}'][0], 2)
+        self.assertEqual(profile.stats['if'][0], 1)
+        self.assertEqual(len(profile.stats), 4)
+        self.assertEqual(set(profile.stacks), {
+            '<string>', '<string>;for', '<string>;for;{{ |upper }}',
+            '<string>;if',
+        })
+        total = profile.stats['<string>'][1]
+        self.assertAlmostEqual(
+            sum(own for _, _, own in profile.stats.values()), total
+        )
+
+    def test_recursion(self):
+        """Вложенный кадр с тем же именем не удваивает полное время."""
+        template = engines['django'].from_string(
+            '{% for row in rows %}{% for item in row %}'
+            '{{ item }}{% endfor %}{% endfor %}'
+        ).template
+        with template_profiler.profile() as profile:
+            template.render(Context({'rows': [[1, 2], [3]]}))
+        calls, cumulative, _ = profile.stats['for']
+        self.assertEqual(calls, 3)
+        self.assertLessEqual(cumulative, profile.stats['<string>'][1])
+
+    def test_off_outside_profile(self):
+        """Вне profile() вывод шаблонов не записывается."""
+        template = engines['django'].from_string('{{ value }}').template
+        with template_profiler.profile() as profile:
+            pass
+        template.render(Context({'value': 1}))
+        self.assertEqual(profile.stats, {})
+
+
+@override_settings(TEMPLATE_PROFILE=True, INTERNAL_TOKEN=TOKEN)
+class TemplateProfileMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.guest = Client()
+        cls.internal = Client(HTTP_AUTHORIZATION=AUTHORIZATION)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_folded(self):
+        """?profile_templates отдаёт свёрнутые стеки вместо страницы."""
+        response = self.internal.get(PROFILE_URL)
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        stacks = [
+            line.rsplit(' ', 1)[0]
+            for line in response.content.decode().splitlines()
+        ]
+        self.assertTrue(stacks)
+        for stack in stacks:
+            self.assertTrue(stack.startswith('users/login.html'))
+        self.assertTrue(any(
+            stack.endswith('{{ |addclass }}') for stack in stacks
+        ))
+        self.assertTrue(any(';include;' in stack for stack in stacks))
+
+    def test_table(self):
+        """=table отдаёт таблицу кадров."""
+        content = self.internal.get(TABLE_URL).content.decode()
+        self.assertIn('users/login.html', content)
+        self.assertIn('{{ |addclass }}', content)
+
+    def test_disabled(self):
+        """
+        Без TEMPLATE_PROFILE или без токена, в том числе за прокси на
+        той же машине, страница выводится как обычно.
+        """
+        for settings, client, headers in [
+            [{'TEMPLATE_PROFILE': False}, self.internal, {}],
+            [{'INTERNAL_TOKEN': ''}, self.internal, {}],
+            [{}, self.guest, {
+                'REMOTE_ADDR': '127.0.0.1',
+                'HTTP_X_FORWARDED_FOR': '203.0.113.1',
+            }],
+        ]:
+            with self.subTest(settings=settings, headers=headers):
+                with override_settings(**settings):
+                    response = client.get(PROFILE_URL, **headers)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertTemplateUsed(response, 'users/login.html')
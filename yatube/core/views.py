@@ -1,5 +1,9 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from . import internal, metrics
+
 
 def permission_denied_view(request, exception):
     return render(request, 'core/403.html', {'path': request.path}, status=403)
@@ -11,3 +15,12 @@ def page_not_found(request, exception):
 
 def server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+def metrics_export(request):
+    """Метрики в формате Prometheus, только с токеном INTERNAL_TOKEN."""
+    if not settings.METRICS_ENABLED or not internal.allowed(request):
+        raise Http404
+    return HttpResponse(
+        metrics.export(), content_type='text/plain; version=0.0.4'
+    )
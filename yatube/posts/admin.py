@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import Comment, Follow, Group, Post
+from . import search
+from .models import Comment, Follow, Group, Post, UserStats
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -16,6 +17,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск через поисковый индекс вместо LIKE по text."""
+        if not search_term:
+            return queryset, False
+        return search.backend().filter(queryset, search_term), False
+
 
 admin.site.register(Post, PostAdmin)
 
@@ -24,3 +31,5 @@ admin.site.register(Group)
 admin.site.register(Comment)
 
 admin.site.register(Follow)
+
+admin.site.register(UserStats)
@@ -0,0 +1,116 @@
+"""
+JSON-версия лент только для чтения. Посты берутся теми же выборками,
+что и в HTML-представлениях, страницы листаются по курсору, а
+?fields=id,text оставляет в ответе только нужные поля. Ответы несут
+ETag и Last-Modified из posts.freshness и на условный запрос
+отвечают 304 без выборки постов.
+"""
+from django.conf import settings
+from django.http import JsonResponse
+
+from . import feeds, freshness
+from .models import Group, Post, User
+from .paginators import KeysetPaginator
+
+NOT_FOUND = 'Не найдено.'
+
+FIELDS = {
+    'id': lambda request, post: post.pk,
+    'text': lambda request, post: post.text,
+    'pub_date': lambda request, post: post.pub_date.isoformat(),
+    'author': lambda request, post: post.author.username,
+    'author_name': lambda request, post: post.author.get_full_name(),
+    'group': lambda request, post: post.group and post.group.slug,
+    'comment_count': lambda request, post: post.comment_count,
+    'image': lambda request, post: (
+        request.build_absolute_uri(post.image.url) if post.image else None
+    ),
+    'image_variants': lambda request, post: [
+        {
+            'url': request.build_absolute_uri(variant.image.url),
+            'format': variant.format,
+            'width': variant.width,
+            'height': variant.height,
+        } for variant in post.image_variants.all()
+    ],
+}
+
+
+def error(message, status):
+    return JsonResponse({'detail': message}, status=status)
+
+
+def selected_fields(request):
+    """Поля из ?fields=; ValueError, если среди них есть неизвестные."""
+    names = [
+        name.strip() for name in request.GET.get('fields', '').split(',')
+        if name.strip()
+    ]
+    unknown = [name for name in names if name not in FIELDS]
+    if unknown:
+        raise ValueError('Неизвестные поля: ' + ', '.join(unknown))
+    return names or list(FIELDS)
+
+
+def serialize(request, post, fields):
+    return {name: FIELDS[name](request, post) for name in fields}
+
+
+def feed_response(request, post_list, field='pub_date'):
+    try:
+        fields = selected_fields(request)
+    except ValueError as exc:
+        return error(str(exc), 400)
+    posts = post_list.for_feed()
+    if 'image_variants' not in fields:
+        posts = posts.prefetch_related(None)
+    page = KeysetPaginator(
+        posts, settings.POSTS_COUNT_ON_PAGE, field=field
+    ).get_page(request.GET.get('cursor'))
+    return JsonResponse({
+        'results': [serialize(request, post, fields) for post in page],
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    })
+
+
+@freshness.conditional(freshness.index_keys)
+def index(request):
+    return feed_response(request, Post.objects.all())
+
+
+@freshness.conditional(freshness.group_keys)
+def group_posts(request, slug):
+    group = Group.objects.filter(slug=slug).first()
+    if group is None:
+        return error(NOT_FOUND, 404)
+    return feed_response(request, group.posts.all())
+
+
+@freshness.conditional(freshness.profile_keys)
+def profile(request, username):
+    author = User.objects.filter(username=username).first()
+    if author is None:
+        return error(NOT_FOUND, 404)
+    return feed_response(request, author.posts.all())
+
+
+@freshness.conditional(freshness.post_keys)
+def post_detail(request, post_id):
+    try:
+        fields = selected_fields(request)
+    except ValueError as exc:
+        return error(str(exc), 400)
+    post = Post.objects.for_feed().filter(pk=post_id).first()
+    if post is None:
+        return error(NOT_FOUND, 404)
+    return JsonResponse(serialize(request, post, fields))
+
+
+@freshness.conditional(freshness.follow_keys)
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return error('Нужна авторизация.', 401)
+    return feed_response(
+        request, feeds.follow_posts(request.user), field=feeds.ORDER_FIELD
+    )
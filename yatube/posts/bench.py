@@ -0,0 +1,338 @@
+import math
+import random
+from datetime import timedelta
+from io import StringIO
+from itertools import islice
+from statistics import mean
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Count
+from django.template import engines
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import cards, counters, feeds, freshness, search, transfer
+from .models import Comment, Follow, Group, Post, User, UserStats
+from .transfer import last_pk
+
+BATCH_SIZE = 5000
+FEED_TEMPLATES = ('index', 'group_list', 'profile', 'follow')
+ENGINES = ('django', 'jinja2')
+PREFIX = 'bench'
+WORDS = (
+    'лес поле река город утро вечер книга письмо дорога дом окно свет '
+    'ветер море гора снег дождь солнце песня слово друг время жизнь'
+).split()
+PERIOD = timedelta(days=365)
+
+
+def check_database():
+    """
+    Замеры создают данные, удаляют индексы и очищают кэши, поэтому
+    запускаются только с отдельной базой из BENCH_DATABASE.
+    """
+    if (
+        not settings.BENCH_DATABASE
+        or connection.settings_dict['NAME'] == settings.MAIN_DATABASE
+    ):
+        raise CommandError(
+            'Замеры меняют базу и очищают кэш: задайте переменную '
+            'окружения BENCH_DATABASE с путём к отдельной от основной базе.'
+        )
+
+
+def bulk_create(model, objects, ignore_conflicts=False):
+    """Сохраняет объекты пачками, не держа их все в памяти."""
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, BATCH_SIZE))
+        if not batch:
+            return
+        model.objects.bulk_create(batch, ignore_conflicts=ignore_conflicts)
+
+
+def insert(kind, objects):
+    """Как bulk_create, но с датами объектов: transfer.insert."""
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, BATCH_SIZE))
+        if not batch:
+            return
+        transfer.insert(transfer.KINDS[kind], batch)
+
+
+def created_pks(model, after):
+    return list(
+        model.objects.filter(pk__gt=after).order_by('pk').values_list(
+            'pk', flat=True
+        )
+    )
+
+
+def text(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def moment(rng, now):
+    return now - PERIOD * rng.random()
+
+
+def seed_users(rng, count):
+    start = last_pk(User)
+    bulk_create(User, (
+        User(
+            username=f'{PREFIX}{start}_{number}',
+            first_name=rng.choice(WORDS).title(),
+            password='!'
+        ) for number in range(count)
+    ))
+    return created_pks(User, start)
+
+
+def seed_groups(count):
+    start = last_pk(Group)
+    bulk_create(Group, (
+        Group(
+            title=f'Группа {number}',
+            slug=f'{PREFIX}-{start}-{number}',
+            description='Группа для замеров'
+        ) for number in range(count)
+    ))
+    return created_pks(Group, start)
+
+
+def seed_posts(rng, count, user_ids, group_ids, now):
+    start = last_pk(Post)
+    groups = group_ids + [None] * (len(group_ids) // 3)
+    insert('posts', (
+        Post(
+            author_id=rng.choice(user_ids),
+            group_id=rng.choice(groups) if groups else None,
+            text=text(rng),
+            pub_date=moment(rng, now)
+        ) for _ in range(count)
+    ))
+    return created_pks(Post, start)
+
+
+def seed_comments(rng, count, user_ids, post_ids, now):
+    insert('comments', (
+        Comment(
+            post_id=rng.choice(post_ids),
+            author_id=rng.choice(user_ids),
+            text=text(rng, 5),
+            created=moment(rng, now)
+        ) for _ in range(count)
+    ))
+
+
+def seed_follows(rng, count, user_ids):
+    pairs = (
+        (rng.choice(user_ids), rng.choice(user_ids)) for _ in range(count)
+    )
+    bulk_create(Follow, (
+        Follow(user_id=user, author_id=author)
+        for user, author in pairs if user != author
+    ), ignore_conflicts=True)
+
+
+def refresh(user_ids):
+    """Пересчитывает то, что обычно поддерживают сигналы."""
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        UserStats.objects.recount(user_ids[start:start + BATCH_SIZE])
+    counters.clear()
+    cards.clear()
+    freshness.touch([freshness.SITE])
+    search.reindex()
+    if settings.POSTS_FEED_FANOUT:
+        call_command('backfill_feed', stdout=StringIO())
+
+
+def seed(users, groups, posts, comments=0, follows=0, random_seed=0):
+    """
+    Заполняет базу синтетическими данными через bulk_create. Сигналы
+    при этом не срабатывают, поэтому статистика и кэши пересчитываются
+    в конце. Возвращает число созданных пользователей, групп и постов.
+    """
+    check_database()
+    rng = random.Random(random_seed)
+    now = timezone.now()
+    user_ids = seed_users(rng, users)
+    group_ids = seed_groups(groups)
+    post_ids = seed_posts(rng, posts, user_ids, group_ids, now)
+    if comments and post_ids:
+        seed_comments(rng, comments, user_ids, post_ids, now)
+    if follows:
+        seed_follows(rng, follows, user_ids)
+    refresh(user_ids)
+    return {
+        'users': len(user_ids),
+        'groups': len(group_ids),
+        'posts': len(post_ids),
+    }
+
+
+def busiest(queryset, field):
+    """Значение field, у которого больше всего строк в queryset."""
+    return queryset.values(field).annotate(total=Count('pk')).order_by(
+        '-total'
+    ).values_list(field, flat=True).first()
+
+
+def targets():
+    """
+    Адреса для замера: самые наполненные группа, профиль, пост
+    и лента подписок. Возвращает словарь имя -> (адрес, пользователь).
+    """
+    group = busiest(Post.objects.exclude(group=None), 'group__slug')
+    author = busiest(Post.objects.all(), 'author__username')
+    post = busiest(Comment.objects.all(), 'post') or busiest(
+        Post.objects.all(), 'pk'
+    )
+    reader = busiest(Follow.objects.all(), 'user')
+    found = {'index': (reverse('posts:index'), None)}
+    if group is not None:
+        found['group_posts'] = (
+            reverse('posts:group_list', args=[group]), None
+        )
+    if author is not None:
+        found['profile'] = (reverse('posts:profile', args=[author]), None)
+    if post is not None:
+        found['post_detail'] = (
+            reverse('posts:post_detail', args=[post]), None
+        )
+    if reader is not None:
+        found['follow_index'] = (
+            reverse('posts:follow_index'), User.objects.get(pk=reader)
+        )
+    return found
+
+
+def percentile(values, share):
+    """Процентиль по методу ближайшего ранга."""
+    values = sorted(values)
+    return values[max(math.ceil(share * len(values)) - 1, 0)]
+
+
+def measure_view(client, url, repeat, warmup=1, cold=False):
+    for _ in range(warmup):
+        client.get(url)
+    times, queries = [], []
+    for _ in range(repeat):
+        if cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            start = perf_counter()
+            response = client.get(url)
+            times.append((perf_counter() - start) * 1000)
+        queries.append(len(context.captured_queries))
+    return {
+        'url': url,
+        'status': response.status_code,
+        'p50_ms': round(percentile(times, 0.5), 3),
+        'p95_ms': round(percentile(times, 0.95), 3),
+        'mean_ms': round(mean(times), 3),
+        'queries': max(queries),
+    }
+
+
+def run(repeat=20, warmup=1, cold=False, only=None):
+    """Замер представлений через тестовый клиент Django."""
+    report = {}
+    for name, (url, user) in targets().items():
+        if only and name not in only:
+            continue
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        report[name] = measure_view(client, url, repeat, warmup, cold)
+    return report
+
+
+def feed_contexts():
+    """
+    Контексты шаблонов лент: первая страница ленты, самых наполненных
+    группы и автора и ленты подписок самого подписанного читателя.
+    """
+    def page(posts):
+        return Paginator(
+            posts.for_feed(), settings.POSTS_COUNT_ON_PAGE
+        ).get_page(1)
+    # Фрагмент {% cache %} не сохраняется: замеряется вывод, а не кэш.
+    found = {'index': {
+        'page_obj': page(Post.objects.all()),
+        'feed_version': '',
+        'fragment_timeout': 0,
+    }}
+    group = busiest(Post.objects.exclude(group=None), 'group')
+    if group is not None:
+        group = Group.objects.get(pk=group)
+        found['group_list'] = {
+            'group': group, 'page_obj': page(group.posts.all())
+        }
+    author = busiest(Post.objects.all(), 'author')
+    if author is not None:
+        author = User.objects.get(pk=author)
+        found['profile'] = {
+            'author': author,
+            'stats': UserStats.objects.for_user(author),
+            'following': False,
+            'page_obj': page(author.posts.all()),
+        }
+    reader = busiest(Follow.objects.all(), 'user')
+    if reader is not None:
+        found['follow'] = {'page_obj': page(
+            feeds.follow_posts(User.objects.get(pk=reader))
+        )}
+    return found
+
+
+def measure_template(template, context, request, repeat, warmup=1):
+    # Первые выводы выбирают посты страницы и их превью.
+    for _ in range(warmup):
+        template.render(dict(context), request)
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        template.render(dict(context), request)
+        times.append((perf_counter() - start) * 1000)
+    return {
+        'p50_ms': round(percentile(times, 0.5), 3),
+        'p95_ms': round(percentile(times, 0.95), 3),
+        'mean_ms': round(mean(times), 3),
+    }
+
+
+def run_templates(repeat=50, warmup=1, only=None):
+    """
+    Вывод шаблонов лент каждым настроенным движком из ENGINES, без
+    кэша карточек. speedup — во сколько раз медианный вывод Jinja2
+    быстрее вывода Django.
+    """
+    names = [name for name in ENGINES if name in engines]
+    request = RequestFactory().get('/')
+    request.user = AnonymousUser()
+    report = {}
+    for name, context in feed_contexts().items():
+        if only and name not in only:
+            continue
+        result = report[name] = {
+            engine: measure_template(
+                engines[engine].get_template(f'posts/{name}.html'),
+                context, request, repeat, warmup
+            ) for engine in names
+        }
+        if len(result) == len(ENGINES):
+            result['speedup'] = round(
+                result['django']['p50_ms'] / result['jinja2']['p50_ms'], 2
+            )
+    return report
@@ -0,0 +1,99 @@
+import logging
+
+from django.conf import settings
+
+from core import metrics
+from core.cache import Namespace, versions
+
+CARD_TEMPLATE = 'posts/includes/post_context.html'
+
+POST = 'post'
+AUTHOR = 'author'
+GROUP = 'group'
+
+# Попадания и промахи считаются в памяти процесса, в core.metrics, а не
+# в общем кэше: иначе каждый показ ленты был бы записью в кэш.
+CARD_REQUESTS = metrics.counter(
+    'yatube_post_cards_total',
+    'Карточки постов из кэша: result="hit" или "miss".'
+)
+
+CARDS = Namespace('posts:card')
+
+logger = logging.getLogger(__name__)
+
+
+def owner(kind, pk):
+    """Версия поста, автора или группы, входящая в ключи их карточек."""
+    return Namespace(
+        f'posts:card_version:{kind}:{pk}',
+        version_timeout=settings.POSTS_CARD_CACHE_TIMEOUT
+    )
+
+
+def bump(kind, pk):
+    """Новая версия делает недействительными все карточки с её участием."""
+    owner(kind, pk).bump()
+
+
+def card_keys(posts, not_show_group=False):
+    """
+    Ключи карточек постов. Ключ включает версии поста, автора и группы,
+    так что правка любого из них даёт карточке новый ключ.
+    """
+    owners = {}
+    for post in posts:
+        for kind, pk in ((POST, post.pk), (AUTHOR, post.author_id),
+                         (GROUP, post.group_id)):
+            if pk is not None:
+                owners[kind, pk] = owner(kind, pk)
+    found = versions(list(owners.values()))
+
+    def version(kind, pk):
+        if pk is None:
+            return '-'
+        return found[owners[kind, pk].name]
+    return {
+        post.pk: '{}:{}:{}:{}:{:d}'.format(
+            post.pk,
+            version(POST, post.pk),
+            version(AUTHOR, post.author_id),
+            version(GROUP, post.group_id),
+            bool(not_show_group)
+        ) for post in posts
+    }
+
+
+def get_cards(keys):
+    cards = CARDS.get_many(keys)
+    record(hits=len(cards), misses=len(keys) - len(cards))
+    return cards
+
+
+def set_card(key, html):
+    CARDS.set(key, html, settings.POSTS_CARD_CACHE_TIMEOUT)
+
+
+def record(hits, misses):
+    values = metrics.registry()
+    for result, value in (('hit', hits), ('miss', misses)):
+        if value:
+            values.inc(CARD_REQUESTS, metrics.labels(result=result), value)
+    logger.debug('Карточки постов: попаданий %s, промахов %s', hits, misses)
+
+
+def clear():
+    """Сбрасывает все карточки, например после правки шаблона."""
+    CARDS.bump()
+
+
+def stats():
+    """
+    Попадания и промахи кэша карточек с запуска процессов: всех из
+    METRICS_DIR или только текущего.
+    """
+    found = metrics.totals(CARD_REQUESTS)
+    return {
+        'hits': found.get(metrics.labels(result='hit'), 0),
+        'misses': found.get(metrics.labels(result='miss'), 0),
+    }
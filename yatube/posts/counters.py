@@ -0,0 +1,66 @@
+from hashlib import md5
+
+from django.conf import settings
+
+from core.cache import Namespace
+
+INDEX = 'index'
+GROUP = 'group'
+PROFILE = 'profile'
+FOLLOW = 'follow'
+
+COUNTS = Namespace('posts:count')
+
+
+def feed_key(feed, pk=None):
+    """Ключ счётчика ленты в пространстве COUNTS: <лента>[:<id>]."""
+    if pk is None:
+        return feed
+    return f'{feed}:{pk}'
+
+
+def slug_key(slug):
+    """
+    Slug группы в ключе кэша: memcached не принимает пробелы и символы
+    не из ASCII, а в slug они бывают.
+    """
+    return md5(slug.encode()).hexdigest()
+
+
+def post_feed_keys(author_id, group_id):
+    keys = [feed_key(INDEX), feed_key(PROFILE, author_id)]
+    if group_id is not None:
+        keys.append(feed_key(GROUP, group_id))
+    return keys
+
+
+def get_count(key, count):
+    """Счётчик из кэша; при промахе считается вызовом count()."""
+    value = COUNTS.get(key)
+    if value is None:
+        value = count()
+        set_count(key, value)
+    return value
+
+
+def set_count(key, value):
+    COUNTS.set(key, value, settings.POSTS_COUNT_CACHE_TIMEOUT)
+
+
+def change(keys, delta):
+    """Сдвигает уже закэшированные счётчики, отсутствующие пропускает."""
+    version = COUNTS.version()
+    for key in keys:
+        try:
+            COUNTS.cache.incr(COUNTS.make_key(key, version), delta)
+        except ValueError:
+            pass
+
+
+def reset(keys):
+    COUNTS.delete_many(keys)
+
+
+def clear():
+    """Сбрасывает счётчики всех лент."""
+    COUNTS.bump()
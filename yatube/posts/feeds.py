@@ -0,0 +1,213 @@
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from . import counters, freshness, tasks
+from .models import FeedEntry, Follow, Post, UserStats
+
+BATCH_SIZE = 1000
+# Поле, по которому упорядочена лента подписок: дата записи FeedEntry
+# или дата поста автора, который не раскладывается по лентам.
+ORDER_FIELD = 'feed_date'
+
+QUEUE = tasks.Queue('feeds', 'POSTS_FEED_WORKERS')
+
+
+def is_fanned_out(followers_count):
+    """Посты автора раскладываются по лентам подписчиков при публикации."""
+    return followers_count <= settings.POSTS_FEED_FANOUT_MAX_FOLLOWERS
+
+
+class MergedFeed:
+    """
+    Несколько наборов постов, упорядоченных по (feed_date, pk), как один:
+    фильтры и сортировка применяются к каждому набору, а срез собирается
+    слиянием, и из каждого набора читается не больше строк, чем в срезе.
+    """
+    ordered = True
+    CHAINED = (
+        'annotate', 'defer', 'exclude', 'filter', 'for_feed', 'order_by',
+        'prefetch_related', 'select_related',
+    )
+
+    def __init__(self, parts):
+        self.parts = parts
+
+    def __getattr__(self, name):
+        if name not in self.CHAINED:
+            raise AttributeError(name)
+
+        def chained(*args, **kwargs):
+            return MergedFeed(
+                [getattr(part, name)(*args, **kwargs) for part in self.parts]
+            )
+        return chained
+
+    def count(self):
+        return sum(part.count() for part in self.parts)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        order = self.parts[0].query.order_by
+        rows = heapq.merge(
+            *(part[:index.stop] for part in self.parts),
+            key=lambda post: (getattr(post, ORDER_FIELD), post.pk),
+            reverse=not order or order[0].startswith('-'),
+        )
+        return list(islice(rows, index.start or 0, index.stop))
+
+
+def fanned_out_ids(author_ids):
+    """Авторы, посты которых сейчас лежат в FeedEntry."""
+    skipped = set(UserStats.objects.filter(
+        user_id__in=author_ids, feed_fanned_out=False
+    ).values_list('user_id', flat=True))
+    return [pk for pk in author_ids if pk not in skipped]
+
+
+def follow_posts(user):
+    """
+    Посты ленты подписок. В режиме POSTS_FEED_FANOUT лента читается по
+    индексу FeedEntry (user, -pub_date), а посты авторов, которые не
+    раскладываются по лентам, подмешиваются только если читатель на них
+    подписан.
+    """
+    if not settings.POSTS_FEED_FANOUT:
+        return Post.objects.filter(
+            author__following__user=user
+        ).annotate(**{ORDER_FIELD: F('pub_date')})
+    order = (f'-{ORDER_FIELD}', '-pk')
+    entries = Post.objects.filter(feed_entries__user=user).annotate(
+        **{ORDER_FIELD: F('feed_entries__pub_date')}
+    ).order_by(*order)
+    skipped = list(Follow.objects.filter(
+        user=user, author__stats__feed_fanned_out=False
+    ).values_list('author_id', flat=True))
+    if not skipped:
+        return entries
+    return MergedFeed([entries, Post.objects.filter(
+        author_id__in=skipped
+    ).annotate(**{ORDER_FIELD: F('pub_date')}).order_by(*order)])
+
+
+def add_entries(entries):
+    """Сохраняет записи ленты пачками, не держа их все в памяти."""
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, BATCH_SIZE))
+        if not batch:
+            return
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_post(post, follower_ids):
+    if fanned_out_ids([post.author_id]):
+        add_entries(
+            FeedEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in follower_ids
+        )
+
+
+def fan_out_posts(posts):
+    """Раскладывает посты по лентам подписчиков их авторов."""
+    followers = {}
+    for user_id, author_id in Follow.objects.filter(
+        author_id__in=fanned_out_ids(list({post.author_id for post in posts}))
+    ).values_list('user_id', 'author_id'):
+        followers.setdefault(author_id, []).append(user_id)
+    add_entries(
+        FeedEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for post in posts for user_id in followers.get(post.author_id, ())
+    )
+
+
+def author_entries(user_id, author_id):
+    return (
+        FeedEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+        for pk, pub_date in Post.objects.filter(
+            author_id=author_id
+        ).values_list('pk', 'pub_date').iterator()
+    )
+
+
+def touch_feeds(user_ids):
+    keys = [counters.feed_key(counters.FOLLOW, pk) for pk in user_ids]
+    counters.reset(keys)
+    freshness.touch(keys)
+
+
+def fill_follow(user_id, author_id):
+    """Добавляет в ленту подписчика все посты автора."""
+    with transaction.atomic():
+        if not Follow.objects.filter(
+            user_id=user_id, author_id=author_id
+        ).exists() or not fanned_out_ids([author_id]):
+            return
+        add_entries(author_entries(user_id, author_id))
+        touch_feeds([user_id])
+
+
+def clear_follow(follow):
+    FeedEntry.objects.filter(
+        user_id=follow.user_id, post__author_id=follow.author_id
+    ).delete()
+
+
+def switch_author(author_id):
+    """
+    Приводит ленты к числу подписчиков автора: после перехода через
+    POSTS_FEED_FANOUT_MAX_FOLLOWERS его посты раскладываются по лентам
+    всех подписчиков или удаляются из них.
+    """
+    with transaction.atomic():
+        stats = UserStats.objects.select_for_update().filter(
+            user_id=author_id
+        ).first()
+        if stats is None:
+            return
+        fanned_out = is_fanned_out(stats.followers_count)
+        if fanned_out == stats.feed_fanned_out:
+            return
+        follower_ids = list(Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True))
+        if fanned_out:
+            for user_id in follower_ids:
+                add_entries(author_entries(user_id, author_id))
+        else:
+            FeedEntry.objects.filter(post__author_id=author_id).delete()
+        stats.feed_fanned_out = fanned_out
+        stats.save(update_fields=['feed_fanned_out'])
+        touch_feeds(follower_ids)
+
+
+def follow_changed(follow, created):
+    """
+    Подписка создана или удалена. Записи ленты подписчика добавляются
+    после ответа, а перешедший порог автор перестраивается отдельной
+    задачей.
+    """
+    if created:
+        QUEUE.defer(
+            ('feed-follow', follow.user_id, follow.author_id),
+            fill_follow, follow.user_id, follow.author_id
+        )
+    else:
+        clear_follow(follow)
+    stats = UserStats.objects.filter(user_id=follow.author_id).values_list(
+        'followers_count', 'feed_fanned_out'
+    ).first()
+    if stats is not None and is_fanned_out(stats[0]) != stats[1]:
+        QUEUE.defer(
+            ('feed-author', follow.author_id), switch_author, follow.author_id
+        )
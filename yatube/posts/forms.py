@@ -1,4 +1,7 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.template.defaultfilters import filesizeformat
 
 from .models import Post, Comment
 
@@ -18,6 +21,40 @@ class PostForm(forms.ModelForm):
             'image': ('Изображение для поста')
         }
 
+    def __init__(self, *args, oversized=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        # Загрузка картинки прервана обработчиком posts.uploads: файла
+        # в запросе нет, но пост без неё сохранять нельзя.
+        self.oversized = 'image' in oversized
+        if self.oversized:
+            # Поля, шедшие в запросе после файла, не прочитаны: вместо
+            # ошибок «обязательное поле» форма покажет только размер.
+            for name, field in self.fields.items():
+                if name != 'image' and name not in self.data:
+                    field.required = False
+
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if not self.oversized and not isinstance(image, UploadedFile):
+            return image
+        if self.oversized or image.size > settings.POSTS_UPLOAD_MAX_SIZE:
+            raise forms.ValidationError(
+                'Размер файла не должен превышать %(size)s.',
+                code='file_too_large',
+                params={
+                    'size': filesizeformat(settings.POSTS_UPLOAD_MAX_SIZE)
+                }
+            )
+        # ImageField уже открыл файл: Pillow прочитал только заголовок.
+        width, height = image.image.size
+        if width * height > settings.POSTS_IMAGE_MAX_PIXELS:
+            raise forms.ValidationError(
+                'Картинка слишком большая: не больше %(pixels)s пикселей.',
+                code='too_many_pixels',
+                params={'pixels': settings.POSTS_IMAGE_MAX_PIXELS}
+            )
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,204 @@
+"""
+Свежесть лент для условных GET. У каждой ленты и каждого поста в кэше
+лежат версия и время последнего изменения; сигналы обновляют их после
+фиксации транзакции. Из них складываются ETag и Last-Modified, так что
+ответ 304 не требует ни выборки постов, ни их вывода. Если состояния
+нет в кэше, лента считается изменённой в момент промаха.
+"""
+from datetime import timedelta
+from functools import wraps
+from hashlib import md5
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from . import counters
+from .models import Follow, Post, User
+
+# Имена пользователей и названия групп есть на всех страницах.
+SITE = 'site'
+POST = 'post'
+# Меняется с любым постом: по нему ленту подписок проверяют читатели,
+# у которых авторов больше FOLLOW_KEYS_MAX.
+FOLLOWED = counters.FOLLOW
+FOLLOW_KEYS_MAX = 100
+
+
+def state_key(key):
+    return f'posts:fresh:{key}'
+
+
+def post_key(pk):
+    return f'{POST}:{pk}'
+
+
+def feed_keys(author_id, *group_slugs):
+    """
+    Ленты, в которые попадает пост автора из групп group_slugs. Группы
+    здесь по slug: так ETag страницы группы считается без запроса к базе.
+    """
+    return [
+        counters.feed_key(counters.INDEX),
+        counters.feed_key(counters.PROFILE, author_id),
+        FOLLOWED,
+    ] + [
+        counters.feed_key(counters.GROUP, counters.slug_key(slug))
+        for slug in group_slugs if slug is not None
+    ]
+
+
+def new_state():
+    return uuid4().hex, timezone.now()
+
+
+def touch(keys):
+    """Новые версии лент keys после фиксации текущей транзакции."""
+    keys = list(keys)
+
+    def save():
+        cache.set_many({state_key(key): new_state() for key in keys}, None)
+    transaction.on_commit(save)
+
+
+def touch_posts(posts):
+    """
+    Отмечает изменёнными посты и ленты, где они выводятся; posts —
+    кортежи (pk, author_id, group_slug).
+    """
+    keys = set()
+    for pk, author_id, group_slug in posts:
+        keys.add(post_key(pk))
+        keys.update(feed_keys(author_id, group_slug))
+    touch(keys)
+
+
+def states(keys):
+    """Версия и время изменения каждой ленты одним обращением к кэшу."""
+    found = cache.get_many([state_key(key) for key in keys])
+    result = {}
+    for key in keys:
+        state = found.get(state_key(key))
+        if state is None:
+            state = new_state()
+            if not cache.add(state_key(key), state, None):
+                state = cache.get(state_key(key), state)
+        result[key] = state
+    return result
+
+
+def token(keys, *extra):
+    """ETag без кавычек и время изменения лент keys; extra входит в ETag."""
+    found = states(keys)
+    etag = md5('|'.join(
+        [found[key][0] for key in keys] + [str(value) for value in extra]
+    ).encode()).hexdigest()
+    return etag, max(modified for _, modified in found.values())
+
+
+def conditional(keys_func, weak=False, settle=None):
+    """
+    Отвечает 304 Not Modified по If-None-Match и If-Modified-Since,
+    не вызывая представление. Ленты ответа называет keys_func(request,
+    *args, **kwargs); None — без условной обработки (объект не найден,
+    нет доступа). ETag зависит ещё от адреса с параметрами и от
+    пользователя. Слабый ETag — для HTML, где от вывода к выводу
+    меняется CSRF-токен. Если страница может отставать от базы из-за
+    кэша на settle(request) секунд, столько времени после изменения
+    ленты валидаторы не выдаются: иначе клиент закрепил бы устаревшую
+    страницу.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            keys = None
+            if request.method in ('GET', 'HEAD'):
+                keys = keys_func(request, *args, **kwargs)
+            if keys is None:
+                return view(request, *args, **kwargs)
+            etag, modified = token(
+                [SITE] + keys, request.get_full_path(), request.user.pk
+            )
+            if settle and timezone.now() - modified < timedelta(
+                seconds=settle(request)
+            ):
+                return view(request, *args, **kwargs)
+            etag = f'W/"{etag}"' if weak else f'"{etag}"'
+            last_modified = int(modified.timestamp())
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def index_keys(request):
+    return [counters.feed_key(counters.INDEX)]
+
+
+def group_keys(request, slug):
+    return [counters.feed_key(counters.GROUP, counters.slug_key(slug))]
+
+
+def profile_keys(request, username):
+    pk = User.objects.filter(
+        username=username
+    ).values_list('pk', flat=True).first()
+    return None if pk is None else [counters.feed_key(counters.PROFILE, pk)]
+
+
+def profile_page_keys(request, username):
+    """На странице автора есть ещё кнопка подписки пользователя."""
+    keys = profile_keys(request, username)
+    if keys is not None and request.user.is_authenticated:
+        keys.append(counters.feed_key(counters.FOLLOW, request.user.pk))
+    return keys
+
+
+def post_keys(request, post_id):
+    return [post_key(post_id)]
+
+
+def post_page_keys(request, post_id):
+    """На странице поста есть ещё статистика автора."""
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True
+    ).first()
+    if author_id is None:
+        return None
+    return [
+        post_key(post_id), counters.feed_key(counters.PROFILE, author_id)
+    ]
+
+
+def follow_keys(request):
+    """
+    Лента подписок меняется с подписками и с лентами авторов. Если
+    авторов больше FOLLOW_KEYS_MAX, вместо их лент проверяется общий
+    ключ FOLLOWED: так число ключей не растёт с числом подписок, а
+    лента лишь чаще считается изменённой.
+    """
+    if not request.user.is_authenticated:
+        return None
+    author_ids = list(Follow.objects.filter(
+        user=request.user
+    ).order_by('author_id').values_list(
+        'author_id', flat=True
+    )[:FOLLOW_KEYS_MAX + 1])
+    keys = [counters.feed_key(counters.FOLLOW, request.user.pk)]
+    if len(author_ids) > FOLLOW_KEYS_MAX:
+        return keys + [FOLLOWED]
+    return keys + [
+        counters.feed_key(counters.PROFILE, pk) for pk in author_ids
+    ]
@@ -0,0 +1,46 @@
+"""
+Карточки и картинки постов для шаблонов Jinja2: то же, что теги
+post_card и post_picture, с теми же ключами кэша карточек.
+"""
+from jinja2 import pass_context
+from markupsafe import Markup
+
+from . import cards
+from .templatetags.post_cards import cache_enabled
+from .templatetags.post_images import post_picture as picture_context
+
+PICTURE_TEMPLATE = 'posts/includes/picture.html'
+
+
+@pass_context
+def post_cards(context, posts, not_show_group=False):
+    """
+    Пары (пост, карточка) страницы. В лентах из POSTS_CARD_CACHE_VIEWS
+    карточки берутся из кэша за два обращения на страницу.
+    """
+    posts = list(posts or ())
+    card = context.environment.get_template(cards.CARD_TEMPLATE)
+    values = context.get_all()
+
+    def render(post):
+        return card.render(
+            values, post=post, not_show_group=not_show_group
+        )
+    if not cache_enabled(context):
+        return [(post, Markup(render(post))) for post in posts]
+    keys = cards.card_keys(posts, not_show_group)
+    found = cards.get_cards(keys.values())
+    result = []
+    for post in posts:
+        html = found.get(keys[post.pk])
+        if html is None:
+            html = render(post)
+            cards.set_card(keys[post.pk], html)
+        result.append((post, Markup(html)))
+    return result
+
+
+@pass_context
+def post_picture(context, post):
+    picture = context.environment.get_template(PICTURE_TEMPLATE)
+    return Markup(picture.render(picture_context(context, post)))
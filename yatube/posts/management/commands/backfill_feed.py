@@ -0,0 +1,50 @@
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import feeds
+from posts.models import FeedEntry, Follow, UserStats
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет ленты подписок FeedEntry по существующим подпискам и '
+        'отмечает авторов, чьи посты раскладываются по лентам.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Удалить все записи лент перед заполнением.'
+        )
+
+    def handle(self, *args, clear, **options):
+        with transaction.atomic():
+            if clear:
+                FeedEntry.objects.all().delete()
+            before = FeedEntry.objects.count()
+            # Без строки статистики автор считался бы раскладываемым
+            # при любом числе подписчиков.
+            missing = Follow.objects.filter(author__stats=None).values_list(
+                'author_id', flat=True
+            ).distinct().iterator()
+            while True:
+                author_ids = list(islice(missing, feeds.BATCH_SIZE))
+                if not author_ids:
+                    break
+                UserStats.objects.recount(author_ids)
+            UserStats.objects.update(feed_fanned_out=True)
+            UserStats.objects.filter(
+                followers_count__gt=settings.POSTS_FEED_FANOUT_MAX_FOLLOWERS
+            ).update(feed_fanned_out=False)
+            FeedEntry.objects.filter(
+                post__author__stats__feed_fanned_out=False
+            ).delete()
+            for user_id, author_id in Follow.objects.exclude(
+                author__stats__feed_fanned_out=False
+            ).order_by('pk').values_list('user_id', 'author_id').iterator():
+                feeds.add_entries(feeds.author_entries(user_id, author_id))
+            added = FeedEntry.objects.count() - before
+        self.stdout.write(f'Добавлено записей лент: {added}')
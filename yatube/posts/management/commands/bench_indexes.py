@@ -0,0 +1,138 @@
+import json
+from statistics import median
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+
+from posts import bench
+from posts.models import Comment, FeedEntry, Post
+
+MODELS = (Post, Comment, FeedEntry)
+
+
+def feed_queries():
+    """Запросы страниц лент в том виде, в каком их строят представления."""
+    size = settings.POSTS_COUNT_ON_PAGE
+    group_id, author_id = [
+        Post.objects.exclude(**{field: None}).values(field).annotate(
+            total=Count('pk')
+        ).order_by('-total').values_list(field, flat=True).first()
+        for field in ('group', 'author')
+    ]
+    post_id = Comment.objects.values_list('post_id', flat=True).first()
+    reader_id = FeedEntry.objects.values_list('user_id', flat=True).first()
+    queries = {
+        'index': Post.objects.for_feed()[:size],
+        'index_page_100': Post.objects.for_feed()[size * 99:size * 100],
+        'group': Post.objects.filter(group_id=group_id).for_feed()[:size],
+        'group_count': Post.objects.filter(group_id=group_id).values('pk'),
+        'profile': Post.objects.filter(author_id=author_id).for_feed()[:size],
+        'comments': Comment.objects.filter(
+            post_id=post_id
+        ).select_related('author'),
+    }
+    if reader_id is not None:
+        queries['follow_entries'] = FeedEntry.objects.filter(
+            user_id=reader_id
+        ).values('post_id')[:size]
+    return queries
+
+
+def explain(sql, params):
+    prefix = (
+        'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else 'EXPLAIN'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f'{prefix} {sql}', params)
+        return [' '.join(map(str, row)) for row in cursor.fetchall()]
+
+
+def timings(sql, params, repeat):
+    results = []
+    with connection.cursor() as cursor:
+        for _ in range(repeat):
+            start = perf_counter()
+            cursor.execute(sql, params)
+            cursor.fetchall()
+            results.append((perf_counter() - start) * 1000)
+    return results
+
+
+def measure(queries, repeat):
+    report = {}
+    for name, queryset in queries.items():
+        sql, params = queryset.query.sql_with_params()
+        results = timings(sql, params, repeat)
+        report[name] = {
+            'plan': explain(sql, params),
+            'median_ms': round(median(results), 3),
+            'max_ms': round(max(results), 3),
+        }
+    return report
+
+
+def drop_indexes():
+    with connection.schema_editor() as editor:
+        for model in MODELS:
+            for index in model._meta.indexes:
+                editor.remove_index(model, index)
+
+
+def restore_indexes():
+    with connection.schema_editor() as editor:
+        for model in MODELS:
+            for index in model._meta.indexes:
+                editor.add_index(model, index)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает планы и время запросов лент с индексами '
+        'из Meta.indexes и без них.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0, metavar='POSTS',
+            help='Сначала создать столько синтетических постов.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз выполнять каждый запрос.'
+        )
+        parser.add_argument(
+            '--json', action='store_true', help='Вывести отчёт в JSON.'
+        )
+
+    def handle(self, *args, seed, repeat, **options):
+        bench.check_database()
+        if seed:
+            bench.seed(
+                users=max(seed // 100, 2), groups=max(seed // 10000, 1),
+                posts=seed, comments=seed, follows=seed // 10
+            )
+        if not Post.objects.exists():
+            raise CommandError('В базе нет постов: запустите с --seed.')
+        queries = feed_queries()
+        report = {'with_indexes': measure(queries, repeat)}
+        drop_indexes()
+        try:
+            report['without_indexes'] = measure(queries, repeat)
+        finally:
+            restore_indexes()
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+        for name in queries:
+            self.stdout.write(name)
+            for state, results in report.items():
+                result = results[name]
+                self.stdout.write(
+                    f'  {state}: {result["median_ms"]} мс '
+                    f'(макс. {result["max_ms"]} мс)'
+                )
+                for line in result['plan']:
+                    self.stdout.write(f'    {line}')
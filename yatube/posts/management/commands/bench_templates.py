@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from posts import bench
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет вывод шаблонов лент движками Django и Jinja2 '
+        'и выводит отчёт в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=50,
+            help='Сколько раз выводить каждый шаблон.'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=3,
+            help='Сколько выводов сделать до замера.'
+        )
+        parser.add_argument(
+            '--template', action='append', choices=bench.FEED_TEMPLATES,
+            dest='templates',
+            help='Замерить только этот шаблон; можно повторять.'
+        )
+        parser.add_argument(
+            '--output', help='Записать отчёт в файл вместо вывода.'
+        )
+
+    def handle(self, *args, repeat, warmup, templates, output, **options):
+        report = bench.run_templates(
+            repeat=repeat, warmup=warmup, only=templates
+        )
+        data = json.dumps(report, ensure_ascii=False, indent=2)
+        if output:
+            with open(output, 'w', encoding='utf-8') as file:
+                file.write(data)
+        else:
+            self.stdout.write(data)
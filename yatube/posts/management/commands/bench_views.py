@@ -0,0 +1,95 @@
+import json
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import template_profiler
+from posts import bench
+
+VIEWS = ('index', 'group_posts', 'profile', 'post_detail', 'follow_index')
+
+
+def regressions(report, baseline, tolerance):
+    """Представления, где p95 вырос больше допуска или прибавились запросы."""
+    found = []
+    for name, result in report.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        if result['queries'] > old['queries']:
+            found.append(
+                f'{name}: запросов {old["queries"]} -> {result["queries"]}'
+            )
+        if result['p95_ms'] > old['p95_ms'] * (1 + tolerance / 100):
+            found.append(
+                f'{name}: p95 {old["p95_ms"]} -> {result["p95_ms"]} мс'
+            )
+    return found
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет p50/p95 и число запросов основных страниц posts '
+        'и выводит отчёт в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз запрашивать каждую страницу.'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=1,
+            help='Сколько запросов сделать до замера.'
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.'
+        )
+        parser.add_argument(
+            '--view', action='append', choices=VIEWS, dest='views',
+            help='Замерить только эту страницу; можно повторять.'
+        )
+        parser.add_argument(
+            '--output', help='Записать отчёт в файл вместо вывода.'
+        )
+        parser.add_argument(
+            '--baseline',
+            help='Сравнить с отчётом из файла и упасть при регрессии.'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=20,
+            help='Допустимый рост p95 относительно baseline, в процентах.'
+        )
+        parser.add_argument(
+            '--profile-templates', metavar='FILE',
+            help=(
+                'Записать свёрнутые стеки вывода шаблонов за весь замер '
+                'в FILE для flamegraph.pl.'
+            )
+        )
+
+    def handle(self, *args, repeat, warmup, cold, views, output, baseline,
+               tolerance, profile_templates, **options):
+        bench.check_database()
+        with (
+            template_profiler.profile() if profile_templates
+            else nullcontext()
+        ) as profile:
+            report = bench.run(
+                repeat=repeat, warmup=warmup, cold=cold, only=views
+            )
+        if profile_templates:
+            with open(profile_templates, 'w', encoding='utf-8') as file:
+                file.write(profile.folded())
+        data = json.dumps(report, ensure_ascii=False, indent=2)
+        if output:
+            with open(output, 'w', encoding='utf-8') as file:
+                file.write(data)
+        else:
+            self.stdout.write(data)
+        if baseline:
+            with open(baseline, encoding='utf-8') as file:
+                found = regressions(report, json.load(file), tolerance)
+            if found:
+                raise CommandError('Регрессия: ' + '; '.join(found))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты, комментарии или подписки в NDJSON или CSV, '
+        'читая базу кусками.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--kind', choices=transfer.KINDS, default='posts',
+            help='Что выгрузить, по умолчанию посты.'
+        )
+        parser.add_argument(
+            '--format', choices=transfer.FORMATS, default='ndjson',
+            dest='file_format', help='Формат файла, по умолчанию ndjson.'
+        )
+        parser.add_argument(
+            '--output', help='Записать в файл вместо вывода.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=transfer.BATCH_SIZE,
+            help='Сколько строк читать из базы за раз.'
+        )
+
+    def handle(self, *args, kind, file_format, output, chunk_size,
+               **options):
+        if output:
+            with open(output, 'w', encoding='utf-8', newline='') as file:
+                rows, seconds = transfer.export(
+                    kind, file, file_format, chunk_size
+                )
+        else:
+            rows, seconds = transfer.export(
+                kind, self.stdout, file_format, chunk_size
+            )
+        # В stdout может идти сама выгрузка, поэтому отчёт — в stderr.
+        self.stderr.write(
+            transfer.report('Выгружено', rows, seconds),
+            style_func=self.style.SUCCESS
+        )
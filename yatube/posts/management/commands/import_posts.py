@@ -0,0 +1,53 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты, комментарии или подписки из NDJSON или CSV '
+        'пачками через bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл для загрузки; - читает стандартный ввод.'
+        )
+        parser.add_argument(
+            '--kind', choices=transfer.KINDS, default='posts',
+            help='Что загрузить, по умолчанию посты.'
+        )
+        parser.add_argument(
+            '--format', choices=transfer.FORMATS, dest='file_format',
+            help='Формат файла; по умолчанию по расширению, иначе ndjson.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=transfer.BATCH_SIZE,
+            help='Сколько строк сохранять одним bulk_create.'
+        )
+        parser.add_argument(
+            '--commit-every', type=int, default=10,
+            help='Сколько пачек сохранять в одной транзакции.'
+        )
+
+    def handle(self, *args, path, kind, file_format, batch_size,
+               commit_every, **options):
+        if file_format is None:
+            file_format = 'csv' if path.endswith('.csv') else 'ndjson'
+        try:
+            if path == '-':
+                rows, seconds = transfer.load(
+                    kind, sys.stdin, file_format, batch_size, commit_every
+                )
+            else:
+                with open(path, encoding='utf-8', newline='') as file:
+                    rows, seconds = transfer.load(
+                        kind, file, file_format, batch_size, commit_every
+                    )
+        except (transfer.TransferError, IntegrityError, KeyError,
+                ValueError) as error:
+            raise CommandError(f'Импорт остановлен: {error!r}')
+        self.stdout.write(transfer.report('Загружено', rows, seconds))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import User, UserStats
+
+FIELDS = (
+    'posts_count', 'following_count', 'followers_count', 'comments_count'
+)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику пользователей и сверяет её с базой.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько пользователей пересчитывать за один проход.'
+        )
+
+    def handle(self, *args, batch_size, **options):
+        user_ids = list(
+            User.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        fixed = 0
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            old = {
+                stats.user_id: tuple(getattr(stats, f) for f in FIELDS)
+                for stats in UserStats.objects.filter(user_id__in=batch)
+            }
+            for stats in UserStats.objects.recount(batch):
+                if old.get(stats.user_id) != tuple(
+                    getattr(stats, f) for f in FIELDS
+                ):
+                    fixed += 1
+        self.stdout.write(
+            f'Пересчитано пользователей: {len(user_ids)}, '
+            f'исправлено: {fixed}'
+        )
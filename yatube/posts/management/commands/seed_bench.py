@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from posts import bench
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, постами, '
+        'комментариями и подписками для замеров.'
+    )
+
+    def add_arguments(self, parser):
+        volumes = {
+            'users': 1000,
+            'groups': 50,
+            'posts': 100000,
+            'comments': 200000,
+            'follows': 20000,
+        }
+        for name, default in volumes.items():
+            parser.add_argument(
+                f'--{name}', type=int, default=default,
+                help=f'Сколько создать, по умолчанию {default}.'
+            )
+        parser.add_argument(
+            '--seed', type=int, default=0, dest='random_seed',
+            help='Зерно генератора случайных чисел.'
+        )
+
+    def handle(self, *args, users, groups, posts, comments, follows,
+               random_seed, **options):
+        bench.check_database()
+        created = bench.seed(
+            users=users, groups=groups, posts=posts, comments=comments,
+            follows=follows, random_seed=random_seed
+        )
+        self.stdout.write(
+            'Создано: пользователей {users}, групп {groups}, '
+            'постов {posts}'.format(**created)
+        )
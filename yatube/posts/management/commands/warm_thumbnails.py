@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.core.management.base import BaseCommand
+
+from posts import tasks, thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт недостающие превью и варианты картинок постов '
+        'в несколько потоков.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Сколько превью создавать одновременно.'
+        )
+        parser.add_argument(
+            '--variants', action='store_true',
+            help='Создать и варианты картинок постов, у которых их нет.'
+        )
+
+    def handle(self, *args, workers, variants, **options):
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True
+        ).distinct()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(
+                partial(tasks.run, thumbnails.generate),
+                names.iterator()
+            ))
+        self.stdout.write(
+            f'Создано превью: {results.count(True)}, '
+            f'уже были: {results.count(False)}, '
+            f'ошибок: {results.count(None)}'
+        )
+        if variants:
+            self.build_variants(workers)
+
+    def build_variants(self, workers):
+        """Картинки создаются в потоках, строки в базу пишет один поток."""
+        posts = list(Post.objects.exclude(image='').filter(
+            image_variants=None
+        ).select_related('group').only('image', 'author', 'group__slug'))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            made = pool.map(
+                partial(tasks.run, thumbnails.make_variants), posts
+            )
+            count = 0
+            for post, variants in zip(posts, made):
+                if variants is not None:
+                    thumbnails.save_variants(post, variants)
+                    count += 1
+        self.stdout.write(f'Варианты картинок созданы для постов: {count}')
@@ -0,0 +1,144 @@
+import re
+
+from django.db import migrations
+
+# Схема индекса и стеммер записаны здесь, а не берутся из posts.search и
+# posts.stemmer: миграция не должна зависеть от кода приложения и от
+# POSTS_SEARCH_BACKEND и на любой версии кода индексирует посты одинаково.
+# После смены posts.stemmer индекс строится заново: manage.py reindex_search.
+TABLE = 'posts_post_search'
+WORD = re.compile(r'\w+')
+BATCH_SIZE = 1000
+
+# Стеммер Snowball для русского языка, копия posts.stemmer на момент
+# миграции: https://snowballstem.org/algorithms/russian/stemmer.html
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = re.compile(
+    r'(?:ив|ивши|ившись|ыв|ывши|ывшись|(?<=[ая])(?:в|вши|вшись))$'
+)
+REFLEXIVE = re.compile(r'(?:ся|сь)$')
+ADJECTIVAL = re.compile(
+    r'(?:ивш|ывш|ующ|(?<=[ая])(?:ем|нн|вш|ющ|щ))?'
+    r'(?:ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых'
+    r'|ую|юю|ая|яя|ою|ею)$'
+)
+VERB = re.compile(
+    r'(?:ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло'
+    r'|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю'
+    r'|(?<=[ая])(?:ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно))$'
+)
+NOUN = re.compile(
+    r'(?:а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием'
+    r'|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+DERIVATIONAL = re.compile(r'ость?$')
+SUPERLATIVE = re.compile(r'ейше?$')
+
+
+def region(word, start):
+    """Начало области после первой согласной, идущей за гласной."""
+    for index in range(start + 1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            return index + 1
+    return len(word)
+
+
+def strip(pattern, word):
+    """Слово без окончания pattern и признак того, что оно было."""
+    stripped, found = pattern.subn('', word, count=1)
+    return stripped, bool(found)
+
+
+def stem(word):
+    """Основа слова в нижнем регистре, ё заменяется на е."""
+    word = word.lower().replace('ё', 'е')
+    vowel = next(
+        (index for index, letter in enumerate(word) if letter in VOWELS),
+        None
+    )
+    if vowel is None:
+        return word
+    r2 = region(word, region(word, 0))
+    head, rv = word[:vowel + 1], word[vowel + 1:]
+    rv, found = strip(PERFECTIVE_GERUND, rv)
+    if not found:
+        rv = REFLEXIVE.sub('', rv, count=1)
+        for pattern in (ADJECTIVAL, VERB, NOUN):
+            rv, found = strip(pattern, rv)
+            if found:
+                break
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    match = DERIVATIONAL.search(rv)
+    if match and len(head) + match.start() >= r2:
+        rv = rv[:match.start()]
+    rv, found = strip(SUPERLATIVE, rv)
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    elif not found and rv.endswith('ь'):
+        rv = rv[:-1]
+    return head + rv
+
+SQLITE_CREATE = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING '
+    "fts5(words, tokenize = 'unicode61 remove_diacritics 0')"
+)
+SQLITE_INSERT = f'INSERT INTO {TABLE} (rowid, words) VALUES (%s, %s)'
+POSTGRESQL_CREATE = [
+    f'CREATE TABLE IF NOT EXISTS {TABLE} ('
+    'post_id integer PRIMARY KEY REFERENCES posts_post (id) '
+    'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+    'document tsvector NOT NULL)',
+    f'CREATE INDEX IF NOT EXISTS {TABLE}_document '
+    f'ON {TABLE} USING gin (document)',
+    f'INSERT INTO {TABLE} (post_id, document) '
+    "SELECT id, to_tsvector('russian', text) FROM posts_post",
+]
+
+
+def fill_sqlite(apps, schema_editor):
+    """
+    Основы слов уже созданных постов. У SQLite нет русского стеммера,
+    поэтому слова приводятся к основе копией стеммера выше.
+    """
+    posts = apps.get_model('posts', 'Post').objects.using(
+        schema_editor.connection.alias
+    ).order_by('pk').values_list('pk', 'text')
+    rows = []
+    with schema_editor.connection.cursor() as cursor:
+        for pk, text in posts.iterator():
+            rows.append((pk, ' '.join(
+                stem(word.lower()) for word in WORD.findall(text)
+            )))
+            if len(rows) == BATCH_SIZE:
+                cursor.executemany(SQLITE_INSERT, rows)
+                rows = []
+        cursor.executemany(SQLITE_INSERT, rows)
+
+
+def create_index(apps, schema_editor):
+    """Таблица поискового индекса, заполненная уже созданными постами."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE)
+        fill_sqlite(apps, schema_editor)
+    elif vendor == 'postgresql':
+        for sql in POSTGRESQL_CREATE:
+            schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_postimagevariant'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
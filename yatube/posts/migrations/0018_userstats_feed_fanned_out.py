@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_post_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='feed_fanned_out',
+            field=models.BooleanField(default=True, verbose_name='Посты разложены по лентам подписчиков'),
+        ),
+    ]
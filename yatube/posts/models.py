@@ -1,8 +1,35 @@
-from django.db import models
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, models, router, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+logger = logging.getLogger(__name__)
+
+
+class AtomicSave:
+    """
+    Сохранение вместе с обработчиками post_save в одной транзакции:
+    счётчики UserStats меняются атомарно со строкой. Удаление через
+    Collector и так отправляет сигналы внутри транзакции.
+    """
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(
+            type(self), instance=self
+        )
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
+
+class GroupManager(models.Manager):
+    def get_by_natural_key(self, slug):
+        return self.get(slug=slug)
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200, verbose_name='Заголовок')
@@ -12,6 +39,8 @@ class Group(models.Model):
     )
     description = models.TextField(verbose_name='Описание')
 
+    objects = GroupManager()
+
     class Meta:
         verbose_name = 'Группа'
         verbose_name_plural = 'Группы'
@@ -19,8 +48,35 @@ class Group(models.Model):
     def __str__(self):
         return self.title
 
+    def natural_key(self):
+        return (self.slug,)
+
 
-class Post(models.Model):
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """
+        Посты для лент: автор и группа одним запросом, варианты картинок —
+        вторым. Комментарии считаются подзапросом, а не GROUP BY, чтобы
+        сортировка по pub_date с LIMIT шла по индексу.
+        """
+        return self.select_related(
+            'author', 'group'
+        ).prefetch_related(
+            'image_variants'
+        ).defer(
+            'group__description',
+            'author__password',
+        ).annotate(
+            comment_count=Coalesce(Subquery(
+                Comment.objects.filter(post=OuterRef('pk')).order_by().values(
+                    'post'
+                ).annotate(total=Count('pk')).values('total'),
+                output_field=models.IntegerField()
+            ), 0)
+        )
+
+
+class Post(AtomicSave, models.Model):
     text = models.TextField(
         verbose_name='Текст поста',
         help_text='Введите текст поста'
@@ -50,16 +106,23 @@ class Post(models.Model):
         blank=True
     )
 
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(fields=['-pub_date']),
+            models.Index(fields=['author', '-pub_date']),
+            models.Index(fields=['group', '-pub_date']),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
 
-class Comment(models.Model):
+class Comment(AtomicSave, models.Model):
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -85,12 +148,27 @@ class Comment(models.Model):
         ordering = ['-created']
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [models.Index(fields=['post', '-created'])]
 
     def __str__(self):
         return self.text[:15]
 
 
-class Follow(models.Model):
+class FollowManager(models.Manager):
+    def get_queryset(self):
+        """
+        Подписки вместе с пользователями: natural_key при dumpdata иначе
+        делает два запроса на каждую подписку.
+        """
+        return super().get_queryset().select_related('user', 'author')
+
+    def get_by_natural_key(self, username, author_username):
+        return self.get(
+            user__username=username, author__username=author_username
+        )
+
+
+class Follow(AtomicSave, models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -104,6 +182,192 @@ class Follow(models.Model):
         verbose_name='Автор'
     )
 
+    objects = FollowManager()
+
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow'
+            )
+        ]
+
+    def natural_key(self):
+        return self.user.natural_key() + self.author.natural_key()
+
+    natural_key.dependencies = [settings.AUTH_USER_MODEL.lower()]
+
+
+class PostImageVariant(models.Model):
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='image_variants',
+        verbose_name='Пост'
+    )
+    image = models.ImageField('Картинка', max_length=255)
+    format = models.CharField('Формат', max_length=10)
+    width = models.PositiveIntegerField('Ширина')
+    height = models.PositiveIntegerField('Высота')
+
+    class Meta:
+        ordering = ['width']
+        verbose_name = 'Вариант картинки'
+        verbose_name_plural = 'Варианты картинок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'format', 'width'],
+                name='unique_image_variant'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.format} {self.width}x{self.height}'
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date']
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_feed_entry'
+            )
+        ]
+        indexes = [models.Index(fields=['user', '-pub_date'])]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+
+class UserStatsManager(models.Manager):
+    def counted(self, user_ids):
+        """Несохранённая статистика пользователей по данным в базе."""
+        user_ids = list(user_ids)
+        counts = {
+            'posts_count': Post.objects.filter(author_id__in=user_ids)
+            .values_list('author_id').annotate(Count('pk')).order_by(),
+            'following_count': Follow.objects.filter(user_id__in=user_ids)
+            .values_list('user_id').annotate(Count('pk')).order_by(),
+            'followers_count': Follow.objects.filter(author_id__in=user_ids)
+            .values_list('author_id').annotate(Count('pk')).order_by(),
+            'comments_count': Comment.objects.filter(author_id__in=user_ids)
+            .values_list('author_id').annotate(Count('pk')).order_by(),
+        }
+        counts = {field: dict(rows) for field, rows in counts.items()}
+        return [
+            self.model(user_id=user_id, **{
+                field: values.get(user_id, 0)
+                for field, values in counts.items()
+            }) for user_id in user_ids
+        ]
+
+    def recount(self, user_ids):
+        """Пересчитывает счётчики пользователей по данным в базе."""
+        stats = self.counted(user_ids)
+        with transaction.atomic():
+            saved = self.filter(user_id__in=[item.user_id for item in stats])
+            # Разложены ли посты по лентам, знает только сама строка.
+            fanned_out = dict(saved.values_list('user_id', 'feed_fanned_out'))
+            for item in stats:
+                item.feed_fanned_out = fanned_out.get(item.user_id, True)
+            saved.delete()
+            self.bulk_create(stats)
+        return stats
+
+    def create_for(self, user_id):
+        """
+        Создаёт статистику пользователя по данным в базе. Если строку
+        успел создать параллельный запрос, возвращает None.
+        """
+        [stats] = self.counted([user_id])
+        try:
+            with transaction.atomic():
+                stats.save(force_insert=True)
+        except IntegrityError:
+            return None
+        return stats
+
+    def for_user(self, user):
+        try:
+            return user.stats
+        except self.model.DoesNotExist:
+            return self.create_for(user.pk) or self.get(user_id=user.pk)
+
+    def change(self, user_id, field, delta):
+        """
+        Сдвигает счётчик в транзакции сохранения. Статистику без строки
+        в базе создаёт пересчётом, который уже учитывает изменение.
+        Счётчик, который ушёл бы ниже нуля, разошёлся с данными: такой
+        случай пишется в лог, а статистика пересчитывается.
+        """
+        stats = self.filter(user_id=user_id)
+        if delta < 0:
+            stats = stats.filter(**{f'{field}__gte': -delta})
+        if stats.update(**{field: F(field) + delta}):
+            return
+        if delta < 0:
+            if self.filter(user_id=user_id).exists():
+                logger.warning(
+                    'Счётчик %s пользователя %s ушёл бы ниже нуля, '
+                    'статистика пересчитана', field, user_id
+                )
+                self.recount([user_id])
+            return
+        if self.create_for(user_id) is None:
+            stats.update(**{field: F(field) + delta})
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Постов'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписок'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписчиков'
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Комментариев'
+    )
+    feed_fanned_out = models.BooleanField(
+        default=True,
+        verbose_name='Посты разложены по лентам подписчиков'
+    )
+
+    objects = UserStatsManager()
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+    def __str__(self):
+        return str(self.user_id)
@@ -0,0 +1,84 @@
+from functools import wraps
+from hashlib import md5
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from core.cache import Namespace
+
+from . import counters
+
+PARAMS = ('page', 'cursor')
+# Сколько секунд живёт фрагмент с постами в шаблоне главной.
+INDEX_FRAGMENT_TIMEOUT = 20
+
+
+def feed_pages(feed, slug=None):
+    """Страницы одной ленты; их версия меняется при изменении ленты."""
+    name = f'posts:page:{feed}' if slug is None else (
+        f'posts:page:{feed}:{counters.slug_key(slug)}'
+    )
+    return Namespace(
+        name, version_timeout=settings.POSTS_PAGE_CACHE_TIMEOUT
+    )
+
+
+def bump(feed, slug=None):
+    feed_pages(feed, slug).bump()
+
+
+def cache_enabled(request):
+    return request.resolver_match.url_name in settings.POSTS_PAGE_CACHE_VIEWS
+
+
+def fragment_version(request, feed, slug=None):
+    """Версия ленты для {% cache %} в шаблоне, если страница кэшируется."""
+    if not cache_enabled(request):
+        return ''
+    return feed_pages(feed, slug).version()
+
+
+def stale_seconds(request):
+    """Сколько секунд страница ленты может отставать от базы."""
+    if cache_enabled(request) and not request.user.is_authenticated:
+        return settings.POSTS_PAGE_CACHE_TIMEOUT
+    return 0
+
+
+def index_stale_seconds(request):
+    return max(stale_seconds(request), INDEX_FRAGMENT_TIMEOUT)
+
+
+def page_key(request):
+    return md5(
+        '&'.join(request.GET.get(name, '') for name in PARAMS).encode()
+    ).hexdigest()
+
+
+def cache_anonymous_page(feed, slug_kwarg=None):
+    """
+    Отдаёт гостям страницу ленты из кэша. Ключ зависит от номера страницы
+    или курсора и от версии ленты, которую сбрасывают сигналы Post.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (
+                request.method != 'GET'
+                or not cache_enabled(request)
+                or request.user.is_authenticated
+            ):
+                return view(request, *args, **kwargs)
+            pages = feed_pages(feed, kwargs.get(slug_kwarg))
+            key = page_key(request)
+            content = pages.get(key)
+            if content is not None:
+                return HttpResponse(content)
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.cookies:
+                pages.set(
+                    key, response.content, settings.POSTS_PAGE_CACHE_TIMEOUT
+                )
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,187 @@
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from . import counters
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator, который берёт общее число постов из счётчика в кэше
+    вместо SELECT COUNT(*) на каждый запрос. При промахе считается
+    count_queryset — тот же набор постов без аннотаций ленты.
+    """
+
+    def __init__(self, object_list, per_page, count_key,
+                 count_queryset=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+        self.count_queryset = (
+            object_list if count_queryset is None else count_queryset
+        )
+
+        self.recounted = False
+
+    @cached_property
+    def count(self):
+        return counters.get_count(self.count_key, self.recount)
+
+    def recount(self):
+        self.recounted = True
+        return self.count_queryset.count()
+
+    def refresh(self):
+        """Записывает в кэш настоящий COUNT(*) вместо отставшего."""
+        counters.set_count(self.count_key, self.recount())
+        self.__dict__.pop('count', None)
+        self.__dict__.pop('num_pages', None)
+
+    def validate_number(self, number):
+        """
+        Страница за концом закэшированного счётчика проверяется по
+        настоящему COUNT(*): счётчик мог отстать от базы.
+        """
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if self.recounted:
+                raise
+            self.refresh()
+            return super().validate_number(number)
+
+    def rows(self, number):
+        # Счётчик может ненадолго отстать от базы (bulk_create, истёкший
+        # кэш), поэтому срез всегда берётся на полную страницу, а на
+        # последней — вместе с висячими строками orphans.
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top += self.orphans
+        return list(self.object_list[bottom:top])
+
+    def page(self, number):
+        """
+        Пустая страница внутри закэшированного счётчика значит, что
+        счётчик завышен (bulk-удаление мимо сигналов): число постов
+        пересчитывается, а номер сдвигается на последнюю страницу.
+        """
+        number = self.validate_number(number)
+        rows = self.rows(number)
+        if not rows and number > 1 and not self.recounted:
+            self.refresh()
+            number = min(number, self.num_pages)
+            rows = self.rows(number)
+        return self._get_page(rows, number, self)
+
+
+class KeysetPage(Page):
+    """Страница без номера: переход по курсорам соседних страниц."""
+
+    def __init__(self, object_list, paginator, cursor=None,
+                 next_cursor=None, previous_cursor=None):
+        super().__init__(object_list, 1, paginator)
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Keyset page %s>' % (self.cursor or 'first')
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def start_index(self):
+        return None
+
+    def end_index(self):
+        return None
+
+
+class KeysetPaginator:
+    """
+    Постраничный вывод по ключу (field, pk) без COUNT(*) и OFFSET:
+    стоимость любой страницы одинакова.
+    """
+
+    def __init__(self, object_list, per_page, field='pub_date'):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.field = field
+
+    def encode_cursor(self, direction, obj):
+        value = getattr(obj, self.field).isoformat()
+        return urlsafe_base64_encode(
+            force_bytes(f'{direction}|{value}|{obj.pk}')
+        )
+
+    def decode_cursor(self, cursor):
+        try:
+            direction, value, pk = force_str(
+                urlsafe_base64_decode(cursor)
+            ).split('|')
+            value = parse_datetime(value)
+            pk = int(pk)
+        except (TypeError, ValueError):
+            return None
+        if direction not in (NEXT, PREVIOUS) or value is None:
+            return None
+        return direction, value, pk
+
+    def _seek(self, direction, value, pk):
+        lookup = 'lt' if direction == NEXT else 'gt'
+        return self.object_list.filter(
+            Q(**{f'{self.field}__{lookup}': value})
+            | Q(**{self.field: value, f'pk__{lookup}': pk})
+        )
+
+    def get_page(self, cursor):
+        position = self.decode_cursor(cursor) if cursor else None
+        descending = (f'-{self.field}', '-pk')
+        if position is None:
+            cursor = None
+            rows = list(
+                self.object_list.order_by(*descending)[:self.per_page + 1]
+            )
+            has_next = len(rows) > self.per_page
+            has_previous = False
+            rows = rows[:self.per_page]
+        elif position[0] == NEXT:
+            rows = list(
+                self._seek(*position).order_by(*descending)[
+                    :self.per_page + 1
+                ]
+            )
+            has_next = len(rows) > self.per_page
+            has_previous = True
+            rows = rows[:self.per_page]
+        else:
+            rows = list(
+                self._seek(*position).order_by(self.field, 'pk')[
+                    :self.per_page + 1
+                ]
+            )
+            has_next = True
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+        return KeysetPage(
+            rows,
+            self,
+            cursor=cursor,
+            next_cursor=(
+                self.encode_cursor(NEXT, rows[-1])
+                if has_next and rows else None
+            ),
+            previous_cursor=(
+                self.encode_cursor(PREVIOUS, rows[0])
+                if has_previous and rows else None
+            ),
+        )
@@ -0,0 +1,220 @@
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Post
+from .stemmer import stem
+
+WORD = re.compile(r'\w+')
+# Слова в постах повторяются, а переиндексация проходит их все.
+cached_stem = lru_cache(maxsize=65536)(stem)
+
+
+def words(text):
+    """Основы слов текста в порядке появления."""
+    return [cached_stem(word.lower()) for word in WORD.findall(text)]
+
+
+class RankedResults:
+    """
+    Найденные посты в порядке релевантности. Срез выбирает из индекса
+    только номера постов этой страницы, поэтому годится для Paginator.
+    """
+
+    def __init__(self, backend, query):
+        self.backend = backend
+        self.query = query
+
+    def count(self):
+        return self.backend.count(self.query)
+
+    def __getitem__(self, page):
+        ids = self.backend.ids(self.query, page.start, page.stop)
+        posts = Post.objects.filter(pk__in=ids).for_feed().in_bulk()
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+class SearchBackend:
+    """Поиск без отдельного индекса: все слова запроса через LIKE."""
+
+    def index(self, posts, replace=True):
+        """
+        Добавляет посты в индекс; при replace сначала убирает их старые
+        записи. Переиндексация после clear() обходится без этого.
+        """
+
+    def delete(self, post_ids):
+        """Убирает посты из индекса."""
+
+    def clear(self):
+        """Очищает индекс перед полной переиндексацией."""
+
+    def filter(self, posts, text):
+        """Посты из posts, подходящие под запрос, без упорядочивания."""
+        for word in WORD.findall(text):
+            posts = posts.filter(text__icontains=word)
+        return posts
+
+    def search(self, text):
+        return self.filter(Post.objects.all(), text).for_feed()
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    Таблица FTS5 с основами слов: у SQLite нет русского стеммера,
+    поэтому и текст поста, и запрос проходят через posts.stemmer.
+    Порядок — по bm25, встроенному rank FTS5.
+    """
+    # Таблицу создаёт миграция 0017_post_search.
+    table = 'posts_post_search'
+
+    def index(self, posts, replace=True):
+        if replace:
+            self.delete([post.pk for post in posts])
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, words) VALUES (%s, %s)',
+                [(post.pk, ' '.join(words(post.text))) for post in posts]
+            )
+
+    def delete(self, post_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {self.table} WHERE rowid = %s',
+                [(pk,) for pk in post_ids]
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+    def match(self, text):
+        """Запрос FTS5: все основы слов, каждая в кавычках."""
+        return ' '.join(f'"{word}"' for word in words(text))
+
+    def filter(self, posts, text):
+        query = self.match(text)
+        if not query:
+            return posts.none()
+        return posts.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s',
+            [query]
+        ))
+
+    def count(self, query):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {self.table} '
+                f'WHERE {self.table} MATCH %s', [query]
+            )
+            return cursor.fetchone()[0]
+
+    def ids(self, query, start, stop):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {self.table} '
+                f'WHERE {self.table} MATCH %s ORDER BY rank, rowid DESC '
+                'LIMIT %s OFFSET %s', [query, stop - start, start]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def search(self, text):
+        query = self.match(text)
+        return RankedResults(self, query) if query else Post.objects.none()
+
+
+class PostgresSearchBackend(SQLiteSearchBackend):
+    """
+    Таблица с tsvector и GIN-индексом; слова разбирает и приводит
+    к основе конфигурация russian самого PostgreSQL, порядок — ts_rank.
+    """
+    config = 'russian'
+
+    def index(self, posts, replace=True):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.table} (post_id, document) '
+                'VALUES (%s, to_tsvector(%s, %s)) ON CONFLICT (post_id) '
+                'DO UPDATE SET document = EXCLUDED.document',
+                [(post.pk, self.config, post.text) for post in posts]
+            )
+
+    def delete(self, post_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE post_id = ANY(%s)',
+                [list(post_ids)]
+            )
+
+    def match(self, text):
+        return text.strip()
+
+    def filter(self, posts, text):
+        return posts.filter(pk__in=RawSQL(
+            f'SELECT post_id FROM {self.table} '
+            'WHERE document @@ plainto_tsquery(%s, %s)',
+            [self.config, self.match(text)]
+        ))
+
+    def count(self, query):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {self.table} '
+                'WHERE document @@ plainto_tsquery(%s, %s)',
+                [self.config, query]
+            )
+            return cursor.fetchone()[0]
+
+    def ids(self, query, start, stop):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT post_id FROM {self.table}, '
+                'plainto_tsquery(%s, %s) query WHERE document @@ query '
+                'ORDER BY ts_rank(document, query) DESC, post_id DESC '
+                'LIMIT %s OFFSET %s',
+                [self.config, query, stop - start, start]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def backend():
+    """Бэкенд из POSTS_SEARCH_BACKEND или по типу базы."""
+    if settings.POSTS_SEARCH_BACKEND:
+        return import_string(settings.POSTS_SEARCH_BACKEND)()
+    return BACKENDS.get(connection.vendor, SearchBackend)()
+
+
+def search(text):
+    """Посты по запросу: Paginator принимает результат как список."""
+    return backend().search(text)
+
+
+def reindex(posts=None, batch_size=1000):
+    """
+    Строит индекс заново по постам posts (по умолчанию всем) пачками
+    по batch_size; возвращает число проиндексированных постов.
+    """
+    engine = backend()
+    engine.clear()
+    posts = (Post.objects.all() if posts is None else posts).only(
+        'text'
+    ).order_by('pk')
+    last, total = 0, 0
+    while True:
+        batch = list(posts.filter(pk__gt=last)[:batch_size])
+        if not batch:
+            return total
+        # Иначе в режиме autocommit каждая строка — своя транзакция.
+        with transaction.atomic():
+            engine.index(batch, replace=False)
+        last, total = batch[-1].pk, total + len(batch)
@@ -0,0 +1,170 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import (
+    cards, counters, feeds, freshness, pages, search, thumbnails
+)
+from .models import (
+    Comment, Follow, Group, Post, PostImageVariant, User, UserStats
+)
+
+
+def follower_ids(author_id):
+    return list(
+        Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True)
+    )
+
+
+def follow_feed_keys(user_ids):
+    return [counters.feed_key(counters.FOLLOW, pk) for pk in user_ids]
+
+
+def group_slug(post):
+    return post.group.slug if post.group_id is not None else None
+
+
+def bump_pages(post, *group_slugs):
+    """
+    Сбрасывает кэш страниц главной и групп поста и свежесть его лент
+    после фиксации транзакции.
+    """
+    slugs = {slug for slug in group_slugs if slug is not None}
+
+    def bump():
+        pages.bump(counters.INDEX)
+        for slug in slugs:
+            pages.bump(counters.GROUP, slug)
+    transaction.on_commit(bump)
+    freshness.touch(
+        freshness.feed_keys(post.author_id, *slugs)
+        + [freshness.post_key(post.pk)]
+    )
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_state(sender, instance, **kwargs):
+    instance._saved_group_id, instance._saved_group_slug = None, None
+    instance._saved_image = ''
+    if instance.pk is not None:
+        (
+            instance._saved_group_id,
+            instance._saved_group_slug,
+            instance._saved_image,
+        ) = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'group__slug', 'image'
+        ).first() or (None, None, '')
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw, **kwargs):
+    if created:
+        followers = follower_ids(instance.author_id)
+        counters.change(
+            counters.post_feed_keys(instance.author_id, instance.group_id), 1
+        )
+        counters.reset(follow_feed_keys(followers))
+        if not raw:
+            # Строка статистики блокируется до чтения feed_fanned_out.
+            UserStats.objects.change(instance.author_id, 'posts_count', 1)
+        if settings.POSTS_FEED_FANOUT:
+            feeds.fan_out_post(instance, followers)
+    elif instance._saved_group_id != instance.group_id:
+        if instance._saved_group_id is not None:
+            counters.change(
+                [counters.feed_key(counters.GROUP, instance._saved_group_id)],
+                -1
+            )
+        if instance.group_id is not None:
+            counters.change(
+                [counters.feed_key(counters.GROUP, instance.group_id)], 1
+            )
+    if not created:
+        cards.bump(cards.POST, instance.pk)
+    if (instance.image.name or '') != instance._saved_image:
+        if not created:
+            PostImageVariant.objects.filter(post=instance).delete()
+        thumbnails.schedule_upload(instance.image.name, instance.pk)
+    bump_pages(instance, instance._saved_group_slug, group_slug(instance))
+    search.backend().index([instance])
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change(
+        counters.post_feed_keys(instance.author_id, instance.group_id), -1
+    )
+    counters.reset(follow_feed_keys(follower_ids(instance.author_id)))
+    UserStats.objects.change(instance.author_id, 'posts_count', -1)
+    bump_pages(instance, group_slug(instance))
+    search.backend().delete([instance.pk])
+
+
+def touch_comment(comment):
+    """Число комментариев есть в карточке поста и в статистике автора."""
+    freshness.touch_posts(Post.objects.filter(pk=comment.post_id).values_list(
+        'pk', 'author_id', 'group__slug'
+    ))
+    freshness.touch([counters.feed_key(counters.PROFILE, comment.author_id)])
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw, **kwargs):
+    if created:
+        cards.bump(cards.POST, instance.post_id)
+        touch_comment(instance)
+    if created and not raw:
+        UserStats.objects.change(instance.author_id, 'comments_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    cards.bump(cards.POST, instance.post_id)
+    touch_comment(instance)
+    UserStats.objects.change(instance.author_id, 'comments_count', -1)
+
+
+def touch_follow(follow):
+    freshness.touch([
+        counters.feed_key(counters.FOLLOW, follow.user_id),
+        counters.feed_key(counters.PROFILE, follow.user_id),
+        counters.feed_key(counters.PROFILE, follow.author_id),
+    ])
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw, **kwargs):
+    counters.reset(follow_feed_keys([instance.user_id]))
+    touch_follow(instance)
+    if created and not raw:
+        UserStats.objects.change(instance.user_id, 'following_count', 1)
+        UserStats.objects.change(instance.author_id, 'followers_count', 1)
+    if created and settings.POSTS_FEED_FANOUT:
+        feeds.follow_changed(instance, created=True)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.reset(follow_feed_keys([instance.user_id]))
+    touch_follow(instance)
+    UserStats.objects.change(instance.user_id, 'following_count', -1)
+    UserStats.objects.change(instance.author_id, 'followers_count', -1)
+    if settings.POSTS_FEED_FANOUT:
+        feeds.follow_changed(instance, created=False)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields, **kwargs):
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        cards.bump(cards.AUTHOR, instance.pk)
+        freshness.touch([freshness.SITE])
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    cards.bump(cards.GROUP, instance.pk)
+    pages.bump(counters.GROUP, instance.slug)
+    freshness.touch([freshness.SITE])
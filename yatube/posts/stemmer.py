@@ -0,0 +1,73 @@
+"""
+Стеммер русского языка по алгоритму Snowball:
+https://snowballstem.org/algorithms/russian/stemmer.html
+"""
+import re
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = re.compile(
+    r'(?:ив|ивши|ившись|ыв|ывши|ывшись|(?<=[ая])(?:в|вши|вшись))$'
+)
+REFLEXIVE = re.compile(r'(?:ся|сь)$')
+ADJECTIVAL = re.compile(
+    r'(?:ивш|ывш|ующ|(?<=[ая])(?:ем|нн|вш|ющ|щ))?'
+    r'(?:ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых'
+    r'|ую|юю|ая|яя|ою|ею)$'
+)
+VERB = re.compile(
+    r'(?:ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло'
+    r'|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю'
+    r'|(?<=[ая])(?:ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно))$'
+)
+NOUN = re.compile(
+    r'(?:а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием'
+    r'|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+DERIVATIONAL = re.compile(r'ость?$')
+SUPERLATIVE = re.compile(r'ейше?$')
+
+
+def region(word, start):
+    """Начало области после первой согласной, идущей за гласной."""
+    for index in range(start + 1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            return index + 1
+    return len(word)
+
+
+def strip(pattern, word):
+    """Слово без окончания pattern и признак того, что оно было."""
+    stripped, found = pattern.subn('', word, count=1)
+    return stripped, bool(found)
+
+
+def stem(word):
+    """Основа слова в нижнем регистре, ё заменяется на е."""
+    word = word.lower().replace('ё', 'е')
+    vowel = next(
+        (index for index, letter in enumerate(word) if letter in VOWELS),
+        None
+    )
+    if vowel is None:
+        return word
+    r2 = region(word, region(word, 0))
+    head, rv = word[:vowel + 1], word[vowel + 1:]
+    rv, found = strip(PERFECTIVE_GERUND, rv)
+    if not found:
+        rv = REFLEXIVE.sub('', rv, count=1)
+        for pattern in (ADJECTIVAL, VERB, NOUN):
+            rv, found = strip(pattern, rv)
+            if found:
+                break
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    match = DERIVATIONAL.search(rv)
+    if match and len(head) + match.start() >= r2:
+        rv = rv[:match.start()]
+    rv, found = strip(SUPERLATIVE, rv)
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    elif not found and rv.endswith('ь'):
+        rv = rv[:-1]
+    return head + rv
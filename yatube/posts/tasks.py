@@ -0,0 +1,96 @@
+"""
+Фоновые задачи процесса. У каждой очереди свой пул потоков, поэтому
+задачи одной очереди (раскладка лент) не ждут задач другой (превью).
+Задача ставится после фиксации текущей транзакции, ошибка пишется в лог
+и не мешает запросу.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+QUEUES = []
+
+
+def call(func, *args):
+    """Выполняет задачу; ошибка пишется в лог и не мешает запросу."""
+    try:
+        return func(*args)
+    except Exception:
+        logger.exception('Задача %s%r не выполнена', func.__name__, args)
+        return None
+
+
+def run(func, *args):
+    """Задача пула: после неё закрываются соединения с базой потока."""
+    try:
+        return call(func, *args)
+    finally:
+        connections.close_all()
+
+
+class Queue:
+    """
+    Очередь задач с пулом потоков в каждом процессе. Размер пула задаёт
+    настройка workers_setting; при 0 задача выполняется в том же потоке.
+    """
+
+    def __init__(self, name, workers_setting):
+        self.name = name
+        self.workers_setting = workers_setting
+        self.lock = threading.Lock()
+        self.pool = {}
+        self.pending = {}
+        QUEUES.append(self)
+
+    @property
+    def workers(self):
+        return getattr(settings, self.workers_setting)
+
+    def executor(self):
+        """Пул потоков текущего процесса: после fork создаётся заново."""
+        pid = os.getpid()
+        with self.lock:
+            if pid not in self.pool:
+                self.pool.clear()
+                self.pending.clear()
+                self.pool[pid] = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix=self.name
+                )
+            return self.pool[pid]
+
+    def submit(self, key, func, *args):
+        """Ставит задачу в пул; одинаковые задачи в очереди не дублируются."""
+        with self.lock:
+            future = self.pending.get(key)
+            if future is not None and not future.done():
+                return future
+        future = self.executor().submit(run, func, *args)
+        with self.lock:
+            self.pending[key] = future
+        future.add_done_callback(lambda done: self.pending.pop(key, None))
+        return future
+
+    def defer(self, key, func, *args):
+        """Выполняет задачу после фиксации текущей транзакции."""
+        if self.workers:
+            transaction.on_commit(lambda: self.submit(key, func, *args))
+        else:
+            transaction.on_commit(lambda: call(func, *args))
+
+    def wait(self):
+        """Дожидается всех поставленных в очередь задач."""
+        with self.lock:
+            futures = list(self.pending.values())
+        wait_futures(futures)
+
+
+def wait():
+    """Дожидается задач всех очередей."""
+    for queue in QUEUES:
+        queue.wait()
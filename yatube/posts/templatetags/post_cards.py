@@ -0,0 +1,49 @@
+from django import template
+from django.conf import settings
+from django.utils.safestring import mark_safe
+
+from posts import cards
+
+register = template.Library()
+
+
+def cache_enabled(context):
+    request = context.get('request')
+    match = getattr(request, 'resolver_match', None)
+    return (
+        match is not None
+        and match.url_name in settings.POSTS_CARD_CACHE_VIEWS
+    )
+
+
+def page_cards(context, post, not_show_group):
+    """Ключи и готовые карточки всей страницы за два обращения к кэшу."""
+    state = context.render_context.get(cards.CARD_TEMPLATE)
+    if state is None or post.pk not in state['keys']:
+        posts = list(context.get('page_obj') or ())
+        if post not in posts:
+            posts = [post]
+        keys = cards.card_keys(posts, not_show_group)
+        state = {'keys': keys, 'html': cards.get_cards(keys.values())}
+        context.render_context[cards.CARD_TEMPLATE] = state
+    return state
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post, not_show_group=False):
+    """Карточка поста; в лентах из POSTS_CARD_CACHE_VIEWS — из кэша."""
+    card = context.template.engine.get_template(cards.CARD_TEMPLATE)
+    values = {'post': post, 'not_show_group': not_show_group}
+    if not cache_enabled(context):
+        with context.push(**values):
+            return card.render(context)
+    state = page_cards(context, post, not_show_group)
+    key = state['keys'][post.pk]
+    html = state['html'].get(key)
+    if html is None:
+        # page_obj нужен post_picture, чтобы искать превью всей страницы.
+        html = card.render(
+            context.new({**values, 'page_obj': context.get('page_obj')})
+        )
+        cards.set_card(key, html)
+    return mark_safe(html)
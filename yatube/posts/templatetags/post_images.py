@@ -0,0 +1,58 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+SIZES = '(min-width: 992px) 960px, 100vw'
+TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+FALLBACK = 'jpeg'
+DEFAULT_WIDTH = 960
+
+
+def srcset(variants):
+    return ', '.join(
+        f'{variant.image.url} {variant.width}w' for variant in variants
+    )
+
+
+def attach_page(context, post):
+    """Превью сразу для всей страницы page_obj, в которой есть post."""
+    posts = list(context.get('page_obj') or ())
+    thumbnails.attach(posts if post in posts else [post])
+
+
+@register.inclusion_tag('posts/includes/picture.html', takes_context=True)
+def post_picture(context, post):
+    """
+    Картинка поста из вариантов PostImageVariant: <source> для каждого
+    формата и <img> с размерами. Варианты создаются после загрузки; если
+    их ещё нет, например у постов, загруженных раньше, создание ставится
+    в очередь, а выводится обычное превью.
+    """
+    if not hasattr(post, 'thumbnail'):
+        attach_page(context, post)
+    by_format = {}
+    if post.image:
+        for variant in post.image_variants.all():
+            by_format.setdefault(variant.format, []).append(variant)
+        if not by_format:
+            thumbnails.schedule_variants(post.pk, post.image.name)
+    fallback = by_format.get(FALLBACK) or next(iter(by_format.values()), [])
+    image = None
+    if fallback:
+        image = max(
+            (v for v in fallback if v.width <= DEFAULT_WIDTH),
+            key=lambda variant: variant.width,
+            default=fallback[0]
+        )
+    return {
+        'post': post,
+        'image': image,
+        'srcset': srcset(fallback),
+        'sources': [
+            {'type': TYPES.get(name, f'image/{name}'), 'srcset': srcset(items)}
+            for name, items in by_format.items() if items is not fallback
+        ],
+        'sizes': SIZES,
+    }
@@ -0,0 +1,197 @@
+from http import HTTPStatus
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import (
+    Client, RequestFactory, TestCase, TransactionTestCase
+)
+from django.urls import reverse
+
+from .. import freshness
+from ..models import Comment, Follow, Group, Post, User
+
+USERNAME = 'auth'
+ANOTHER_USERNAME = 'reader'
+SLUG = 'test-slug'
+
+API_INDEX_URL = reverse('posts:api_index')
+API_GROUP_URL = reverse('posts:api_group_list', args=[SLUG])
+API_PROFILE_URL = reverse('posts:api_profile', args=[USERNAME])
+API_FOLLOW_URL = reverse('posts:api_follow_index')
+API_MISSING_GROUP_URL = reverse('posts:api_group_list', args=['missing'])
+
+POSTS_COUNT = settings.POSTS_COUNT_ON_PAGE + 3
+
+
+class PostAPITests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username=USERNAME, first_name='Лев', last_name='Толстой'
+        )
+        cls.reader = User.objects.create_user(username=ANOTHER_USERNAME)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug=SLUG,
+            description='Тестовое описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user, group=cls.group, text=f'Пост {number}'
+            ) for number in range(POSTS_COUNT)
+        ]
+        cls.post = cls.posts[-1]
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        cls.API_POST_URL = reverse('posts:api_post_detail', args=[cls.post.pk])
+        cls.guest = Client()
+        cls.another = Client()
+        cls.another.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, client, url):
+        """Тексты постов всех страниц ленты по next_cursor."""
+        texts = []
+        data = client.get(url).json()
+        texts += [post['text'] for post in data['results']]
+        while data['next_cursor']:
+            data = client.get(
+                url, {'cursor': data['next_cursor']}
+            ).json()
+            texts += [post['text'] for post in data['results']]
+        return texts
+
+    def test_feeds(self):
+        """Ленты отдают все посты по курсору, новые первыми."""
+        expected = [post.text for post in reversed(self.posts)]
+        for url, client in [
+            [API_INDEX_URL, self.guest],
+            [API_GROUP_URL, self.guest],
+            [API_PROFILE_URL, self.guest],
+            [API_FOLLOW_URL, self.another],
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(self.walk(client, url), expected)
+
+    def test_post_fields(self):
+        """Пост выводится со всеми полями."""
+        data = self.guest.get(self.API_POST_URL).json()
+        self.assertEqual(data['id'], self.post.pk)
+        self.assertEqual(data['text'], self.post.text)
+        self.assertEqual(data['author'], USERNAME)
+        self.assertEqual(data['author_name'], 'Лев Толстой')
+        self.assertEqual(data['group'], SLUG)
+        self.assertEqual(data['comment_count'], 1)
+        self.assertIsNone(data['image'])
+        self.assertEqual(data['image_variants'], [])
+
+    def test_sparse_fields(self):
+        """?fields= оставляет только перечисленные поля."""
+        data = self.guest.get(API_INDEX_URL, {'fields': 'id,text'}).json()
+        self.assertEqual(
+            data['results'][0], {'id': self.post.pk, 'text': self.post.text}
+        )
+        response = self.guest.get(API_INDEX_URL, {'fields': 'id,password'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_errors(self):
+        """Гостю лента подписок недоступна, несуществующее не найдено."""
+        for url, status in [
+            [API_FOLLOW_URL, HTTPStatus.UNAUTHORIZED],
+            [API_MISSING_GROUP_URL, HTTPStatus.NOT_FOUND],
+            [reverse('posts:api_post_detail', args=[0]), HTTPStatus.NOT_FOUND],
+        ]:
+            with self.subTest(url=url):
+                response = self.guest.get(url)
+                self.assertEqual(response.status_code, status)
+                self.assertIn('detail', response.json())
+
+    def test_not_modified(self):
+        """
+        Запрос с ETag или Last-Modified прошлого ответа получает 304
+        без обращений к базе.
+        """
+        response = self.guest.get(API_INDEX_URL)
+        self.assertTrue(response['ETag'].startswith('"'))
+        for headers in [
+            {'HTTP_IF_NONE_MATCH': response['ETag']},
+            {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']},
+        ]:
+            with self.subTest(headers=headers):
+                with self.assertNumQueries(0):
+                    cached = self.guest.get(API_INDEX_URL, **headers)
+                self.assertEqual(cached.status_code, HTTPStatus.NOT_MODIFIED)
+                self.assertEqual(cached.content, b'')
+
+    def test_etag_depends_on_query(self):
+        """Другая страница или другой набор полей — другой ETag."""
+        etag = self.guest.get(API_INDEX_URL)['ETag']
+        response = self.guest.get(
+            API_INDEX_URL, {'fields': 'id'}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class PostAPIFreshnessTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username=USERNAME)
+        self.reader = User.objects.create_user(username=ANOTHER_USERNAME)
+        self.post = Post.objects.create(author=self.user, text='Пост')
+        self.client.force_login(self.reader)
+
+    def assertChanged(self, url, change):
+        etag = self.client.get(url)['ETag']
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_changes_reset_etag(self):
+        """Изменения постов, комментариев и подписок меняют ETag лент."""
+        post_url = reverse('posts:api_post_detail', args=[self.post.pk])
+        cases = [
+            [API_INDEX_URL, lambda: Post.objects.create(
+                author=self.user, text='Новый пост'
+            )],
+            [API_FOLLOW_URL, lambda: Follow.objects.create(
+                user=self.reader, author=self.user
+            )],
+            [API_FOLLOW_URL, lambda: Post.objects.create(
+                author=self.user, text='Пост для подписчиков'
+            )],
+            [post_url, lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий'
+            )],
+            [API_PROFILE_URL, lambda: Post.objects.filter(
+                pk=self.post.pk
+            ).delete()],
+        ]
+        for url, change in cases:
+            with self.subTest(url=url):
+                self.assertChanged(url, change)
+
+    def test_many_follows_bounded_keys(self):
+        """
+        У читателя с множеством подписок ETag ленты зависит от пары
+        ключей, но по-прежнему меняется с постами авторов.
+        """
+        User.objects.bulk_create(
+            User(username=f'author{number}')
+            for number in range(freshness.FOLLOW_KEYS_MAX)
+        )
+        Follow.objects.bulk_create(
+            Follow(user=self.reader, author=author)
+            for author in User.objects.exclude(pk=self.reader.pk)
+        )
+        request = RequestFactory().get(API_FOLLOW_URL)
+        request.user = self.reader
+        self.assertEqual(len(freshness.follow_keys(request)), 2)
+        self.assertChanged(API_FOLLOW_URL, lambda: Post.objects.create(
+            author=self.user, text='Пост для подписчиков'
+        ))
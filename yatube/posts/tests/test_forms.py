@@ -3,7 +3,7 @@ import tempfile
 from xml.etree.ElementTree import Comment
 
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.test import Client, RequestFactory, TestCase, override_settings
 from django.urls import reverse
 from django.conf import settings
 from django import forms
@@ -125,6 +125,79 @@ class PostFormTests(TestCase):
         posts = set(Post.objects.all()) - all_posts
         self.assertEqual(len(posts), 0)
 
+    @override_settings(POSTS_UPLOAD_MAX_SIZE=10)
+    def test_oversized_image_rejected(self):
+        """Файл больше POSTS_UPLOAD_MAX_SIZE не сохраняется."""
+        posts_count = Post.objects.count()
+        response = self.author.post(POST_CREATE_URL, data={
+            'text': 'Тестовый текст',
+            'image': self.uploaded
+        })
+        self.assertEqual(Post.objects.count(), posts_count)
+        self.assertFormError(
+            response, 'form', 'image',
+            'Размер файла не должен превышать 10\xa0байт.'
+        )
+
+    @override_settings(POSTS_UPLOAD_MAX_SIZE=10)
+    def test_oversized_upload_stops_reading(self):
+        """Поля после слишком большого файла уже не читаются."""
+        response = self.author.post(POST_CREATE_URL, data={
+            'text': 'Тестовый текст',
+            'image': self.uploaded,
+            'group': self.notes_group.pk,
+        })
+        form = response.context['form']
+        self.assertEqual(form.data.get('text'), 'Тестовый текст')
+        self.assertNotIn('group', form.data)
+        self.assertIn('image', form.errors)
+
+    @override_settings(POSTS_UPLOAD_MAX_SIZE=10)
+    def test_oversized_upload_only_size_error(self):
+        """
+        Поля, не прочитанные после слишком большого файла, не дают
+        ошибок «обязательное поле»: форма сообщает только о размере.
+        """
+        response = self.author.post(POST_CREATE_URL, data={
+            'image': self.uploaded,
+            'text': 'Тестовый текст',
+        })
+        form = response.context['form']
+        self.assertNotIn('text', form.data)
+        self.assertEqual(list(form.errors), ['image'])
+
+    @override_settings(POSTS_UPLOAD_MAX_SIZE=10)
+    def test_upload_limit_only_for_post_forms(self):
+        """Предел загрузки не действует на прочие формы сайта."""
+        request = RequestFactory().post('/', data={
+            'text': 'Тестовый текст', 'image': self.uploaded
+        })
+        self.assertIn('image', request.FILES)
+
+    def test_post_forms_check_csrf(self):
+        """Формы поста по-прежнему проверяют токен CSRF."""
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        posts_count = Post.objects.count()
+        for url in (POST_CREATE_URL, self.POST_EDIT_URL):
+            with self.subTest(url=url):
+                response = client.post(url, data={'text': 'Без токена'})
+                self.assertEqual(response.status_code, 403)
+        self.assertEqual(Post.objects.count(), posts_count)
+
+    @override_settings(POSTS_IMAGE_MAX_PIXELS=1)
+    def test_too_many_pixels_rejected(self):
+        """Картинка больше POSTS_IMAGE_MAX_PIXELS пикселей отклоняется."""
+        form = PostForm(
+            data={'text': 'Тестовый текст'},
+            files={'image': self.uploaded}
+        )
+        self.assertFalse(form.is_valid())
+        self.assertEqual(
+            form.errors['image'][0],
+            'Картинка слишком большая: не больше 1 пикселей.'
+        )
+
     def test_title_label(self):
         """
         Переопределение названий
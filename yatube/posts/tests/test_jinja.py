@@ -0,0 +1,136 @@
+import importlib.util
+import json
+import shutil
+import tempfile
+from io import StringIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Follow, Group, Post, User
+
+USERNAME = 'auth'
+ANOTHER_USERNAME = 'reader'
+SLUG = 'test-slug'
+
+INDEX_URL = reverse('posts:index')
+GROUP_LIST_URL = reverse('posts:group_list', args=[SLUG])
+PROFILE_URL = reverse('posts:profile', args=[USERNAME])
+FOLLOW_INDEX_URL = reverse('posts:follow_index')
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+JINJA2_INSTALLED = importlib.util.find_spec('jinja2') is not None
+
+
+@skipUnless(JINJA2_INSTALLED, 'Jinja2 не установлен')
+class JinjaFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Каталог создаётся здесь, а не при импорте: пропущенные без
+        # Jinja2 тесты не должны оставлять его в проекте.
+        cls.media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username=USERNAME, first_name='Лев', last_name='Толстой'
+        )
+        cls.reader = User.objects.create_user(username=ANOTHER_USERNAME)
+        cls.group = Group.objects.create(
+            title='Группа "Тест" & <друзья>',
+            slug=SLUG,
+            description='Строка\nвторая строка',
+        )
+        Post.objects.create(
+            author=cls.user,
+            group=cls.group,
+            text='Картинка',
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'
+            )
+        )
+        for number in range(settings.POSTS_COUNT_ON_PAGE + 2):
+            Post.objects.create(
+                author=cls.user,
+                group=cls.group if number % 2 else None,
+                text=f'Пост {number}: "кавычки" & <b>теги</b>\nстрока',
+            )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        cls.guest = Client()
+        cls.another = Client()
+        cls.another.force_login(cls.reader)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def render(self, engine, client, url):
+        cache.clear()
+        with override_settings(POSTS_FEED_TEMPLATE_ENGINE=engine):
+            return client.get(url)
+
+    def test_same_output(self):
+        """Ленты Jinja2 побайтно совпадают с лентами шаблонов Django."""
+        for url, client in [
+            [INDEX_URL, self.guest],
+            [INDEX_URL, self.another],
+            [f'{INDEX_URL}?page=2', self.guest],
+            [GROUP_LIST_URL, self.guest],
+            [PROFILE_URL, self.guest],
+            [PROFILE_URL, self.another],
+            [FOLLOW_INDEX_URL, self.another],
+        ]:
+            with self.subTest(url=url, user=client is self.another):
+                django = self.render('django', client, url)
+                jinja = self.render('jinja2', client, url)
+                self.assertTemplateUsed(
+                    django, 'posts/includes/paginator.html'
+                )
+                self.assertEqual(jinja.templates, [])
+                self.assertEqual(
+                    jinja.content.decode(), django.content.decode()
+                )
+
+    def test_same_output_cached_cards(self):
+        """
+        Карточки из кэша и лента по курсору выводятся так же, как
+        шаблонами Django.
+        """
+        with override_settings(
+            POSTS_CARD_CACHE_VIEWS=('index', 'profile'),
+            POSTS_KEYSET_PAGINATION=('index',),
+        ):
+            for url in [INDEX_URL, PROFILE_URL]:
+                with self.subTest(url=url):
+                    django = self.render('django', self.guest, url)
+                    jinja = self.render('jinja2', self.guest, url)
+                    self.assertEqual(jinja.content, django.content)
+
+    def test_bench_templates(self):
+        """Замер выводит каждый шаблон лент обоими движками."""
+        out = StringIO()
+        call_command('bench_templates', repeat=2, warmup=1, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(
+            set(report), {'index', 'group_list', 'profile', 'follow'}
+        )
+        for name, result in report.items():
+            with self.subTest(name=name):
+                self.assertEqual(
+                    set(result), {'django', 'jinja2', 'speedup'}
+                )
@@ -1,6 +1,17 @@
-from django.test import TestCase
+import json
+from io import StringIO
 
-from ..models import Group, Post, User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models.signals import post_save
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User, UserStats
 
 
 class PostModelTest(TestCase):
@@ -50,3 +61,153 @@ class PostModelTest(TestCase):
                     Post._meta.get_field(field).help_text,
                     expected_value
                 )
+
+
+class UserStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def assertStats(self, user, **expected):
+        stats = UserStats.objects.get(user=user)
+        for field, value in expected.items():
+            with self.subTest(field=field):
+                self.assertEqual(getattr(stats, field), value)
+
+    def test_signals_keep_counters(self):
+        """Сигналы Post, Comment и Follow обновляют счётчики."""
+        post = Post.objects.create(author=self.user, text='Тест')
+        Post.objects.create(author=self.user, text='Тест')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Тест'
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        self.assertStats(self.user, posts_count=2, followers_count=1)
+        self.assertStats(
+            self.reader, following_count=1, comments_count=1
+        )
+        post.delete()
+        follow.delete()
+        self.assertStats(self.user, posts_count=1, followers_count=0)
+        self.assertStats(
+            self.reader, following_count=0, comments_count=0
+        )
+        self.assertFalse(Comment.objects.filter(pk=comment.pk).exists())
+
+    def test_rebuild_command(self):
+        """Команда rebuild_user_stats исправляет разошедшиеся счётчики."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=str(text)) for text in range(3)
+        )
+        UserStats.objects.filter(user=self.user).delete()
+        UserStats.objects.create(user=self.reader, comments_count=5)
+        call_command('rebuild_user_stats', stdout=StringIO())
+        self.assertStats(self.user, posts_count=3)
+        self.assertStats(self.reader, comments_count=0)
+
+    def test_change_after_parallel_create(self):
+        """
+        Если строку статистики успел создать другой запрос, изменение
+        всё равно прибавляется к ней.
+        """
+        Post.objects.bulk_create([Post(author=self.user, text='Тест')])
+        UserStats.objects.create(user=self.user)
+        self.assertIsNone(UserStats.objects.create_for(self.user.pk))
+        UserStats.objects.change(self.user.pk, 'posts_count', 1)
+        self.assertStats(self.user, posts_count=1)
+
+    def test_change_below_zero_recounts(self):
+        """
+        Счётчик, который ушёл бы ниже нуля, пересчитывается по базе,
+        а расхождение пишется в лог.
+        """
+        post = Post.objects.create(author=self.user, text='Тест')
+        Post.objects.create(author=self.user, text='Тест')
+        UserStats.objects.filter(user=self.user).update(posts_count=0)
+        with self.assertLogs('posts.models', 'WARNING'):
+            post.delete()
+        self.assertStats(self.user, posts_count=1)
+
+    def test_profile_single_stats_query(self):
+        """Страница автора читает статистику одним запросом."""
+        cache.clear()
+        Post.objects.create(author=self.user, text='Тест')
+        with CaptureQueriesContext(connection) as context:
+            response = Client().get(
+                reverse('posts:profile', args=[self.user.username])
+            )
+        self.assertEqual(response.context['stats'].posts_count, 1)
+        self.assertEqual(len([
+            query for query in context.captured_queries
+            if UserStats._meta.db_table in query['sql']
+        ]), 1)
+
+
+class UserStatsTransactionTest(TransactionTestCase):
+    def test_signals_run_in_save_transaction(self):
+        """Счётчики меняются в той же транзакции, что и сохранение."""
+        user = User.objects.create_user(username='auth')
+        in_transaction = []
+
+        def record(sender, **kwargs):
+            in_transaction.append(connection.in_atomic_block)
+        for model in (Post, Comment, Follow):
+            post_save.connect(record, sender=model)
+            self.addCleanup(post_save.disconnect, record, sender=model)
+        post = Post.objects.create(author=user, text='Тест')
+        Comment.objects.create(post=post, author=user, text='Тест')
+        Follow.objects.create(
+            user=User.objects.create_user(username='reader'), author=user
+        )
+        self.assertEqual(in_transaction, [True, True, True])
+
+
+class FollowModelTest(TestCase):
+    def test_follow_is_unique(self):
+        """Повторная подписка на того же автора запрещена."""
+        user = User.objects.create_user(username='auth')
+        author = User.objects.create_user(username='author')
+        Follow.objects.create(user=user, author=author)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=user, author=author)
+
+
+@override_settings(BENCH_DATABASE='bench.sqlite3')
+class BenchIndexesTest(TransactionTestCase):
+    def test_default_database_refused(self):
+        """Без BENCH_DATABASE замер не трогает базу."""
+        with self.settings(BENCH_DATABASE=None):
+            with self.assertRaises(CommandError):
+                call_command('bench_indexes', seed=10, stdout=StringIO())
+        self.assertFalse(Post.objects.exists())
+
+    def test_bench_indexes_command(self):
+        """Замер строит отчёт по лентам и возвращает индексы на место."""
+        indexes = {
+            name for name, info in connection.introspection.get_constraints(
+                connection.cursor(), Post._meta.db_table
+            ).items() if info['index']
+        }
+        out = StringIO()
+        call_command(
+            'bench_indexes', seed=300, repeat=1, json=True, stdout=out
+        )
+        report = json.loads(out.getvalue())
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertEqual(
+            set(report), {'with_indexes', 'without_indexes'}
+        )
+        self.assertIn(
+            Post._meta.indexes[0].name,
+            ' '.join(report['with_indexes']['index']['plan'])
+        )
+        self.assertEqual(
+            sum(UserStats.objects.values_list('posts_count', flat=True)), 300
+        )
+        self.assertEqual(indexes, {
+            name for name, info in connection.introspection.get_constraints(
+                connection.cursor(), Post._meta.db_table
+            ).items() if info['index']
+        })
@@ -0,0 +1,263 @@
+from django.core.cache import cache
+from django.conf import settings
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import counters
+from ..models import Follow, Group, Post, User
+from ..paginators import CachedCountPaginator, KeysetPage, KeysetPaginator
+
+
+USERNAME = 'auth'
+ANOTHER_USERNAME = 'reader'
+SLUG = 'test-slug'
+
+INDEX_URL = reverse('posts:index')
+GROUP_LIST_URL = reverse('posts:group_list', args=[SLUG])
+PROFILE_URL = reverse('posts:profile', args=[USERNAME])
+FOLLOW_INDEX_URL = reverse('posts:follow_index')
+
+COUNT_POSTS_ON_LAST_PAGE = 3
+PAGES_COUNT = 3
+
+
+@override_settings(POSTS_KEYSET_PAGINATION=('index', 'group_list'))
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug=SLUG,
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(
+                author=cls.user,
+                text=str(text),
+                group=cls.group
+            ) for text in range(
+                settings.POSTS_COUNT_ON_PAGE * (PAGES_COUNT - 1)
+                + COUNT_POSTS_ON_LAST_PAGE
+            )
+        )
+        cls.guest = Client()
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, url):
+        pages = []
+        page = self.guest.get(url).context['page_obj']
+        pages.append(page)
+        while page.has_next():
+            page = self.guest.get(
+                f'{url}?cursor={page.next_cursor}'
+            ).context['page_obj']
+            pages.append(page)
+        return pages
+
+    def test_pages_walk_whole_feed(self):
+        """
+        Переходы по курсорам обходят всю ленту
+        без пропусков и повторов.
+        """
+        expected = list(
+            Post.objects.order_by('-pub_date', '-pk').values_list(
+                'pk', flat=True
+            )
+        )
+        for url in [INDEX_URL, GROUP_LIST_URL]:
+            with self.subTest(url=url):
+                pages = self.walk(url)
+                self.assertEqual(len(pages), PAGES_COUNT)
+                self.assertIsInstance(pages[0], KeysetPage)
+                self.assertEqual(
+                    len(pages[-1]), COUNT_POSTS_ON_LAST_PAGE
+                )
+                self.assertEqual(
+                    [post.pk for page in pages for post in page],
+                    expected
+                )
+
+    def test_previous_cursor(self):
+        """Курсор предыдущей страницы возвращает на неё же."""
+        first, second, third = self.walk(INDEX_URL)
+        self.assertFalse(first.has_previous())
+        response = self.guest.get(
+            f'{INDEX_URL}?cursor={third.previous_cursor}'
+        )
+        self.assertEqual(
+            list(response.context['page_obj']), list(second)
+        )
+        response = self.guest.get(
+            f'{INDEX_URL}?cursor={second.previous_cursor}'
+        )
+        self.assertEqual(
+            list(response.context['page_obj']), list(first)
+        )
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_invalid_cursor_gives_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        first = self.guest.get(INDEX_URL).context['page_obj']
+        page = self.guest.get(
+            f'{INDEX_URL}?cursor=broken'
+        ).context['page_obj']
+        self.assertEqual(list(page), list(first))
+
+    def test_no_count_query(self):
+        """
+        Страница по курсору строится без COUNT: запрос постов и запрос
+        вариантов их картинок.
+        """
+        paginator = KeysetPaginator(
+            Post.objects.for_feed(), settings.POSTS_COUNT_ON_PAGE
+        )
+        cursor = paginator.get_page(None).next_cursor
+        with self.assertNumQueries(2):
+            page = paginator.get_page(cursor)
+            self.assertEqual(len(page), settings.POSTS_COUNT_ON_PAGE)
+
+
+class CachedCountPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.reader = User.objects.create_user(username=ANOTHER_USERNAME)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug=SLUG,
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тест',
+            group=cls.group
+        )
+        cls.guest = Client()
+        cls.another = Client()
+        cls.another.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def count_queries(self, client, url):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        return response, [
+            query['sql'] for query in context.captured_queries
+            if 'COUNT(*)' in query['sql']
+        ]
+
+    def test_count_is_cached(self):
+        """Повторный показ ленты не выполняет SELECT COUNT(*)."""
+        feeds = [
+            [INDEX_URL, self.guest],
+            [GROUP_LIST_URL, self.guest],
+            [FOLLOW_INDEX_URL, self.another]
+        ]
+        for url, client in feeds:
+            with self.subTest(url=url):
+                response, counts = self.count_queries(client, url)
+                self.assertIsInstance(
+                    response.context['page_obj'].paginator,
+                    CachedCountPaginator
+                )
+                self.assertEqual(len(counts), 1)
+                self.assertEqual(
+                    response.context['page_obj'].paginator.count, 1
+                )
+                response, counts = self.count_queries(client, url)
+                self.assertEqual(counts, [])
+
+    def test_counters_follow_posts(self):
+        """Создание, перенос и удаление поста обновляют счётчики лент."""
+        feeds = {
+            counters.feed_key(counters.INDEX): INDEX_URL,
+            counters.feed_key(counters.GROUP, self.group.pk): GROUP_LIST_URL,
+            counters.feed_key(counters.PROFILE, self.user.pk): PROFILE_URL,
+        }
+        for url in feeds.values():
+            self.guest.get(url)
+        self.another.get(FOLLOW_INDEX_URL)
+        post = Post.objects.create(
+            author=self.user,
+            text='Новый пост',
+            group=self.group
+        )
+        for key in feeds:
+            with self.subTest(key=key):
+                self.assertEqual(counters.COUNTS.get(key), 2)
+        self.assertIsNone(counters.COUNTS.get(
+            counters.feed_key(counters.FOLLOW, self.reader.pk)
+        ))
+        post.group = None
+        post.save()
+        self.assertEqual(counters.COUNTS.get(
+            counters.feed_key(counters.GROUP, self.group.pk)
+        ), 1)
+        post.delete()
+        self.assertEqual(
+            counters.COUNTS.get(counters.feed_key(counters.INDEX)), 1
+        )
+        self.assertEqual(counters.COUNTS.get(
+            counters.feed_key(counters.PROFILE, self.user.pk)
+        ), 1)
+
+    def test_stale_count_keeps_full_page(self):
+        """Отставший счётчик не обрезает страницу."""
+        counters.COUNTS.set(counters.feed_key(counters.INDEX), 0)
+        Post.objects.bulk_create(
+            Post(author=self.user, text=str(text))
+            for text in range(settings.POSTS_COUNT_ON_PAGE)
+        )
+        page = self.guest.get(INDEX_URL).context['page_obj']
+        self.assertEqual(len(page), settings.POSTS_COUNT_ON_PAGE)
+
+    def test_stale_count_deep_page(self):
+        """
+        Страница за концом отставшего счётчика берётся по настоящему
+        числу постов, а не подменяется последней.
+        """
+        key = counters.feed_key(counters.INDEX)
+        counters.COUNTS.set(key, 1)
+        Post.objects.bulk_create(
+            Post(author=self.user, text=str(text))
+            for text in range(settings.POSTS_COUNT_ON_PAGE * 2)
+        )
+        page = self.guest.get(INDEX_URL, {'page': 3}).context['page_obj']
+        self.assertEqual(page.number, 3)
+        self.assertEqual(len(page), 1)
+        self.assertEqual(counters.COUNTS.get(key), 21)
+
+    def test_stale_high_count_gives_last_page(self):
+        """
+        Страница за настоящим концом завышенного счётчика подменяется
+        последней, а счётчик пересчитывается.
+        """
+        key = counters.feed_key(counters.INDEX)
+        counters.COUNTS.set(key, settings.POSTS_COUNT_ON_PAGE * 2 + 1)
+        page = self.guest.get(INDEX_URL, {'page': 2}).context['page_obj']
+        self.assertEqual(page.number, 1)
+        self.assertEqual(len(page), 1)
+        self.assertEqual(counters.COUNTS.get(key), 1)
+
+    def test_orphans(self):
+        """Висячие посты orphans выводятся на последней странице."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=str(text))
+            for text in range(settings.POSTS_COUNT_ON_PAGE)
+        )
+        paginator = CachedCountPaginator(
+            Post.objects.all(), settings.POSTS_COUNT_ON_PAGE,
+            counters.feed_key(counters.INDEX), orphans=1
+        )
+        page = paginator.get_page(1)
+        self.assertEqual(paginator.num_pages, 1)
+        self.assertEqual(len(page), settings.POSTS_COUNT_ON_PAGE + 1)
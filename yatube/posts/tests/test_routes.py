@@ -20,6 +20,8 @@ class PostURLTests(TestCase):
             ['post_edit', [POST_ID], f'/posts/{POST_ID}/edit/'],
             ['post_create', None, '/create/'],
             ['add_comment', [POST_ID], f'/posts/{POST_ID}/comment/'],
+            ['post_comments', [POST_ID], f'/posts/{POST_ID}/comments/'],
+            ['search', None, '/search/'],
             ['follow_index', None, '/follow/'],
             ['profile_follow', [USER], f'/profile/{USER}/follow/'],
             ['profile_unfollow', [USER], f'/profile/{USER}/unfollow/']
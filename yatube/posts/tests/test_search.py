@@ -0,0 +1,98 @@
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import search
+from ..models import Post, User
+from ..stemmer import stem
+
+USERNAME = 'auth'
+SEARCH_URL = reverse('posts:search')
+
+
+class StemmerTests(TestCase):
+    def test_stem(self):
+        """Стеммер отбрасывает окончания и суффиксы как Snowball."""
+        cases = [
+            ['валентина', 'валентин'],
+            ['валится', 'вал'],
+            ['важнейшими', 'важн'],
+            ['величественность', 'величествен'],
+            ['красотою', 'красот'],
+            ['Ёлки', 'елк'],
+            ['Python', 'python'],
+        ]
+        for word, expected in cases:
+            with self.subTest(word=word):
+                self.assertEqual(stem(word), expected)
+
+
+class PostSearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.river = Post.objects.create(
+            author=cls.user, text='Прогулка вдоль широкой реки'
+        )
+        cls.rivers = Post.objects.create(
+            author=cls.user, text='Реки, реки и снова реке'
+        )
+        cls.forest = Post.objects.create(
+            author=cls.user, text='Осенний лес'
+        )
+        cls.guest = Client()
+
+    def test_word_forms_ranked(self):
+        """Находятся другие формы слова; чаще упомянутое — выше."""
+        response = self.guest.get(SEARCH_URL, {'q': 'река'})
+        self.assertEqual(
+            list(response.context['page_obj']), [self.rivers, self.river]
+        )
+        self.assertEqual(response.context['page_obj'].paginator.count, 2)
+
+    def test_all_words_required(self):
+        """Пост должен содержать все слова запроса."""
+        page = self.guest.get(
+            SEARCH_URL, {'q': 'широкие реки'}
+        ).context['page_obj']
+        self.assertEqual(list(page), [self.river])
+
+    def test_index_follows_changes(self):
+        """Правка и удаление поста сразу видны в поиске."""
+        forest = Post.objects.get(pk=self.forest.pk)
+        forest.text = 'Осенняя река'
+        forest.save()
+        self.assertEqual(search.search('лес').count(), 0)
+        self.assertEqual(search.search('реки').count(), 3)
+        Post.objects.filter(pk=self.river.pk).delete()
+        self.assertEqual(search.search('реки').count(), 2)
+
+    def test_empty_query(self):
+        """Без запроса страница поиска не ищет посты."""
+        response = self.guest.get(SEARCH_URL, {'q': '  '})
+        self.assertIsNone(response.context['page_obj'])
+
+    def test_pages_keep_query(self):
+        """Ссылки на страницы результатов сохраняют запрос."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text='Поле')
+            for _ in range(settings.POSTS_COUNT_ON_PAGE + 1)
+        )
+        call_command('reindex_search', stdout=StringIO())
+        response = self.guest.get(SEARCH_URL, {'q': 'поле'})
+        self.assertContains(
+            response, '?q=%D0%BF%D0%BE%D0%BB%D0%B5&amp;page=2'
+        )
+        response = self.guest.get(SEARCH_URL, {'q': 'поле', 'page': 2})
+        self.assertEqual(len(response.context['page_obj']), 1)
+
+    def test_reindex_command(self):
+        """reindex_search строит индекс по всем постам заново."""
+        out = StringIO()
+        call_command('reindex_search', batch_size=2, stdout=out)
+        self.assertIn('Проиндексировано постов: 3', out.getvalue())
+        self.assertEqual(search.search('лес').count(), 1)
@@ -0,0 +1,245 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .. import search
+from ..models import (
+    Comment, FeedEntry, Follow, Group, Post, User, UserStats
+)
+from ..transfer import KINDS, NaturalKeys, last_pk, saved
+
+USERNAME = 'auth'
+ANOTHER_USERMANE = 'creator'
+SLUG = 'test-slug'
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class TransferCommandsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.another_user = User.objects.create_user(
+            username=ANOTHER_USERMANE
+        )
+        cls.group = Group.objects.create(
+            title='Группа', slug=SLUG, description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Первый,\n"пост"'
+        )
+        Post.objects.create(author=cls.another_user, text='Второй пост')
+        Comment.objects.create(
+            post=cls.post, author=cls.another_user, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.another_user, author=cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def export(self, kind, file_format):
+        path = os.path.join(TEMP_DIR, f'{kind}.{file_format}')
+        call_command(
+            'export_posts', kind=kind, file_format=file_format,
+            output=path, chunk_size=1, stderr=StringIO()
+        )
+        return path
+
+    def rows(self):
+        return {
+            'posts': list(Post.objects.order_by('pk').values_list(
+                'pk', 'author', 'group', 'text', 'pub_date', 'image'
+            )),
+            'comments': list(Comment.objects.order_by('pk').values_list(
+                'pk', 'post', 'author', 'text', 'created'
+            )),
+            'follows': list(Follow.objects.order_by('pk').values_list(
+                'user', 'author'
+            )),
+        }
+
+    def test_round_trip(self):
+        """Выгрузка и загрузка в обоих форматах сохраняют данные."""
+        for file_format in ('ndjson', 'csv'):
+            with self.subTest(file_format=file_format):
+                before = self.rows()
+                paths = [
+                    self.export(kind, file_format)
+                    for kind in ('posts', 'comments', 'follows')
+                ]
+                Post.objects.all().delete()
+                Follow.objects.all().delete()
+                for kind, path in zip(('posts', 'comments', 'follows'),
+                                      paths):
+                    out = StringIO()
+                    call_command(
+                        'import_posts', path, kind=kind, batch_size=1,
+                        commit_every=1, stdout=out
+                    )
+                    self.assertIn('Загружено строк:', out.getvalue())
+                self.assertEqual(self.rows(), before)
+
+    def test_stats_recounted(self):
+        """После загрузки статистика авторов пересчитана."""
+        path = self.export('posts', 'ndjson')
+        Post.objects.all().delete()
+        call_command('import_posts', path, stdout=StringIO())
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).posts_count, 1
+        )
+
+    def test_import_indexes_only_new_posts(self):
+        """Загрузка дополняет индекс поиска, не перестраивая его."""
+        path = os.path.join(TEMP_DIR, 'search.ndjson')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(f'{{"author": "{USERNAME}", "text": "Загрузка"}}\n')
+        search.backend().delete([self.post.pk])
+        call_command('import_posts', path, stdout=StringIO())
+        self.assertEqual(
+            [post.text for post in search.search('загрузка')[0:10]],
+            ['Загрузка']
+        )
+        self.assertEqual(list(search.search('первый')[0:10]), [])
+
+    @override_settings(POSTS_FEED_FANOUT=True)
+    def test_import_fills_feeds(self):
+        """Загруженные посты и подписки попадают в ленты подписчиков."""
+        path = os.path.join(TEMP_DIR, 'feed.ndjson')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(f'{{"author": "{USERNAME}", "text": "Лента"}}\n')
+        call_command('import_posts', path, stdout=StringIO())
+        post = Post.objects.get(text='Лента')
+        self.assertEqual(
+            list(FeedEntry.objects.values_list('user_id', 'post_id')),
+            [(self.another_user.pk, post.pk)]
+        )
+        path = self.export('follows', 'ndjson')
+        Follow.objects.all().delete()
+        call_command('import_posts', path, kind='follows', stdout=StringIO())
+        self.assertEqual(
+            set(FeedEntry.objects.values_list('post_id', flat=True)),
+            set(self.user.posts.values_list('pk', flat=True))
+        )
+
+    def test_saved_skips_concurrent_rows(self):
+        """
+        Ключи пачки без явных id находятся по её строкам, а не по всем
+        строкам, вставленным после неё.
+        """
+        before = last_pk(Post)
+        posts = [
+            Post(author=self.user, text=f'Пачка {number}')
+            for number in range(2)
+        ]
+        Post.objects.bulk_create(posts)
+        Post.objects.create(author=self.user, text='Пачка 0')
+        found = saved(Post, posts, before, KINDS['posts'].identity)
+        self.assertEqual(
+            {post.pk for post in found},
+            set(Post.objects.filter(
+                text__startswith='Пачка'
+            ).order_by('pk').values_list('pk', flat=True)[:2])
+        )
+
+    def test_import_keeps_dates(self):
+        """
+        Даты из файла сохраняются, а посты, созданные обычным путём,
+        по-прежнему получают текущее время.
+        """
+        path = os.path.join(TEMP_DIR, 'dates.ndjson')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(
+                f'{{"author": "{USERNAME}", "text": "Старый", '
+                '"pub_date": "2020-01-02T03:04:05"}\n'
+            )
+        call_command('import_posts', path, stdout=StringIO())
+        self.assertEqual(
+            Post.objects.get(text='Старый').pub_date.isoformat(),
+            '2020-01-02T03:04:05+00:00'
+        )
+        self.assertGreater(
+            Post.objects.create(author=self.user, text='Новый').pub_date,
+            self.post.pub_date
+        )
+
+    def test_natural_keys_keep_batch_on_eviction(self):
+        """Переполненный кэш ключей сохраняет ключи текущей пачки."""
+        User.objects.create_user(username='c')
+        keys = NaturalKeys(User, 'username', limit=2)
+        keys.load([USERNAME])
+        keys.load([USERNAME, ANOTHER_USERMANE, 'c'])
+        self.assertEqual(keys.get(USERNAME), self.user.pk)
+        self.assertEqual(keys.get(ANOTHER_USERMANE), self.another_user.pk)
+
+    def test_unknown_author(self):
+        """Неизвестный автор останавливает загрузку без изменений."""
+        path = os.path.join(TEMP_DIR, 'unknown.ndjson')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('{"author": "nobody", "text": "Текст"}\n')
+        posts_count = Post.objects.count()
+        with self.assertRaisesMessage(CommandError, 'nobody'):
+            call_command('import_posts', path, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), posts_count)
+
+    def test_dumpdata_ndjson_import(self):
+        """Выгрузку dumpdata в NDJSON принимает import_posts."""
+        path = os.path.join(TEMP_DIR, 'dump.ndjson')
+        call_command(
+            'dumpdata', 'posts.post', 'posts.group', format='ndjson',
+            use_natural_foreign_keys=True, output=path
+        )
+        before = self.rows()['posts']
+        Post.objects.all().delete()
+        call_command('import_posts', path, stdout=StringIO())
+        self.assertEqual(
+            [row[:4] for row in self.rows()['posts']],
+            [row[:4] for row in before]
+        )
+
+    def test_natural_keys_round_trip(self):
+        """
+        Группы и подписки выгружаются и загружаются по естественным
+        ключам, без номеров.
+        """
+        path = os.path.join(TEMP_DIR, 'natural.ndjson')
+        call_command(
+            'dumpdata', 'posts.group', 'posts.follow', format='ndjson',
+            use_natural_foreign_keys=True, use_natural_primary_keys=True,
+            output=path
+        )
+        with open(path, encoding='utf-8') as file:
+            lines = file.read().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertNotIn('"pk"', ''.join(lines))
+        self.assertIn(f'"user": ["{ANOTHER_USERMANE}"]', ''.join(lines))
+        Follow.objects.all().delete()
+        call_command('loaddata', path, verbosity=0)
+        self.assertTrue(Follow.objects.filter(
+            user=self.another_user, author=self.user
+        ).exists())
+
+    def test_follow_natural_keys_single_query(self):
+        """dumpdata подписок не читает пользователей по одному."""
+        for number in range(3):
+            Follow.objects.create(
+                user=User.objects.create_user(username=f'reader{number}'),
+                author=self.user
+            )
+        with CaptureQueriesContext(connection) as context:
+            call_command(
+                'dumpdata', 'posts.follow', format='ndjson',
+                use_natural_foreign_keys=True,
+                use_natural_primary_keys=True, stdout=StringIO()
+            )
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertEqual(Group.objects.get_by_natural_key(SLUG), self.group)
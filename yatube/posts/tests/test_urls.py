@@ -15,6 +15,7 @@ GROUP_LIST_URL = reverse('posts:group_list', args=[SLUG])
 PROFILE_URL = reverse('posts:profile', args=[USERNAME])
 LOGIN_URL = reverse('users:login')
 FOLLOW_INDEX_URL = reverse('posts:follow_index')
+SEARCH_URL = reverse('posts:search')
 FOLLOW_URL = reverse('posts:profile_follow', args=[USERNAME])
 UNFOLLOW_URL = reverse('posts:profile_unfollow', args=[USERNAME])
 REDIRECT_POST_CREATE_URL = f'{LOGIN_URL}?next={POST_CREATE_URL}'
@@ -55,6 +56,10 @@ class PostURLTests(TestCase):
             'posts:post_edit',
             args=[cls.post.id]
         )
+        cls.POST_COMMENTS_URL = reverse(
+            'posts:post_comments',
+            args=[cls.post.id]
+        )
         cls.REDIRECT_POST_EDIT_URL = (
             f'{LOGIN_URL}?next={cls.POST_EDIT_URL}'
         )
@@ -66,6 +71,8 @@ class PostURLTests(TestCase):
             [GROUP_LIST_URL, self.guest, OK],
             [PROFILE_URL, self.guest, OK],
             [self.POST_DETAIL_URL, self.guest, OK],
+            [self.POST_COMMENTS_URL, self.guest, OK],
+            [SEARCH_URL, self.guest, OK],
             ['/unexisting_page/', self.guest, NOT_FOUND],
             [self.POST_EDIT_URL, self.author, OK],
             [self.POST_EDIT_URL, self.guest, FOUND],
@@ -95,7 +102,8 @@ class PostURLTests(TestCase):
             [self.POST_DETAIL_URL, 'posts/post_detail.html'],
             [self.POST_EDIT_URL, 'posts/create_post.html'],
             [POST_CREATE_URL, 'posts/create_post.html'],
-            [FOLLOW_INDEX_URL, 'posts/follow.html']
+            [FOLLOW_INDEX_URL, 'posts/follow.html'],
+            [SEARCH_URL, 'posts/search.html']
         ]
         for url, template in templates_url_names:
             with self.subTest(url=url):
@@ -1,13 +1,33 @@
+import json
+import os
 import shutil
 import tempfile
+import warnings
+from datetime import timedelta
+from http import HTTPStatus
+from io import BytesIO, StringIO
 
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
-from django.test import Client, TestCase, override_settings
+from django.core.cache.backends.base import CacheKeyWarning
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.conf import settings
+from PIL import Image
+
+from core import metrics
 
-from ..models import Follow, Group, Post, User
+from .. import cards, counters, freshness, tasks, thumbnails
+from ..models import (
+    Comment, FeedEntry, Follow, Group, Post, PostImageVariant, User,
+    UserStats
+)
 
 
 USERNAME = 'auth'
@@ -36,6 +56,7 @@ SMALL_GIF = (
 )
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+EXIF_MAKE = 0x010F
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -80,6 +101,9 @@ class PostPagesTests(TestCase):
         super().tearDownClass()
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
+    def setUp(self):
+        cache.clear()
+
     def test_pages_show_correct_context(self):
         """
         Шаблоны index, group_list, profile
@@ -229,3 +253,768 @@ class PostPagesTests(TestCase):
                 self.assertEqual(
                     len(response.context['page_obj']), records_count
                 )
+
+    def test_feed_queries_do_not_depend_on_page_size(self):
+        """
+        Количество запросов к базе на страницах лент
+        не зависит от количества постов на странице.
+        """
+        Post.objects.filter(pk=self.post.pk).update(image='')
+        Follow.objects.create(
+            user=self.another_user,
+            author=self.user
+        )
+        feeds = [
+            [INDEX_URL, self.author],
+            [GROUP_LIST_URL, self.author],
+            [PROFILE_URL, self.author],
+            [FOLLOW_INDEX_URL, self.another]
+        ]
+        queries = {}
+        for url, client in feeds:
+            cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                client.get(url)
+            queries[url] = len(context)
+        Post.objects.bulk_create(
+            Post(
+                author=self.user,
+                text=str(text),
+                group=self.group
+            ) for text in range(settings.POSTS_COUNT_ON_PAGE)
+        )
+        for url, client in feeds:
+            with self.subTest(url=url):
+                cache.clear()
+                with CaptureQueriesContext(connection) as context:
+                    response = client.get(url)
+                self.assertEqual(
+                    len(response.context['page_obj']),
+                    settings.POSTS_COUNT_ON_PAGE
+                )
+                self.assertEqual(len(context), queries[url])
+
+
+@override_settings(
+    POSTS_FEED_FANOUT=True,
+    POSTS_FEED_FANOUT_MAX_FOLLOWERS=1,
+    POSTS_FEED_WORKERS=0
+)
+class FollowFeedFanoutTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author_user = User.objects.create_user(username=USERNAME)
+        self.reader_user = User.objects.create_user(
+            username=ANOTHER_USERMANE
+        )
+        self.prolific_user = User.objects.create_user(username='prolific')
+        self.fan_user = User.objects.create_user(username='fan')
+        self.reader = Client()
+        self.reader.force_login(self.reader_user)
+
+    def feed(self):
+        return set(self.reader.get(FOLLOW_INDEX_URL).context['page_obj'])
+
+    def entries(self, **filters):
+        return set(FeedEntry.objects.filter(**filters).values_list(
+            'user_id', 'post_id'
+        ))
+
+    def test_posts_fan_out_to_followers(self):
+        """Пост автора попадает в FeedEntry его подписчиков."""
+        old_post = Post.objects.create(author=self.author_user, text='Ранее')
+        follow = Follow.objects.create(
+            user=self.reader_user, author=self.author_user
+        )
+        new_post = Post.objects.create(author=self.author_user, text='Тест')
+        self.assertEqual(self.entries(), {
+            (self.reader_user.pk, old_post.pk),
+            (self.reader_user.pk, new_post.pk),
+        })
+        self.assertEqual(self.feed(), {old_post, new_post})
+        follow.delete()
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader_user))
+        self.assertEqual(self.feed(), set())
+
+    def test_feed_read_from_entries(self):
+        """Лента идёт по записям FeedEntry читателя в порядке их дат."""
+        Follow.objects.create(user=self.reader_user, author=self.author_user)
+        posts = [
+            Post.objects.create(author=self.author_user, text=str(number))
+            for number in range(3)
+        ]
+        with CaptureQueriesContext(connection) as context:
+            page = self.reader.get(FOLLOW_INDEX_URL).context['page_obj']
+        self.assertEqual(list(page), posts[::-1])
+        self.assertTrue(any(
+            '"posts_feedentry"."pub_date" AS "feed_date"' in query['sql']
+            and 'ORDER BY "feed_date" DESC' in query['sql']
+            for query in context.captured_queries
+        ))
+        with self.settings(POSTS_KEYSET_PAGINATION=('follow_index',)):
+            response = self.reader.get(FOLLOW_INDEX_URL)
+        self.assertEqual(list(response.context['page_obj']), posts[::-1])
+
+    def test_posts_of_popular_author_read_on_request(self):
+        """
+        Посты автора с большим числом подписчиков не раскладываются
+        по лентам, но показываются в ленте подписок вместе с записями
+        FeedEntry.
+        """
+        Follow.objects.create(user=self.reader_user, author=self.author_user)
+        old_post = Post.objects.create(author=self.author_user, text='Ранее')
+        Follow.objects.create(user=self.fan_user, author=self.prolific_user)
+        Follow.objects.create(
+            user=self.reader_user, author=self.prolific_user
+        )
+        post = Post.objects.create(author=self.prolific_user, text='Тест')
+        new_post = Post.objects.create(author=self.author_user, text='Потом')
+        self.assertFalse(FeedEntry.objects.filter(post__author=post.author))
+        self.assertEqual(
+            list(self.reader.get(FOLLOW_INDEX_URL).context['page_obj']),
+            [new_post, post, old_post]
+        )
+        with self.settings(POSTS_KEYSET_PAGINATION=('follow_index',)):
+            response = self.reader.get(FOLLOW_INDEX_URL)
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, post, old_post]
+        )
+
+    def test_author_crossing_threshold(self):
+        """
+        Записи автора удаляются из лент, когда подписчиков становится
+        больше порога, и возвращаются, когда их снова не больше порога.
+        """
+        Follow.objects.create(user=self.fan_user, author=self.prolific_user)
+        old_post = Post.objects.create(
+            author=self.prolific_user, text='Ранее'
+        )
+        self.assertEqual(self.entries(), {(self.fan_user.pk, old_post.pk)})
+        follow = Follow.objects.create(
+            user=self.reader_user, author=self.prolific_user
+        )
+        self.assertEqual(self.entries(), set())
+        post = Post.objects.create(author=self.prolific_user, text='Тест')
+        self.assertEqual(self.entries(), set())
+        self.assertEqual(self.feed(), {old_post, post})
+        Follow.objects.filter(user=self.fan_user).delete()
+        self.assertEqual(self.entries(), {
+            (self.reader_user.pk, old_post.pk),
+            (self.reader_user.pk, post.pk),
+        })
+        self.assertEqual(self.feed(), {old_post, post})
+        follow.delete()
+        self.assertEqual(self.entries(), set())
+
+    def test_backfill_command(self):
+        """Команда backfill_feed заполняет ленты по подпискам."""
+        with self.settings(POSTS_FEED_FANOUT=False):
+            Follow.objects.create(
+                user=self.reader_user, author=self.author_user
+            )
+            Follow.objects.create(
+                user=self.reader_user, author=self.prolific_user
+            )
+            Follow.objects.create(
+                user=self.fan_user, author=self.prolific_user
+            )
+            post = Post.objects.create(author=self.author_user, text='Тест')
+            popular = Post.objects.create(
+                author=self.prolific_user, text='Тест'
+            )
+        self.assertFalse(FeedEntry.objects.exists())
+        call_command('backfill_feed', stdout=StringIO())
+        self.assertEqual(self.entries(), {(self.reader_user.pk, post.pk)})
+        self.assertEqual(self.feed(), {post, popular})
+
+    def test_backfill_creates_missing_stats(self):
+        """
+        Автор без строки статистики получает её до заполнения и не
+        раскладывается по лентам, если подписчиков больше порога.
+        """
+        with self.settings(POSTS_FEED_FANOUT=False):
+            for user in (self.reader_user, self.fan_user):
+                Follow.objects.create(user=user, author=self.prolific_user)
+            Post.objects.create(author=self.prolific_user, text='Тест')
+        UserStats.objects.filter(user=self.prolific_user).delete()
+        call_command('backfill_feed', clear=True, stdout=StringIO())
+        stats = UserStats.objects.get(user=self.prolific_user)
+        self.assertEqual(stats.followers_count, 2)
+        self.assertFalse(stats.feed_fanned_out)
+        self.assertFalse(FeedEntry.objects.exists())
+
+
+@override_settings(POSTS_CARD_CACHE_VIEWS=('group_list', 'profile'))
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug=TEST_SLUG,
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тест',
+            group=cls.group
+        )
+        cls.guest = Client()
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry().clear()
+
+    def test_cached_cards_match_rendered(self):
+        """Карточки из кэша совпадают с отрисованными заново."""
+        with self.settings(POSTS_CARD_CACHE_VIEWS=()):
+            expected = self.guest.get(PROFILE_URL).content
+        self.assertEqual(self.guest.get(PROFILE_URL).content, expected)
+        self.assertEqual(cards.stats(), {'hits': 0, 'misses': 1})
+        self.assertEqual(self.guest.get(PROFILE_URL).content, expected)
+        self.assertEqual(cards.stats(), {'hits': 1, 'misses': 1})
+        self.assertIn(
+            'yatube_post_cards_total{result="hit"} 1', metrics.export()
+        )
+
+    def test_cards_invalidation(self):
+        """Правка поста, автора, группы и комментарии обновляют карточку."""
+        self.guest.get(PROFILE_URL)
+        self.guest.get(GROUP_LIST_URL)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Новый текст'
+        post.save()
+        self.assertContains(self.guest.get(PROFILE_URL), 'Новый текст')
+        self.user.first_name = 'Лев'
+        self.user.save()
+        self.assertContains(self.guest.get(GROUP_LIST_URL), '@Лев')
+        self.group.title = 'Другая группа'
+        self.group.save()
+        self.assertContains(self.guest.get(PROFILE_URL), '#Другая группа')
+        Comment.objects.create(post=post, author=self.user, text='Тест')
+        self.assertContains(self.guest.get(PROFILE_URL), 'Комментариев: 1')
+
+
+@override_settings(POSTS_PAGE_CACHE_VIEWS=('index', 'group_list'))
+class AnonymousPageCacheTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username=USERNAME)
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug=TEST_SLUG,
+            description='Тестовое описание',
+        )
+        self.new_group = Group.objects.create(
+            title='Новая группа',
+            slug=NEW_TEST_SLUG,
+            description='Тестовое описание',
+        )
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Тест',
+            group=self.group
+        )
+        self.guest = Client()
+        self.author = Client()
+        self.author.force_login(self.user)
+
+    def test_page_served_from_cache(self):
+        """Повторный запрос гостя не обращается к базе."""
+        for url in [INDEX_URL, GROUP_LIST_URL, INDEX_URL + '?page=2']:
+            with self.subTest(url=url):
+                content = self.guest.get(url).content
+                with self.assertNumQueries(0):
+                    response = self.guest.get(url)
+                self.assertEqual(response.content, content)
+
+    def test_authorized_not_cached(self):
+        """Авторизованному пользователю страница строится заново."""
+        self.author.get(INDEX_URL)
+        response = self.author.get(INDEX_URL)
+        self.assertIn('page_obj', response.context)
+
+    def test_post_changes_reset_cache(self):
+        """Создание, правка и удаление поста сразу видны гостям."""
+        for url in [INDEX_URL, GROUP_LIST_URL, NEW_GROUP_LIST_URL]:
+            self.guest.get(url)
+        post = Post.objects.create(
+            author=self.user,
+            text='Новый пост',
+            group=self.group
+        )
+        self.assertContains(self.guest.get(INDEX_URL), 'Новый пост')
+        self.assertContains(self.guest.get(GROUP_LIST_URL), 'Новый пост')
+        post.text = 'Правка'
+        post.group = self.new_group
+        post.save()
+        self.assertContains(self.guest.get(INDEX_URL), 'Правка')
+        self.assertNotContains(self.guest.get(GROUP_LIST_URL), 'Правка')
+        self.assertContains(self.guest.get(NEW_GROUP_LIST_URL), 'Правка')
+        post.delete()
+        self.assertNotContains(self.guest.get(INDEX_URL), 'Правка')
+        self.assertNotContains(self.guest.get(NEW_GROUP_LIST_URL), 'Правка')
+
+    def test_group_slug_not_in_cache_keys(self):
+        """
+        Сохранение поста не читает группу из базы, а slug с пробелами и
+        кириллицей не попадает в ключи кэша.
+        """
+        group = Group.objects.create(
+            title='Группа', slug='группа с пробелом', description='Тест'
+        )
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            with CaptureQueriesContext(connection) as context:
+                post = Post.objects.create(
+                    author=self.user, text='Тест', group=group
+                )
+                post.text = 'Правка'
+                post.save()
+            post.delete()
+        self.assertFalse(any(
+            'FROM "posts_group"' in query['sql']
+            for query in context.captured_queries
+        ))
+
+
+@override_settings(BENCH_DATABASE='bench.sqlite3')
+class BenchViewsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        call_command(
+            'seed_bench', users=5, groups=2, posts=30, comments=20,
+            follows=10, stdout=StringIO()
+        )
+
+    def test_default_database_refused(self):
+        """Без BENCH_DATABASE замеры не трогают базу и кэш."""
+        posts = Post.objects.count()
+        with self.settings(BENCH_DATABASE=None):
+            for command in ['seed_bench', 'bench_views']:
+                with self.subTest(command=command):
+                    with self.assertRaises(CommandError):
+                        call_command(command, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), posts)
+
+    def test_report(self):
+        """Отчёт содержит задержки и число запросов всех страниц."""
+        out = StringIO()
+        call_command('bench_views', repeat=3, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report), {
+            'index', 'group_posts', 'profile', 'post_detail', 'follow_index'
+        })
+        for name, result in report.items():
+            with self.subTest(name=name):
+                self.assertEqual(result['status'], 200)
+                self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+
+    def test_baseline_regression(self):
+        """Рост числа запросов относительно baseline — ошибка."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        baseline = os.path.join(directory, 'baseline.json')
+        call_command(
+            'bench_views', repeat=1, view=['profile'], output=baseline
+        )
+        with open(baseline, encoding='utf-8') as file:
+            report = json.load(file)
+        report['profile']['queries'] -= 1
+        with open(baseline, 'w', encoding='utf-8') as file:
+            json.dump(report, file)
+        with self.assertRaises(CommandError):
+            call_command(
+                'bench_views', repeat=1, view=['profile'],
+                baseline=baseline, stdout=StringIO()
+            )
+
+    def test_profile_templates(self):
+        """--profile-templates пишет свёрнутые стеки шаблонов замера."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'templates.folded')
+        call_command(
+            'bench_views', repeat=1, view=['index'], profile_templates=path,
+            stdout=StringIO()
+        )
+        with open(path, encoding='utf-8') as file:
+            lines = file.read().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, micros = line.rsplit(' ', 1)
+            self.assertTrue(stack.startswith('posts/index.html'))
+            self.assertGreater(int(micros), 0)
+
+
+class PostCommentsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.post = Post.objects.create(author=cls.user, text='Тест')
+        cls.POST_DETAIL_URL = reverse('posts:post_detail', args=[cls.post.pk])
+        cls.POST_COMMENTS_URL = reverse(
+            'posts:post_comments', args=[cls.post.pk]
+        )
+        cls.guest = Client()
+
+    def add_comments(self, count):
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.user, text=str(number))
+            for number in range(count)
+        )
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            self.guest.get(self.POST_DETAIL_URL)
+        return len(context.captured_queries)
+
+    def test_queries_do_not_depend_on_comments(self):
+        """Число запросов страницы поста не зависит от комментариев."""
+        self.add_comments(1)
+        expected = self.count_queries()
+        self.add_comments(settings.COMMENTS_COUNT_ON_PAGE * 3)
+        self.assertEqual(self.count_queries(), expected)
+        self.assertEqual(
+            len(self.guest.get(self.POST_DETAIL_URL).context['comments']),
+            settings.COMMENTS_COUNT_ON_PAGE
+        )
+
+    def test_comments_pages(self):
+        """Курсоры JSON-страниц обходят все комментарии по одному разу."""
+        self.add_comments(settings.COMMENTS_COUNT_ON_PAGE * 2 + 1)
+        seen = []
+        cursor = self.guest.get(
+            self.POST_DETAIL_URL
+        ).context['comments'].next_cursor
+        while cursor:
+            data = self.guest.get(
+                self.POST_COMMENTS_URL, {'cursor': cursor, 'format': 'json'}
+            ).json()
+            seen.extend(comment['id'] for comment in data['comments'])
+            cursor = data['next_cursor']
+        first_page = [
+            comment.pk for comment in self.guest.get(
+                self.POST_DETAIL_URL
+            ).context['comments']
+        ]
+        self.assertEqual(len(seen), settings.COMMENTS_COUNT_ON_PAGE + 1)
+        self.assertEqual(
+            sorted(first_page + seen),
+            sorted(Comment.objects.values_list('pk', flat=True))
+        )
+
+    def test_comments_fragment(self):
+        """Фрагмент комментариев отдаётся без общего шаблона страницы."""
+        self.add_comments(1)
+        response = self.guest.get(self.POST_COMMENTS_URL)
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertContains(response, f'@{USERNAME}')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_THUMBNAIL_WORKERS=2)
+class ThumbnailTests(TransactionTestCase):
+    # Тестовая база SQLite в памяти не ждёт блокировок, поэтому фоновые
+    # задачи в тестах не должны писать в неё одновременно.
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(shutil.rmtree, TEMP_MEDIA_ROOT, ignore_errors=True)
+        self.user = User.objects.create_user(username=USERNAME)
+        self.guest = Client()
+
+    def create_posts(self, count):
+        """Посты с картинками без сигналов, то есть без готовых превью."""
+        Post.objects.bulk_create(
+            Post(
+                author=self.user,
+                text='Тест',
+                image=SimpleUploadedFile(
+                    f'small{number}.gif', SMALL_GIF, content_type='image/gif'
+                )
+            ) for number in range(count)
+        )
+
+    def test_placeholder_until_thumbnail_ready(self):
+        """Пока превью создаётся в фоне, страница показывает заглушку."""
+        self.create_posts(1)
+        response = self.guest.get(PROFILE_URL)
+        self.assertContains(response, 'bg-light')
+        self.assertNotContains(response, '<img class="card-img')
+        tasks.wait()
+        response = self.guest.get(PROFILE_URL)
+        self.assertContains(response, '<img class="card-img')
+
+    def test_thumbnail_inline_without_workers(self):
+        """Без пула превью создаётся при первом же показе."""
+        self.create_posts(1)
+        with self.settings(POSTS_THUMBNAIL_WORKERS=0):
+            response = self.guest.get(PROFILE_URL)
+        self.assertContains(response, '<img class="card-img')
+        self.assertNotContains(response, 'bg-light')
+
+    def test_no_thumbnail_while_upload_pending(self):
+        """
+        Пока задача загрузки не очистила оригинал, показ не создаёт
+        превью и варианты по нему; после неё превью уже готово.
+        """
+        self.create_posts(1)
+        post = Post.objects.get()
+        cache.set(thumbnails.upload_pending_key(post.image.name), True)
+        response = self.guest.get(PROFILE_URL)
+        self.assertContains(response, 'bg-light')
+        self.assertFalse(thumbnails.QUEUE.pending)
+        with self.settings(POSTS_THUMBNAIL_WORKERS=0):
+            response = self.guest.get(PROFILE_URL)
+        self.assertContains(response, 'bg-light')
+        self.assertFalse(PostImageVariant.objects.exists())
+        thumbnails.process_upload(post.image.name, post.pk)
+        self.assertEqual(thumbnails.upload_pending([post.image.name]), set())
+        response = self.guest.get(PROFILE_URL)
+        self.assertContains(response, '<img class="card-img')
+
+    def test_thumbnail_created_after_save(self):
+        """Превью новой картинки создаётся сразу после сохранения поста."""
+        post = Post.objects.create(
+            author=self.user,
+            text='Тест',
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'
+            )
+        )
+        tasks.wait()
+        self.assertTrue(thumbnails.DeferredThumbnailBackend().ready(
+            post.image, thumbnails.GEOMETRY, **thumbnails.OPTIONS
+        ))
+
+    def test_warm_thumbnails_command(self):
+        """Команда warm_thumbnails создаёт только недостающие превью."""
+        self.create_posts(3)
+        out = StringIO()
+        call_command('warm_thumbnails', workers=1, stdout=out)
+        self.assertIn('Создано превью: 3', out.getvalue())
+        out = StringIO()
+        call_command('warm_thumbnails', workers=1, stdout=out)
+        self.assertIn('Создано превью: 0, уже были: 3', out.getvalue())
+
+    def test_image_variants_in_picture(self):
+        """
+        Варианты картинки создаются после первого показа поста
+        и выводятся в <picture> с srcset и размерами.
+        """
+        self.create_posts(1)
+        post = Post.objects.get()
+        thumbnails.generate(post.image.name)
+        self.guest.get(PROFILE_URL)
+        tasks.wait()
+        self.assertEqual(
+            sorted(post.image_variants.values_list('format', flat=True)),
+            ['jpeg', 'webp']
+        )
+        response = self.guest.get(PROFILE_URL)
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, 'width="2" height="1"')
+        self.assertContains(response, ' 2w"')
+
+    def test_image_variants_built_after_upload(self):
+        """Варианты картинки создаются сразу после сохранения поста."""
+        post = Post.objects.create(
+            author=self.user,
+            text='Тест',
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'
+            )
+        )
+        tasks.wait()
+        self.assertEqual(
+            sorted(post.image_variants.values_list('format', flat=True)),
+            ['jpeg', 'webp']
+        )
+
+    def test_image_variants_replaced_on_image_change(self):
+        """После замены картинки старые варианты заменяются новыми."""
+        self.create_posts(1)
+        post = Post.objects.get()
+        thumbnails.build_variants(post.pk)
+        old = set(PostImageVariant.objects.values_list('image', flat=True))
+        post.image = SimpleUploadedFile(
+            'other.gif', SMALL_GIF, content_type='image/gif'
+        )
+        post.save()
+        tasks.wait()
+        new = set(PostImageVariant.objects.values_list('image', flat=True))
+        self.assertEqual(len(new), 2)
+        self.assertFalse(old & new)
+
+    def test_failed_variants_not_rescheduled(self):
+        """Неудачное создание вариантов не повторяется при каждом показе."""
+        Post.objects.bulk_create([Post(
+            author=self.user,
+            text='Тест',
+            image=SimpleUploadedFile(
+                'broken.gif', b'not an image', content_type='image/gif'
+            )
+        )])
+        post = Post.objects.get()
+        with self.settings(POSTS_THUMBNAIL_WORKERS=0):
+            with self.assertLogs('posts.tasks', 'ERROR'), \
+                    self.assertLogs('sorl.thumbnail', 'ERROR'):
+                thumbnails.schedule_variants(post.pk)
+            with self.assertNoLogs('posts.tasks', 'ERROR'):
+                thumbnails.schedule_variants(post.pk)
+        self.assertFalse(PostImageVariant.objects.exists())
+
+    def test_warm_thumbnails_variants(self):
+        """warm_thumbnails --variants создаёт варианты недостающим постам."""
+        self.create_posts(2)
+        out = StringIO()
+        call_command('warm_thumbnails', workers=1, variants=True, stdout=out)
+        self.assertIn(
+            'Варианты картинок созданы для постов: 2', out.getvalue()
+        )
+        self.assertEqual(PostImageVariant.objects.count(), 4)
+
+    @override_settings(POSTS_IMAGE_MAX_SIDE=100)
+    def test_original_cleaned_after_upload(self):
+        """Оригинал после сохранения уменьшается и теряет EXIF."""
+        image = Image.new('RGB', (400, 200))
+        exif = image.getexif()
+        exif[EXIF_MAKE] = 'Камера'
+        data = BytesIO()
+        image.save(data, 'JPEG', exif=exif.tobytes())
+        post = Post.objects.create(
+            author=self.user,
+            text='Тест',
+            image=SimpleUploadedFile(
+                'photo.jpg', data.getvalue(), content_type='image/jpeg'
+            )
+        )
+        tasks.wait()
+        with Image.open(post.image.path) as cleaned:
+            self.assertEqual(cleaned.size, (100, 50))
+            self.assertNotIn('exif', cleaned.info)
+
+    def test_page_thumbnails_in_one_lookup(self):
+        """Превью всех постов страницы ищутся одним запросом к KVStore."""
+        self.create_posts(3)
+        for post in Post.objects.all():
+            thumbnails.generate(post.image.name)
+            thumbnails.build_variants(post.pk)
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.guest.get(PROFILE_URL)
+        self.assertEqual(len([
+            query for query in context.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]), 1)
+        posts = thumbnails.attach(list(Post.objects.all()))
+        self.assertTrue(all(post.thumbnail for post in posts))
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug=TEST_SLUG,
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Тест', group=cls.group
+        )
+        cls.POST_DETAIL_URL = reverse('posts:post_detail', args=[cls.post.pk])
+        cls.guest = Client()
+        cls.author = Client()
+        cls.author.force_login(cls.user)
+
+    def setUp(self):
+        cache.clear()
+        # Главная выдаёт валидаторы, когда фрагмент с постами устоялся.
+        self.settle(freshness.SITE, counters.feed_key(counters.INDEX))
+
+    def settle(self, *keys):
+        past = timezone.now() - timedelta(minutes=1)
+        cache.set_many({
+            freshness.state_key(key): (key, past) for key in keys
+        }, None)
+
+    def test_not_modified(self):
+        """
+        Повторный запрос с ETag или Last-Modified получает 304,
+        а страница не выводится.
+        """
+        for url in [
+            INDEX_URL, GROUP_LIST_URL, PROFILE_URL, self.POST_DETAIL_URL
+        ]:
+            for client in [self.guest, self.author]:
+                response = client.get(url)
+                self.assertTrue(response['ETag'].startswith('W/"'))
+                for headers in [
+                    {'HTTP_IF_NONE_MATCH': response['ETag']},
+                    {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']},
+                ]:
+                    with self.subTest(url=url, client=client, **headers):
+                        cached = client.get(url, **headers)
+                        self.assertEqual(
+                            cached.status_code, HTTPStatus.NOT_MODIFIED
+                        )
+                        self.assertEqual(cached.templates, [])
+                        self.assertIsNone(cached.context)
+
+    def test_not_modified_without_queries(self):
+        """Гостю 304 на главной и в группе отдаётся без запросов к базе."""
+        for url in [INDEX_URL, GROUP_LIST_URL]:
+            etag = self.guest.get(url)['ETag']
+            with self.subTest(url=url):
+                with self.assertNumQueries(0):
+                    response = self.guest.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_etag_depends_on_user_and_page(self):
+        """ETag другого пользователя или другой страницы не подходит."""
+        etag = self.guest.get(INDEX_URL)['ETag']
+        for client, url in [
+            [self.author, INDEX_URL],
+            [self.guest, INDEX_URL + '?page=2'],
+        ]:
+            with self.subTest(url=url, client=client):
+                response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertIn('page_obj', response.context)
+
+    def test_unsettled_index_without_validators(self):
+        """Сразу после изменения ленты главная не выдаёт валидаторы."""
+        cache.clear()
+        response = self.guest.get(INDEX_URL)
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+
+
+class ConditionalGetChangesTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username=USERNAME)
+        self.reader = User.objects.create_user(username=ANOTHER_USERMANE)
+        self.post = Post.objects.create(author=self.user, text='Тест')
+        self.client.force_login(self.reader)
+
+    def test_changes_reset_etag(self):
+        """Комментарий и подписка меняют ETag страниц поста и автора."""
+        post_url = reverse('posts:post_detail', args=[self.post.pk])
+        for url, change in [
+            [post_url, lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий'
+            )],
+            [PROFILE_URL, lambda: Follow.objects.create(
+                user=self.reader, author=self.user
+            )],
+        ]:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                change()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
@@ -0,0 +1,272 @@
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import tasks
+from .models import Post, PostImageVariant
+
+# Превью ленты и страницы поста, как в шаблонах.
+GEOMETRY = '960x339'
+OPTIONS = {'crop': 'center', 'upscale': True}
+RATIO = 339 / 960
+# Метаданные, которые убираются из оригинала; ICC-профиль остаётся.
+METADATA = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment', 'photoshop')
+# Сколько секунд показ поста не ставит заново задачу вариантов картинки,
+# создать которые не удалось.
+VARIANTS_RETRY_TIMEOUT = 60 * 60
+# Сколько секунд новая картинка считается необработанной: пока задача
+# загрузки чистит оригинал, превью и варианты по нему при показе не
+# создаются.
+UPLOAD_PENDING_TIMEOUT = 10 * 60
+
+QUEUE = tasks.Queue('thumbnails', 'POSTS_THUMBNAIL_WORKERS')
+
+
+def generate(name, geometry=GEOMETRY, options=None):
+    """
+    Создаёт превью, если его ещё нет, и сбрасывает закэшированные
+    карточки постов с этой картинкой. Возвращает True, если превью создано.
+    """
+    options = OPTIONS if options is None else options
+    if DeferredThumbnailBackend().ready(name, geometry, **options):
+        return False
+    ThumbnailBackend().get_thumbnail(name, geometry, **options)
+    bump_cards(Post.objects.filter(image=name).values_list(
+        'pk', 'author_id', 'group__slug'
+    ))
+    return True
+
+
+def clean_original(name):
+    """
+    Переписывает загруженный оригинал без EXIF и прочих метаданных,
+    уменьшая его до POSTS_IMAGE_MAX_SIDE по большей стороне. Анимации
+    и картинки, которые менять не нужно, остаются как есть.
+    Возвращает True, если файл переписан.
+    """
+    max_side = settings.POSTS_IMAGE_MAX_SIDE
+    with default_storage.open(name, 'rb') as file:
+        image = Image.open(file)
+        image_format = image.format
+        if getattr(image, 'n_frames', 1) > 1 or (
+            max(image.size) <= max_side
+            and not any(key in image.info for key in METADATA)
+        ):
+            return False
+        # JPEG сразу раскодируется в уменьшенном масштабе.
+        image.draft(image.mode, (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    for key in METADATA:
+        image.info.pop(key, None)
+    data = BytesIO()
+    options = {'quality': 90} if image_format == 'JPEG' else {}
+    icc_profile = image.info.get('icc_profile')
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    image.save(data, image_format, **options)
+    with default_storage.open(name, 'wb') as file:
+        file.write(data.getvalue())
+    return True
+
+
+def upload_pending_key(name):
+    return f'posts:upload-pending:{name}'
+
+
+def upload_pending(names):
+    """Картинки из names, задача загрузки которых ещё не завершена."""
+    keys = {upload_pending_key(name): name for name in names}
+    return {keys[key] for key in cache.get_many(keys)}
+
+
+def process_upload(name, post_id=None):
+    """
+    Новая картинка: сначала чистится оригинал, потом по нему создаются
+    превью и варианты картинки поста post_id. До конца задачи показы
+    поста не создают превью по неочищенному или переписываемому файлу.
+    """
+    try:
+        clean_original(name)
+        created = generate(name)
+        if post_id is not None:
+            build_variants(post_id)
+    finally:
+        cache.delete(upload_pending_key(name))
+    return created
+
+
+def make_variants(post):
+    """Варианты картинки всех размеров и форматов из настроек."""
+    variants = {}
+    for image_format in settings.POSTS_IMAGE_VARIANT_FORMATS:
+        for width in settings.POSTS_IMAGE_VARIANT_WIDTHS:
+            image = ThumbnailBackend().get_thumbnail(
+                post.image.name,
+                f'{width}x{round(width * RATIO)}',
+                crop='center',
+                upscale=False,
+                format=image_format,
+                quality=settings.POSTS_IMAGE_VARIANT_QUALITY
+            )
+            # Картинка меньше нужной ширины не растягивается, и разные
+            # ширины могут дать один и тот же вариант.
+            variants[image_format, image.width] = PostImageVariant(
+                post=post,
+                image=image.name,
+                format=image_format.lower(),
+                width=image.width,
+                height=image.height
+            )
+    return list(variants.values())
+
+
+def save_variants(post, variants):
+    """Заменяет варианты картинки поста новыми."""
+    with transaction.atomic():
+        PostImageVariant.objects.filter(post_id=post.pk).delete()
+        PostImageVariant.objects.bulk_create(variants)
+    bump_cards([
+        (post.pk, post.author_id, post.group and post.group.slug)
+    ])
+
+
+def variants_failed_key(post_id):
+    return f'posts:variants-failed:{post_id}'
+
+
+def build_variants(post_id):
+    """
+    Создаёт варианты картинки поста. Ошибка запоминается на
+    VARIANTS_RETRY_TIMEOUT, чтобы показы поста не ставили задачу снова.
+    """
+    post = Post.objects.filter(pk=post_id).select_related('group').only(
+        'image', 'author', 'group__slug'
+    ).first()
+    if post is None:
+        return
+    try:
+        variants = make_variants(post) if post.image else []
+    except Exception:
+        cache.set(variants_failed_key(post_id), True, VARIANTS_RETRY_TIMEOUT)
+        raise
+    cache.delete(variants_failed_key(post_id))
+    save_variants(post, variants)
+
+
+def bump_cards(posts):
+    """Сбрасывает карточки и свежесть постов (pk, author_id, group_slug)."""
+    from . import cards, freshness
+    posts = list(posts)
+    for pk, _, _ in posts:
+        cards.bump(cards.POST, pk)
+    freshness.touch_posts(posts)
+
+
+def schedule(name, geometry=GEOMETRY, options=None):
+    if not name or upload_pending([name]):
+        return
+    options = OPTIONS if options is None else options
+    QUEUE.defer(
+        ('thumbnail', name, geometry, tuple(sorted(options.items()))),
+        generate, name, geometry, options
+    )
+
+
+def schedule_upload(name, post_id=None):
+    if name:
+        cache.set(upload_pending_key(name), True, UPLOAD_PENDING_TIMEOUT)
+        QUEUE.defer(('upload', name), process_upload, name, post_id)
+
+
+def schedule_variants(post_id, name=None):
+    """Варианты картинки name поста, если её не обрабатывает загрузка."""
+    if name and upload_pending([name]):
+        return
+    if not cache.get(variants_failed_key(post_id)):
+        QUEUE.defer(('variants', post_id), build_variants, post_id)
+
+
+def attach(posts, geometry=GEOMETRY, options=None):
+    """
+    Выставляет постам thumbnail — готовое превью или None — одним
+    обращением к KVStore на всю страницу. Недостающие превью ставятся
+    в очередь, как и в DeferredThumbnailBackend, а без пула создаются
+    сразу; превью картинок, которые ещё обрабатывает задача загрузки,
+    создаст она сама.
+    """
+    options = OPTIONS if options is None else options
+    backend = DeferredThumbnailBackend()
+    files = {
+        post.pk: backend.thumbnail_file(post.image, geometry, **options)
+        for post in posts if post.image
+    }
+    found = default.kvstore.get_many(files.values())
+    pending = upload_pending(
+        post.image.name for post in posts
+        if post.pk in files and files[post.pk].key not in found
+    )
+    for post in posts:
+        post.thumbnail = None
+        if post.pk in files:
+            post.thumbnail = found.get(files[post.pk].key)
+            if post.thumbnail is not None or post.image.name in pending:
+                continue
+            if settings.POSTS_THUMBNAIL_WORKERS:
+                schedule(post.image.name, geometry, options)
+            else:
+                post.thumbnail = ThumbnailBackend().get_thumbnail(
+                    post.image.name, geometry, **options
+                )
+    return posts
+
+
+class DeferredThumbnailBackend(ThumbnailBackend):
+    """
+    Backend для {% thumbnail %}, который не создаёт превью во время
+    запроса. Готовое превью берётся из KVStore; иначе создание ставится
+    в очередь, а тег выводит блок {% empty %} с заглушкой. При
+    POSTS_THUMBNAIL_WORKERS = 0 превью создаётся сразу, как в sorl.
+    """
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """Файл превью, под которым оно лежит в KVStore."""
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return ImageFile(
+            self._get_thumbnail_filename(source, geometry_string, options),
+            default.storage
+        )
+
+    def ready(self, file_, geometry_string, **options):
+        """Готовое превью из KVStore или None, ничего не создавая."""
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, **options)
+        )
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not settings.POSTS_THUMBNAIL_WORKERS:
+            return super().get_thumbnail(file_, geometry_string, **options)
+        cached = self.ready(file_, geometry_string, **options)
+        if cached:
+            return cached
+        schedule(ImageFile(file_).name, geometry_string, options)
+        return None
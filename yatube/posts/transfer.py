@@ -0,0 +1,409 @@
+import csv
+import json
+from datetime import datetime
+from itertools import islice
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import cards, counters, feeds, freshness, search
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+BATCH_SIZE = 1000
+FORMATS = ('ndjson', 'csv')
+
+
+class TransferError(Exception):
+    """Данные, которые нельзя импортировать."""
+
+
+class NaturalKeys:
+    """
+    Первичные ключи model по уникальному полю field. Неизвестные ключи
+    пачки ищутся одним запросом. Когда в кэше набирается limit записей,
+    из него убирается всё, кроме ключей текущей пачки.
+    """
+
+    def __init__(self, model, field, limit=100000):
+        self.model = model
+        self.field = field
+        self.limit = limit
+        self.cache = {}
+
+    def load(self, keys):
+        keys = {key for key in keys if key}
+        missing = keys - self.cache.keys()
+        if not missing:
+            return
+        if len(self.cache) + len(missing) > self.limit:
+            self.cache = {
+                key: pk for key, pk in self.cache.items() if key in keys
+            }
+        found = dict(self.model.objects.filter(
+            **{f'{self.field}__in': missing}
+        ).values_list(self.field, 'pk'))
+        unknown = missing - found.keys()
+        if unknown:
+            raise TransferError(
+                f'{self.model._meta.verbose_name}: не найдены '
+                + ', '.join(sorted(unknown)[:5])
+            )
+        self.cache.update(found)
+
+    def get(self, key):
+        return self.cache[key] if key else None
+
+
+def number(value):
+    return int(value) if value not in (None, '') else None
+
+
+def moment(value):
+    """Дата из ISO 8601; без даты — текущее время, как при создании."""
+    if not value:
+        return timezone.now()
+    value = parse_datetime(value)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def last_pk(model):
+    return model.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+class PostKind:
+    model = Post
+    fields = ('id', 'author', 'group', 'text', 'pub_date', 'image')
+    references = {'author': (User, 'username'), 'group': (Group, 'slug')}
+    date = 'pub_date'
+    # Поля, по которым находятся вставленные строки без явного id.
+    identity = ('author_id', 'text')
+    ignore_conflicts = False
+
+    def values(self):
+        return Post.objects.order_by('pk').values_list(
+            'pk', 'author__username', 'group__slug', 'text', 'pub_date',
+            'image'
+        )
+
+    def build(self, row, keys):
+        return Post(
+            pk=number(row.get('id')),
+            author_id=keys['author'].get(row['author']),
+            group_id=keys['group'].get(row.get('group')),
+            text=row['text'],
+            pub_date=moment(row.get('pub_date')),
+            image=row.get('image') or ''
+        )
+
+    def users(self, post):
+        return [post.author_id]
+
+    def imported(self, posts):
+        """Индекс поиска и ленты подписок для загруженных постов."""
+        search.backend().index(posts)
+        if settings.POSTS_FEED_FANOUT:
+            feeds.fan_out_posts(posts)
+
+    def finish(self, user_ids):
+        pass
+
+
+class CommentKind:
+    model = Comment
+    fields = ('id', 'post', 'author', 'text', 'created')
+    references = {'author': (User, 'username')}
+    date = 'created'
+    identity = ('post_id', 'author_id', 'text')
+    ignore_conflicts = False
+
+    def values(self):
+        return Comment.objects.order_by('pk').values_list(
+            'pk', 'post_id', 'author__username', 'text', 'created'
+        )
+
+    def build(self, row, keys):
+        return Comment(
+            pk=number(row.get('id')),
+            post_id=number(row['post']),
+            author_id=keys['author'].get(row['author']),
+            text=row['text'],
+            created=moment(row.get('created'))
+        )
+
+    def users(self, comment):
+        return [comment.author_id]
+
+    def imported(self, comments):
+        pass
+
+    def finish(self, user_ids):
+        pass
+
+
+class FollowKind:
+    model = Follow
+    fields = ('user', 'author')
+    references = {'user': (User, 'username'), 'author': (User, 'username')}
+    date = None
+    # Повторный импорт подписок не ломается на unique_follow.
+    ignore_conflicts = True
+
+    def values(self):
+        return Follow.objects.order_by('pk').values_list(
+            'user__username', 'author__username'
+        )
+
+    def build(self, row, keys):
+        return Follow(
+            user_id=keys['user'].get(row['user']),
+            author_id=keys['author'].get(row['author'])
+        )
+
+    def users(self, follow):
+        return [follow.user_id, follow.author_id]
+
+    def imported(self, follows):
+        """Посты авторов в лентах новых подписчиков."""
+        if not settings.POSTS_FEED_FANOUT:
+            return
+        authors = set(feeds.fanned_out_ids(
+            list({follow.author_id for follow in follows})
+        ))
+        for follow in follows:
+            if follow.author_id in authors:
+                feeds.add_entries(
+                    feeds.author_entries(follow.user_id, follow.author_id)
+                )
+
+    def finish(self, user_ids):
+        """Авторы, число подписчиков которых перешло порог раскладки."""
+        if settings.POSTS_FEED_FANOUT:
+            for user_id in user_ids:
+                feeds.switch_author(user_id)
+
+
+KINDS = {
+    'posts': PostKind(),
+    'comments': CommentKind(),
+    'follows': FollowKind(),
+}
+
+
+def plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def write_ndjson(file, fields, rows):
+    for row in rows:
+        file.write(json.dumps(
+            dict(zip(fields, map(plain, row))), ensure_ascii=False
+        ) + '\n')
+
+
+def write_csv(file, fields, rows):
+    writer = csv.writer(file)
+    writer.writerow(fields)
+    for row in rows:
+        writer.writerow(plain(value) for value in row)
+
+
+def read_ndjson(file):
+    for line_number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as error:
+            raise TransferError(f'Строка {line_number}: {error}')
+
+
+def read_csv(file):
+    return csv.DictReader(file)
+
+
+def from_fixture(records, label):
+    """
+    Записи dumpdata --format ndjson модели label в виде строк импорта:
+    естественные ключи разворачиваются, объекты прочих моделей
+    пропускаются. Обычные строки проходят как есть.
+    """
+    for record in records:
+        if 'fields' not in record:
+            yield record
+        elif record.get('model') == label:
+            row = {'id': record.get('pk')}
+            for name, value in record['fields'].items():
+                row[name] = value[0] if isinstance(value, list) else value
+            yield row
+
+
+WRITERS = {'ndjson': write_ndjson, 'csv': write_csv}
+READERS = {'ndjson': read_ndjson, 'csv': read_csv}
+
+
+def saved(model, objects, before, identity):
+    """
+    Объекты пачки с первичными ключами. bulk_create в SQLite не выставляет
+    ключи, поэтому строки без явного id ищутся среди ключей после before
+    по значениям полей identity: строки, которые тем временем вставил
+    другой процесс, в пачку не попадают.
+    """
+    waiting = {}
+    for item in objects:
+        if item.pk is None:
+            waiting.setdefault(
+                tuple(getattr(item, name) for name in identity), []
+            ).append(item)
+    if waiting:
+        rows = model.objects.filter(
+            pk__gt=before,
+            **{f'{identity[0]}__in': {values[0] for values in waiting}}
+        ).order_by('pk').values_list('pk', *identity)
+        for pk, *values in rows.iterator():
+            items = waiting.get(tuple(values))
+            if items:
+                items.pop(0).pk = pk
+    return [item for item in objects if item.pk is not None]
+
+
+def insert(kind, objects):
+    """
+    Сохраняет пачку kind через bulk_create. Поле даты kind.date —
+    auto_now_add, и bulk_create пишет в него время вставки, поэтому даты
+    самих объектов записываются следом через bulk_update; метаданные
+    поля не меняются, и прочие сохранения в процессе идут как обычно.
+    Возвращает сохранённые объекты.
+    """
+    model = kind.model
+    if not kind.date:
+        model.objects.bulk_create(
+            objects, ignore_conflicts=kind.ignore_conflicts
+        )
+        return objects
+    dates = [getattr(item, kind.date) for item in objects]
+    with transaction.atomic():
+        before = last_pk(model)
+        model.objects.bulk_create(
+            objects, ignore_conflicts=kind.ignore_conflicts
+        )
+        for item, date in zip(objects, dates):
+            setattr(item, kind.date, date)
+        objects = saved(model, objects, before, kind.identity)
+        model.objects.bulk_update(objects, [kind.date])
+    return objects
+
+
+def reset_sequences(model):
+    """
+    После вставки строк с явными id последовательность PostgreSQL
+    сдвигается за наибольший id; для SQLite запросов нет.
+    """
+    statements = connection.ops.sequence_reset_sql(no_style(), [model])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def refresh(kind, user_ids):
+    """
+    Пересчитывает после загрузки то, что обычно поддерживают сигналы:
+    статистику затронутых пользователей, счётчики и карточки.
+    """
+    user_ids = sorted(user_ids)
+    for chunk in chunks(user_ids, BATCH_SIZE):
+        UserStats.objects.recount(chunk)
+    counters.clear()
+    cards.clear()
+    freshness.touch([freshness.SITE])
+    kind.finish(user_ids)
+
+
+def chunks(items, size):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Counted:
+    """Итератор, считающий пройденные элементы."""
+
+    def __init__(self, items):
+        self.items = iter(items)
+        self.count = 0
+
+    def __iter__(self):
+        for item in self.items:
+            self.count += 1
+            yield item
+
+
+def report(action, rows, seconds):
+    """Строка отчёта о скорости выгрузки или загрузки."""
+    return (
+        f'{action} строк: {rows} за {seconds:.1f} с '
+        f'({rows / max(seconds, 1e-6):.0f} строк/с)'
+    )
+
+
+def export(kind, file, file_format, chunk_size=BATCH_SIZE):
+    """
+    Пишет все объекты kind в file, читая базу кусками по chunk_size.
+    Возвращает число строк и время в секундах.
+    """
+    kind = KINDS[kind]
+    start = perf_counter()
+    rows = Counted(kind.values().iterator(chunk_size=chunk_size))
+    WRITERS[file_format](file, kind.fields, rows)
+    return rows.count, perf_counter() - start
+
+
+def load(kind, file, file_format, batch_size=BATCH_SIZE, commit_every=10):
+    """
+    Импортирует объекты kind из file через bulk_create пачками по
+    batch_size, по commit_every пачек в транзакции. Авторы и группы
+    ищутся по username и slug. NDJSON может быть и выгрузкой dumpdata
+    --format ndjson --natural-foreign. Индекс поиска и ленты подписок
+    дополняются только загруженными строками, а после импорта
+    пересчитывается то, что обычно поддерживают сигналы. Возвращает число
+    строк и время.
+    """
+    kind = KINDS[kind]
+    keys = {
+        name: NaturalKeys(*reference)
+        for name, reference in kind.references.items()
+    }
+    start = perf_counter()
+    total, users = 0, set()
+    rows = from_fixture(
+        READERS[file_format](file), kind.model._meta.label_lower
+    )
+    batches = chunks(rows, batch_size)
+    while True:
+        with transaction.atomic():
+            done = 0
+            for batch in islice(batches, commit_every):
+                for name, natural in keys.items():
+                    natural.load(row.get(name) for row in batch)
+                objects = insert(
+                    kind, [kind.build(row, keys) for row in batch]
+                )
+                kind.imported(objects)
+                for item in objects:
+                    users.update(kind.users(item))
+                total += len(batch)
+                done += 1
+        if done < commit_every:
+            break
+    reset_sequences(kind.model)
+    refresh(kind, users)
+    return total, perf_counter() - start
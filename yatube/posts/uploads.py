@@ -0,0 +1,52 @@
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.uploadhandler import (
+    StopUpload, TemporaryFileUploadHandler
+)
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+
+def oversized_uploads(request):
+    """Поля запроса, загрузка которых прервана из-за размера файла."""
+    if not hasattr(request, 'oversized_uploads'):
+        request.oversized_uploads = set()
+    return request.oversized_uploads
+
+
+class BoundedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Пишет каждый загружаемый файл во временный файл на диске. Как только
+    файл превышает POSTS_UPLOAD_MAX_SIZE байт, разбор запроса
+    прекращается без чтения остатка тела, временный файл удаляется, а
+    поле попадает в oversized_uploads(request): его отклоняет форма.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POSTS_UPLOAD_MAX_SIZE:
+            oversized_uploads(self.request).add(self.field_name)
+            raise StopUpload(connection_reset=True)
+        return super().receive_data_chunk(raw_data, start)
+
+
+def bounded_uploads(view):
+    """
+    Загрузки в представлении view идут через
+    BoundedTemporaryFileUploadHandler; прочие формы сайта (админка)
+    работают с обработчиками по умолчанию. Обработчики меняются до
+    чтения тела запроса, поэтому проверка CSRF, которая читает
+    request.POST, выполняется после замены, а не в middleware.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        request.upload_handlers = [BoundedTemporaryFileUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+    return wrapped
@@ -1,58 +1,149 @@
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.conf import settings
+from django.core.paginator import Paginator
+from django.http import JsonResponse
+from django.utils.http import urlencode
 from django.shortcuts import (
     get_object_or_404, redirect, render
 )
 
+from . import counters, feeds, freshness, pages, search, uploads
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-
-
-def post_processor(request, post_list):
-    return Paginator(
-        post_list, settings.POSTS_COUNT_ON_PAGE
+from .models import Follow, Group, Post, User, UserStats
+from .paginators import CachedCountPaginator, KeysetPaginator
+
+
+def post_processor(request, post_list, count_key, field='pub_date'):
+    if request.resolver_match.url_name in settings.POSTS_KEYSET_PAGINATION:
+        return KeysetPaginator(
+            post_list.for_feed(), settings.POSTS_COUNT_ON_PAGE, field=field
+        ).get_page(request.GET.get('cursor'))
+    return CachedCountPaginator(
+        post_list.for_feed(),
+        settings.POSTS_COUNT_ON_PAGE,
+        count_key,
+        count_queryset=post_list
     ).get_page(request.GET.get('page'))
 
 
+@freshness.conditional(
+    freshness.index_keys, weak=True, settle=pages.index_stale_seconds
+)
+@pages.cache_anonymous_page(counters.INDEX)
 def index(request):
     return render(request, 'posts/index.html', {
-        'page_obj': post_processor(request, Post.objects.all()),
-    })
+        'page_obj': post_processor(
+            request, Post.objects.all(), counters.feed_key(counters.INDEX)
+        ),
+        'feed_version': pages.fragment_version(request, counters.INDEX),
+        'fragment_timeout': pages.INDEX_FRAGMENT_TIMEOUT,
+    }, using=settings.POSTS_FEED_TEMPLATE_ENGINE)
 
 
+@freshness.conditional(
+    freshness.group_keys, weak=True, settle=pages.stale_seconds
+)
+@pages.cache_anonymous_page(counters.GROUP, 'slug')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     return render(request, 'posts/group_list.html', {
         'group': group,
-        'page_obj': post_processor(request, group.posts.all()),
-    })
+        'page_obj': post_processor(
+            request,
+            group.posts.all(),
+            counters.feed_key(counters.GROUP, group.pk)
+        ),
+    }, using=settings.POSTS_FEED_TEMPLATE_ENGINE)
 
 
+@freshness.conditional(freshness.profile_page_keys, weak=True)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
     return render(request, 'posts/profile.html', {
         'author': author,
+        'stats': UserStats.objects.for_user(author),
         'following':
         request.user.is_authenticated
         and author != request.user
         and Follow.objects.filter(
             user=request.user, author=author
         ).exists(),
-        'page_obj': post_processor(request, author.posts.all()),
-    })
+        'page_obj': post_processor(
+            request,
+            author.posts.all(),
+            counters.feed_key(counters.PROFILE, author.pk)
+        ),
+    }, using=settings.POSTS_FEED_TEMPLATE_ENGINE)
 
 
+def comments_processor(request, post):
+    return KeysetPaginator(
+        post.comments.select_related('author'),
+        settings.COMMENTS_COUNT_ON_PAGE,
+        field='created'
+    ).get_page(request.GET.get('cursor'))
+
+
+@freshness.conditional(freshness.post_page_keys, weak=True)
 def post_detail(request, post_id):
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
     return render(request, 'posts/post_detail.html', {
-        'post': get_object_or_404(Post, pk=post_id),
+        'post': post,
+        'author_stats': UserStats.objects.for_user(post.author),
         'form': CommentForm(request.POST or None),
+        'comments': comments_processor(request, post),
+    })
+
+
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments = comments_processor(request, post)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created.isoformat(),
+                } for comment in comments
+            ],
+            'next_cursor': comments.next_cursor,
+        })
+    return render(request, 'posts/includes/comments.html', {
+        'post': post,
+        'comments': comments,
     })
 
 
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        page_obj = Paginator(
+            search.search(query), settings.POSTS_COUNT_ON_PAGE
+        ).get_page(request.GET.get('page'))
+    return render(request, 'posts/search.html', {
+        'query': query,
+        'page_obj': page_obj,
+        'extra_query': urlencode({'q': query}) + '&',
+    })
+
+
+@uploads.bounded_uploads
 @login_required
 def post_create(request):
-    form = PostForm(request.POST or None, request.FILES or None)
+    # Без проверки метода форма с обрезанным после большого файла
+    # запросом осталась бы несвязанной и вышла бы без ошибок.
+    form = PostForm(
+        request.POST if request.method == 'POST' else None,
+        request.FILES or None,
+        oversized=uploads.oversized_uploads(request)
+    )
     if not form.is_valid():
         return render(request, 'posts/create_post.html', {'form': form})
     new_post = form.save(commit=False)
@@ -62,15 +153,17 @@ def post_create(request):
     return redirect('posts:profile', username)
 
 
+@uploads.bounded_uploads
 @login_required
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if request.user != post.author:
         return redirect('posts:post_detail', post_id)
     form = PostForm(
-        request.POST or None,
+        request.POST if request.method == 'POST' else None,
         files=request.FILES or None,
-        instance=post
+        instance=post,
+        oversized=uploads.oversized_uploads(request)
     )
     if not form.is_valid():
         return render(
@@ -97,10 +190,15 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     if request.user.is_authenticated:
-        posts = Post.objects.filter(author__following__user=request.user)
+        posts = feeds.follow_posts(request.user)
         return render(request, 'posts/follow.html', {
-            'page_obj': post_processor(request, posts)
-        })
+            'page_obj': post_processor(
+                request,
+                posts,
+                counters.feed_key(counters.FOLLOW, request.user.pk),
+                field=feeds.ORDER_FIELD
+            )
+        }, using=settings.POSTS_FEED_TEMPLATE_ENGINE)
     return redirect('posts:index')
 
 
@@ -108,12 +206,8 @@ def follow_index(request):
 def profile_follow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
-    if not (
-        Follow.objects.filter(
-            user=user, author=author
-        ).exists() or author == user
-    ):
-        Follow.objects.create(user=user, author=author)
+    if author != user:
+        Follow.objects.get_or_create(user=user, author=author)
     return redirect('posts:profile', author)
 
 
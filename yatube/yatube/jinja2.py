@@ -0,0 +1,9 @@
+from core import jinja
+from posts.jinja import post_cards, post_picture
+
+
+def environment(**options):
+    """Окружение Jinja2 проекта: общие функции core и карточки posts."""
+    env = jinja.environment(**options)
+    env.globals.update(post_cards=post_cards, post_picture=post_picture)
+    return env
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import importlib.util
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -50,6 +53,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QueryProfileMiddleware',
+    'core.middleware.TemplateProfileMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,23 +68,60 @@ MIDDLEWARE = [
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+TEMPLATE_CONTEXT_PROCESSORS = [
+    'django.template.context_processors.debug',
+    'django.template.context_processors.request',
+    'django.contrib.auth.context_processors.auth',
+    'django.contrib.messages.context_processors.messages',
+    'core.context_processors.year.year',
+]
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Шаблоны Django, время вывода которых учитывает core.metrics.
+        'BACKEND': 'core.template_backends.DjangoTemplates',
+        'NAME': 'django',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
-            'context_processors': [
-                'django.template.context_processors.debug',
-                'django.template.context_processors.request',
-                'django.contrib.auth.context_processors.auth',
-                'django.contrib.messages.context_processors.messages',
-                'core.context_processors.year.year',
+            # Без DEBUG скомпилированные шаблоны живут в памяти процесса;
+            # правки шаблонов тогда видны только после перезапуска.
+            'loaders': TEMPLATE_LOADERS if DEBUG else [
+                ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
             ],
+            'context_processors': TEMPLATE_CONTEXT_PROCESSORS,
         },
     },
 ]
 
+# Ленты index, group_list, profile и follow можно выводить шаблонами
+# Jinja2 из каталогов jinja2/ приложений (pip install 'Jinja2>=3'):
+# POSTS_FEED_TEMPLATE_ENGINE=jinja2. Вывод совпадает с шаблонами Django.
+# Сравнить скорость вывода: manage.py bench_templates.
+POSTS_FEED_TEMPLATE_ENGINE = os.environ.get(
+    'POSTS_FEED_TEMPLATE_ENGINE', 'django'
+)
+JINJA2_INSTALLED = importlib.util.find_spec('jinja2') is not None
+if POSTS_FEED_TEMPLATE_ENGINE == 'jinja2' and not JINJA2_INSTALLED:
+    # Иначе ошибка всплыла бы только на первом запросе к ленте.
+    raise ImproperlyConfigured(
+        "POSTS_FEED_TEMPLATE_ENGINE=jinja2 требует Jinja2: "
+        "pip install 'Jinja2>=3'."
+    )
+if JINJA2_INSTALLED:
+    TEMPLATES.append({
+        'BACKEND': 'core.jinja.Jinja2',
+        'NAME': 'jinja2',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'environment': 'yatube.jinja2.environment',
+            'context_processors': TEMPLATE_CONTEXT_PROCESSORS,
+        },
+    })
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 
@@ -92,6 +135,15 @@ DATABASES = {
     }
 }
 
+# Команды замеров seed_bench, bench_views и bench_indexes создают данные,
+# удаляют индексы и очищают кэш, поэтому работают только с отдельной
+# базой. Путь к ней задаёт переменная окружения BENCH_DATABASE: процесс
+# берёт её вместо основной базы, а кэш держит в файле рядом с ней.
+MAIN_DATABASE = DATABASES['default']['NAME']
+BENCH_DATABASE = os.environ.get('BENCH_DATABASE')
+if BENCH_DATABASE:
+    DATABASES['default']['NAME'] = os.path.abspath(BENCH_DATABASE)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -144,6 +196,10 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+# dumpdata --format ndjson: по объекту на строку, без чтения всей
+# выгрузки в память; такой файл принимает и import_posts.
+SERIALIZATION_MODULES = {'ndjson': 'core.ndjson'}
+
 
 LOGGING = {
     'version': 1,
@@ -161,24 +217,157 @@ LOGGING = {
         },
     },
     'loggers': {
-        'django.db': {
+        'core.querystats': {
             'handlers': ['console'],
-            'level': 'DEBUG',
+            'level': 'INFO',
             'propagate': False,
         }
     }
 }
 
+# Профилирование SQL: доля запросов (0 — выключено, 1 — все), у которых
+# core.middleware.QueryProfileMiddleware считает запросы к базе, их время,
+# повторы и самые медленные. Итог по представлению пишется строкой JSON
+# в лог core.querystats и в файл SQLite QUERY_PROFILE_PATH (None — только
+# в лог). Отчёт по файлу: manage.py querystats.
+QUERY_PROFILE_SAMPLE_RATE = float(
+    os.environ.get('QUERY_PROFILE_SAMPLE_RATE', 0)
+)
+QUERY_PROFILE_PATH = os.path.join(BASE_DIR, 'querystats.sqlite3')
+
+# Служебные адреса (/metrics/, профиль шаблонов) отвечают только на
+# запросы с заголовком Authorization: Bearer <INTERNAL_TOKEN>. Адрес
+# клиента не проверяется: за прокси на той же машине он всегда 127.0.0.1.
+# Без токена служебные адреса закрыты.
+INTERNAL_TOKEN = os.environ.get('INTERNAL_TOKEN', '')
+
+# Метрики запросов в формате Prometheus на /metrics/ (METRICS_ENABLED=0 —
+# не собирать и не отдавать). При нескольких процессах (gunicorn -w N)
+# задайте общий каталог METRICS_DIR: каждый процесс раз в
+# METRICS_FLUSH_INTERVAL секунд пишет туда свои значения, а /metrics/
+# складывает их. Каталог стоит очищать при запуске сервиса.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 5
+
+# Профиль вывода шаблонов: при TEMPLATE_PROFILE запрос с токеном
+# INTERNAL_TOKEN с параметром ?profile_templates получает вместо страницы
+# свёрнутые стеки шаблонов и тегов для flamegraph.pl (=table — таблицу).
+# Для замеров: manage.py bench_views --profile-templates FILE.
+TEMPLATE_PROFILE = os.environ.get('TEMPLATE_PROFILE', '') == '1'
+
+# Компилировать все шаблоны из TEMPLATES_DIR при запуске процесса в
+# yatube.wsgi, чтобы первые запросы после выкладки не разбирали шаблоны.
+# Сравнить время до первого ответа: manage.py bench_startup.
+TEMPLATES_PRECOMPILE = os.environ.get('TEMPLATES_PRECOMPILE', '') == '1'
+
 
 POSTS_COUNT_ON_PAGE = 10
 
+# Комментарии на странице поста подгружаются порциями по курсору.
+COMMENTS_COUNT_ON_PAGE = 20
+
+# Имена маршрутов posts, для которых лента выводится по курсору
+# (?cursor=...) вместо номеров страниц: без COUNT(*) и OFFSET.
+POSTS_KEYSET_PAGINATION = ()
+
+# Сколько секунд счётчик постов ленты живёт в кэше. Сигналы Post и Follow
+# поддерживают его в актуальном виде, таймаут страхует от изменений в
+# обход сигналов (bulk_create, update).
+POSTS_COUNT_CACHE_TIMEOUT = 60 * 5
+
+# Лента подписок из таблицы FeedEntry, которая заполняется при публикации
+# поста и фоновой задачей после подписки. Посты авторов, у которых
+# подписчиков больше POSTS_FEED_FANOUT_MAX_FOLLOWERS, не раскладываются по
+# лентам и подмешиваются при запросе; при переходе автора через порог его
+# записи добавляются или удаляются фоновой задачей. После включения и после
+# смены порога заполните ленты командой backfill_feed.
+POSTS_FEED_FANOUT = False
+POSTS_FEED_FANOUT_MAX_FOLLOWERS = 1000
+# Потоки очереди лент в каждом процессе, отдельной от очереди превью;
+# 0 — выполнять задачи сразу после фиксации транзакции.
+POSTS_FEED_WORKERS = 1
+
+# Имена маршрутов posts, в которых карточки постов берутся из кэша.
+# Карточка сбрасывается при правке поста, его комментариев, автора
+# или группы.
+POSTS_CARD_CACHE_VIEWS = ()
+POSTS_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Имена маршрутов posts (index, group_list), страницы которых гостям
+# отдаются целиком из кэша. Создание, правка и удаление поста сразу
+# сбрасывают кэш его лент; прочие изменения (комментарии, имя автора)
+# появятся по истечении POSTS_PAGE_CACHE_TIMEOUT секунд.
+POSTS_PAGE_CACHE_VIEWS = ()
+POSTS_PAGE_CACHE_TIMEOUT = 60
+
+# Превью картинок создаются в фоне: после сохранения поста и при первом
+# показе, которому превью не хватило, — пока его нет, шаблон выводит
+# заглушку. Число потоков пула в каждом процессе; 0 — создавать превью
+# сразу, как делает sorl-thumbnail по умолчанию.
+THUMBNAIL_BACKEND = 'posts.thumbnails.DeferredThumbnailBackend'
+POSTS_THUMBNAIL_WORKERS = 2
+# Как стандартный cached_db, но превью всей страницы ищутся одним
+# get_many к кэшу (posts.thumbnails.attach).
+THUMBNAIL_KVSTORE = 'posts.kvstore.KVStore'
+
+# Варианты картинки поста (PostImageVariant), которые создаются в том же
+# пуле после загрузки: каждая ширина в каждом формате, с пропорциями
+# превью 960x339. Постам, загруженным раньше, варианты создаются при
+# первом показе. Шаблоны выводят их через srcset.
+POSTS_IMAGE_VARIANT_WIDTHS = (480, 960, 1440)
+POSTS_IMAGE_VARIANT_FORMATS = ('WEBP', 'JPEG')
+POSTS_IMAGE_VARIANT_QUALITY = 80
+
+# Картинки постов при создании и правке пишутся во временный файл
+# кусками, без чтения в память; на файле больше POSTS_UPLOAD_MAX_SIZE
+# байт разбор запроса обрывается, не дочитывая тело, и форма поста
+# отклоняет запрос. Прочие загрузки сайта этот предел не затрагивает.
+# Картинки больше POSTS_IMAGE_MAX_PIXELS пикселей отклоняются по
+# заголовку, не раскодируясь. Оригинал после сохранения поста в пуле
+# превью очищается от EXIF и уменьшается до POSTS_IMAGE_MAX_SIDE точек
+# по большей стороне.
+POSTS_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+POSTS_IMAGE_MAX_PIXELS = 40_000_000
+POSTS_IMAGE_MAX_SIDE = 2560
+
+# Поиск по постам (/search/): FTS5 на SQLite, tsvector на PostgreSQL,
+# на прочих базах — LIKE. Можно указать свой класс из posts.search.
+POSTS_SEARCH_BACKEND = None
+
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Кэш, общий для всех процессов: файл SQLite рядом с базой данных.
+# Если задана переменная окружения REDIS_URL, используется Redis
+# (нужен пакет django-redis). Тесты держат кэш во временном каталоге,
+# чтобы cache.clear() в них не очищал кэш запущенного сайта: manage.py
+# test — через TEST_RUNNER, pytest — с настройками yatube.test_settings.
+TEST_RUNNER = 'core.runner.TestRunner'
+if BENCH_DATABASE:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': DATABASES['default']['NAME'] + '.cache',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+elif os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': os.environ.get(
+                'CACHE_PATH', os.path.join(BASE_DIR, 'cache.sqlite3')
+            ),
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
     }
-}
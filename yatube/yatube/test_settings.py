@@ -0,0 +1,26 @@
+"""
+Настройки для pytest (pytest.ini): как у сайта, но кэш во временном
+каталоге, чтобы cache.clear() в тестах не очищал кэш запущенного сайта.
+manage.py test того же добивается через core.runner.TestRunner.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+
+TEST_CACHE_DIR = tempfile.mkdtemp(prefix='yatube-cache-')
+atexit.register(shutil.rmtree, TEST_CACHE_DIR, True)
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(TEST_CACHE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    }
+}
+
+# Тесты pytest очищают базу сразу после запроса; фоновые задачи пула,
+# которые в это время пишут в неё, ловили бы «database table is locked».
+POSTS_THUMBNAIL_WORKERS = 0
+POSTS_FEED_WORKERS = 0